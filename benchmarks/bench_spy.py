@@ -0,0 +1,39 @@
+"""Measure overhead of forwarding calls through a spy.
+
+Usage: python -m benchmarks.bench_spy
+"""
+
+import timeit
+
+from golem import spy
+from golem.matchers import _
+from golem.times import AtLeast
+
+
+class Service(object):
+
+    def get(self, key, default=None):
+        return default
+
+
+def run(number):
+    """Return list of ``(name, total time)`` pairs."""
+    real = Service()
+    plain = spy(Service())
+    verified = spy(Service())
+    verified.get.expectCall(_, _).times(AtLeast(0))
+    return [
+        ('direct call', timeit.timeit(lambda: real.get('a'), number=number)),
+        ('spy', timeit.timeit(lambda: plain.get('a'), number=number)),
+        ('spy with expectation', timeit.timeit(lambda: verified.get('a'), number=number))]
+
+
+def main(number=200000):
+    results = run(number)
+    direct = results[0][1]
+    for name, total in results:
+        print("%-22s %8.3f us/call  %5.1fx" % (name, total / number * 1e6, total / direct))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,327 @@
+"""Benchmark suite of golem hot paths.
+
+Usage::
+
+    python -m benchmarks.suite [--output FILE] [--compare BASELINE] [--quick]
+
+Results are printed and, if *--output* is given, written as JSON. With
+*--compare*, results are compared with ones stored in given baseline file
+and the suite exits with status 1 if any of them got worse by more than
+*--threshold* (20% by default). All measured values are "lower is better".
+
+Timings depend on the machine, so no baseline is committed. Record one
+with ``make bench-baseline`` on the reference commit, then run
+``make bench-compare`` on the same machine to check changes against it.
+"""
+
+import gc
+import sys
+import json
+import timeit
+import argparse
+import platform
+import warnings
+import itertools
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from golem import policy, mock_method
+from golem.times import AtLeast
+from golem.actions import Return
+from golem.matchers import _, Eq, Gt, InstanceOf, Between
+from golem.mixins import MockTestCaseMixin
+from golem._utils import FunctionInspector
+
+from benchmarks import bench_spy
+
+DEFAULT_THRESHOLD = 0.2
+
+_benchmarks = []
+
+
+def benchmark(func):
+    _benchmarks.append(func)
+    return func
+
+
+class Interface(object):
+
+    @mock_method
+    def foo(self, a, b=None):
+        pass
+
+
+def function(a, b=None):
+    pass
+
+
+def measure(func, number, repeat=3):
+    """Return best time of a single call of *func*, in microseconds."""
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def measure_loop(func, args, number, repeat=3):
+    """Like :func:`measure`, but calls *func* with items of *args* in
+    turn, so no two consecutive calls have same arguments."""
+    cycle = itertools.cycle(args)
+    return measure(lambda: func(*next(cycle)), number, repeat)
+
+
+def measure_memory(func, count):
+    """Return number of bytes that stay allocated after calling *func*,
+    divided by *count*, or ``None`` if memory cannot be traced."""
+    if tracemalloc is None:
+        return None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        total = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return float(total) / count
+
+
+def make_expectations(iface, count, kind):
+    """Set *count* expectations of given *kind* and return arguments of
+    calls matching them."""
+    args = []
+    for i in range(count):
+        if kind == 'exact' or (kind == 'mixed' and i % 2):
+            iface.foo.expectCall(i, b=i).times(AtLeast(0))
+            args.append((i, i))
+        elif i % 3 == 0:
+            iface.foo.expectCall(Eq(-i), InstanceOf(int)).times(AtLeast(0))
+            args.append((-i, 0))
+        elif i % 3 == 1:
+            iface.foo.expectCall(Between(i * 10, i * 10 + 5), _).times(AtLeast(0))
+            args.append((i * 10 + 1, None))
+        else:
+            iface.foo.expectCall(str(i), Gt(0)).times(AtLeast(0))
+            args.append((str(i), 1))
+    return args
+
+
+@benchmark
+def dispatch(options):
+    number = 2000 if options.quick else 20000
+    for kind in ('exact', 'matchers', 'mixed'):
+        for count in (1, 10, 100, 1000):
+            iface = Interface()
+            args = make_expectations(iface, count, kind)
+            yield 'dispatch.%s.%d' % (kind, count), measure_loop(iface.foo, args, number), 'us/call'
+            iface = Interface()
+            args = make_expectations(iface, count, kind)
+            iface.foo.freeze()
+            yield 'dispatch.%s.%d.frozen' % (kind, count), measure_loop(iface.foo, args, number), 'us/call'
+    iface = Interface()
+    iface.foo.expectCall(1, 2).times(AtLeast(0))
+    yield 'dispatch.repeated', measure(lambda: iface.foo(1, 2), number * 5), 'us/call'
+
+
+@benchmark
+def access(options):
+    number = 20000 if options.quick else 200000
+    iface = Interface()
+    iface.foo
+    yield 'access.cached', measure(lambda: iface.foo, number), 'us/access'
+    yield 'access.first', measure(lambda: Interface().foo, number // 10), 'us/access'
+    yield 'access.inspect', measure(lambda: FunctionInspector(Interface.foo.func), number // 10), 'us/call'
+    iface.foo.expectCall(1, 2).times(AtLeast(0))
+    yield 'access.call', measure(lambda: iface.foo(1, 2), number), 'us/call'
+
+
+@benchmark
+def uninterested(options):
+    number = 10000 if options.quick else 100000
+    yield 'uninterested.direct', measure(lambda: function(1, 2), number), 'us/call'
+    for name in policy.UNINTERESTED_CALL_POLICIES:
+        iface = Interface()
+        iface.foo.uninterested_policy = name
+
+        def call():
+            try:
+                iface.foo(1, 2)
+            except AssertionError:
+                pass
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            value = measure(call, number)
+        yield 'uninterested.%s' % name, value, 'us/call'
+        if name == policy.WARN:
+            with warnings.catch_warnings():
+                warnings.simplefilter('always')
+                warnings.showwarning = lambda *args, **kwargs: None
+                value = measure(call, number)
+            yield 'uninterested.%s.shown' % name, value, 'us/call'
+
+
+@benchmark
+def will_once(options):
+    count = 2000 if options.quick else 20000
+
+    def setup():
+        iface = Interface()
+        expectation = iface.foo.expectCall(1)
+        for i in range(count):
+            expectation.willOnce(Return(i))
+        return iface
+
+    mocks = [setup() for _ in range(3)]
+
+    def consume():
+        iface = mocks.pop()
+        for _ in range(count):
+            iface.foo(1)
+
+    yield 'will_once.setup', measure(setup, 1) / count, 'us/action'
+    yield 'will_once.call', measure(consume, 1) / count, 'us/call'
+
+
+@benchmark
+def memory(options):
+    count = 2000 if options.quick else 20000
+
+    def expect():
+        iface = Interface()
+        for i in range(count):
+            iface.foo.expectCall(i).willOnce(Return(i))
+        return iface
+
+    def record():
+        iface = Interface()
+        iface.foo.expectCall(_, _).times(AtLeast(0))
+        iface.foo.enableJournal()
+        for i in range(count):
+            iface.foo(i % 10, i % 10)
+        return iface
+
+    yield 'memory.per_expectation', measure_memory(expect, count), 'bytes'
+    yield 'memory.per_journal_call', measure_memory(record, count), 'bytes'
+
+
+@benchmark
+def verification(options):
+    count = 100 if options.quick else 1000
+    iface = Interface()
+    for i in range(count):
+        iface.foo.expectCall(i)
+        iface.foo(i)
+    yield 'verification.saturated.%d' % count, measure(iface.foo.assertSaturated, 1000), 'us/call'
+
+    pending = Interface()
+    for i in range(count):
+        pending.foo.expectCall(i)
+
+    def verify_pending():
+        try:
+            pending.foo.assertSaturated()
+        except AssertionError:
+            pass
+
+    yield 'verification.undersaturated.%d' % count, measure(verify_pending, 1000), 'us/call'
+
+    test_case = MockTestCaseMixin()
+    for mock in [Interface() for _ in range(count // 10)]:
+        for i in range(10):
+            test_case.expectCall(mock.foo, i)
+            if i:
+                mock.foo(i)
+
+    def verify_test_case():
+        try:
+            test_case.assertSaturated()
+        except AssertionError:
+            pass
+
+    yield 'verification.test_case.%d' % count, measure(verify_test_case, 1000), 'us/call'
+
+
+@benchmark
+def normalize(options):
+    number = 10000 if options.quick else 100000
+    inspector = FunctionInspector(function)
+    yield 'normalize.positional', measure(lambda: inspector.normalize(1, 2), number), 'us/call'
+    yield 'normalize.keyword', measure(lambda: inspector.normalize(1, b=2), number), 'us/call'
+
+
+@benchmark
+def spy(options):
+    number = 20000 if options.quick else 200000
+    for name, total in bench_spy.run(number):
+        yield 'spy.%s' % name.replace(' ', '_'), total / number * 1e6, 'us/call'
+
+
+def run(options):
+    results = {}
+    for func in _benchmarks:
+        if options.only and not any(func.__name__.startswith(x) for x in options.only):
+            continue
+        for name, value, unit in func(options):
+            results[name] = {'value': value, 'unit': unit}
+            print("%-40s %s" % (name, format_value(value, unit)))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return list of ``(name, baseline, current, ratio)`` tuples for
+    results that got worse than in *baseline* by more than *threshold*."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or base['value'] is None or result['value'] is None or base['value'] <= 0:
+            continue
+        ratio = result['value'] / base['value']
+        if ratio > 1 + threshold:
+            regressions.append((name, base['value'], result['value'], ratio))
+    return regressions
+
+
+def format_value(value, unit):
+    if value is None:
+        return 'n/a'
+    return "%10.3f %s" % (value, unit)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run golem benchmarks.")
+    parser.add_argument('--output', help="write results to given JSON file")
+    parser.add_argument('--compare', metavar='BASELINE', help="compare results with given JSON file")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="relative slowdown reported as regression (default: %(default)s)")
+    parser.add_argument('--quick', action='store_true', help="run fewer iterations")
+    parser.add_argument('only', nargs='*', help="run only benchmarks with names starting with given prefixes")
+    options = parser.parse_args(argv)
+    results = run(options)
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'results': results}, f, indent=2, sort_keys=True)
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, options.threshold)
+        for name, base, current, ratio in regressions:
+            print("REGRESSION %-40s %10.3f -> %10.3f (%.2fx)" % (name, base, current, ratio))
+        if regressions:
+            return 1
+        print("no regressions against %s" % options.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
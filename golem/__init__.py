@@ -1 +1,2 @@
-from golem._core import mock_method
+from golem._core import mock_method, mock_class, spy, freeze, unfreeze, attach_template,\
+    snapshot, restore, reset, enable_instrumentation, disable_instrumentation
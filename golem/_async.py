@@ -0,0 +1,94 @@
+from golem import _compat
+
+
+class Awaitable(object):
+    """Awaitable calling given function when awaited.
+
+    If the function returns another awaitable, then it is awaited as well
+    and its result becomes the result of this awaitable. If *before* is
+    given, then it is awaited (and its result discarded) before the
+    function is called.
+    """
+    __slots__ = ('func', 'args', 'kwargs', 'before')
+
+    def __init__(self, func, args=(), kwargs=None, before=None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.before = before
+
+    def __await__(self):
+        before = self.before.__await__() if self.before is not None else None
+        return _AwaitIterator(self.func, self.args, self.kwargs, before)
+
+
+class _AwaitIterator(object):
+    __slots__ = ('func', 'args', 'kwargs', 'before', 'inner')
+
+    def __init__(self, func, args, kwargs, before):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.before = before
+        self.inner = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.send(None)
+
+    next = __next__
+
+    def send(self, value):
+        if self.inner is not None:
+            return self.inner.send(value)
+        elif self.before is not None:
+            try:
+                return self.before.send(value)
+            except StopIteration:
+                self.before = None
+        result = self.func(*self.args, **self.kwargs)
+        if not _compat.isawaitable(result):
+            raise StopIteration(result)
+        self.inner = result.__await__()
+        return next(self.inner)
+
+    def throw(self, type_, value=None, traceback=None):
+        if self.inner is not None:
+            return self.inner.throw(type_, value, traceback)
+        elif self.before is not None:
+            return self.before.throw(type_, value, traceback)
+        elif value is None:
+            value = type_() if isinstance(type_, type) else type_
+        raise value
+
+    def close(self):
+        for it in (self.before, self.inner):
+            if it is not None:
+                it.close()
+
+
+def create_waiter():
+    loop = _get_event_loop()
+    return loop.create_future()
+
+
+def notify_waiters(waiters):
+    for waiter in waiters:
+        waiter.get_loop().call_soon_threadsafe(_set_result, waiter)
+
+
+def gather(awaitables):
+    return _compat.asyncio.gather(*awaitables)
+
+
+def _set_result(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _get_event_loop():
+    if _compat.asyncio is None:
+        raise RuntimeError("asyncio is not available")
+    return _compat.asyncio.get_event_loop()
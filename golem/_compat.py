@@ -0,0 +1,62 @@
+import sys
+import inspect
+import collections
+
+PY2 = sys.version_info[0] == 2
+
+ArgSpec = collections.namedtuple('ArgSpec', 'args varargs keywords defaults kwonlyargs kwonlydefaults posonlyargs')
+
+if PY2:
+    integer_types = (int, long)
+    string_types = (str, unicode)
+    range = xrange
+
+    def iteritems(d):
+        return d.iteritems()
+
+    def getargspec(func):
+        spec = inspect.getargspec(func)
+        return ArgSpec(spec.args, spec.varargs, spec.keywords, spec.defaults, [], None, [])
+
+    def iscoroutinefunction(func):
+        return False
+
+    def isawaitable(obj):
+        return False
+
+    asyncio = None
+
+else:
+    import asyncio
+
+    integer_types = (int,)
+    string_types = (str, bytes)
+    range = range
+
+    def iteritems(d):
+        return iter(d.items())
+
+    def getargspec(func):
+        args, defaults, kwonlyargs, kwonlydefaults, posonlyargs = [], [], [], {}, []
+        varargs = keywords = None
+        for param in inspect.signature(func, follow_wrapped=False).parameters.values():
+            if param.kind == param.POSITIONAL_ONLY or param.kind == param.POSITIONAL_OR_KEYWORD:
+                args.append(param.name)
+                if param.kind == param.POSITIONAL_ONLY:
+                    posonlyargs.append(param.name)
+                if param.default is not param.empty:
+                    defaults.append(param.default)
+            elif param.kind == param.VAR_POSITIONAL:
+                varargs = param.name
+            elif param.kind == param.KEYWORD_ONLY:
+                kwonlyargs.append(param.name)
+                if param.default is not param.empty:
+                    kwonlydefaults[param.name] = param.default
+            else:
+                keywords = param.name
+        return ArgSpec(
+            args, varargs, keywords, tuple(defaults) or None,
+            kwonlyargs, kwonlydefaults or None, posonlyargs)
+
+    iscoroutinefunction = inspect.iscoroutinefunction
+    isawaitable = inspect.isawaitable
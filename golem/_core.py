@@ -1,79 +1,834 @@
+import inspect
 import warnings
 import functools
-import collections
+import itertools
+import weakref
+import threading
 
-from golem import exc, _utils
-from golem.times import Exactly, AtLeast
+from golem import exc, policy, matchers, _async, _compat, _utils
+from golem._index import ExpectationIndex
+from golem.journal import CallJournal
+from golem.instrument import Session
+from golem.times import Exactly, AtLeast, UntilExhausted
+from golem.actions import Return
 
 
 class mock_method(object):
 
     def __init__(self, func):
         self.func = func
+        self._inspect = None
+        self._owner = None
+        self._name = None
+
+    def __set_name__(self, owner, name):
+        self._owner = owner
+        self._name = name
+
+    def __reduce__(self):
+        if self._owner is None:
+            return mock_method, (self.func,)
+        return getattr, (self._owner, self._name)
+
+    @property
+    def inspect(self):
+        """Signature inspector of mocked function, created on first use."""
+        if self._inspect is None:
+            self._inspect = _utils.FunctionInspector(self.func)
+        return self._inspect
+
+    @property
+    def method_class(self):
+        if _compat.iscoroutinefunction(self.func):
+            return AsyncMockMethod
+        return MockMethod
 
     def __get__(self, obj, objtype):
-        return MockMethod(obj, self.func)
+        if obj is None:
+            return self
+        try:
+            return obj._mock_methods[self]
+        except AttributeError:
+            methods = obj.__dict__.setdefault('_mock_methods', {})
+        except KeyError:
+            methods = obj._mock_methods
+        return methods.setdefault(self, self.method_class(obj, self.func, self.inspect))
+
+
+def mock_class(cls):
+    """Return subclass of given class with all its methods mocked.
+
+    Signatures of mock methods are taken from methods of *cls*, but are
+    inspected only when a method is first used, so mocking classes with
+    hundreds of methods is cheap. Constructor of the returned class takes
+    no arguments and does not call constructor of *cls*, so its instances
+    compare and hash by identity instead of using equality of *cls*.
+    """
+    return _make_mock_class(cls, {'__init__': _mock_init})
+
+
+def spy(obj):
+    """Return spy of given object.
+
+    Spy is an instance of :func:`mock_class` of the object's class, which
+    forwards calls of its methods to the object and counts them (see
+    :attr:`MockMethod.forwarded_calls`). Expectations can still be set
+    on spy methods; matching calls are verified as usual and forwarded
+    unless expectation has an action, while calls that do not match any
+    expectation, or cannot be bound to the method's signature, are
+    forwarded instead of failing. Other attributes are read from the
+    spied object.
+    """
+    return _make_mock_class(obj.__class__, {'__init__': _spy_init, '__getattr__': _spy_getattr})(obj)
+
+
+def _make_mock_class(cls, namespace):
+    namespace['__module__'] = cls.__module__
+    namespace['__eq__'] = _identity_eq
+    namespace['__ne__'] = _identity_ne
+    namespace['__hash__'] = object.__hash__
+    for name, func in _iter_functions(cls):
+        namespace[name] = mock_method(func)
+    return type(cls.__name__, (cls,), namespace)
+
+
+def _identity_eq(self, other):
+    return self is other
+
+
+def _identity_ne(self, other):
+    return self is not other
+
+
+def _mock_init(self):
+    pass
+
+
+def _spy_init(self, obj):
+    self.__dict__['_spied_object'] = obj
+
+
+def _spy_getattr(self, name):
+    if name.startswith('_mock_') or '_spied_object' not in self.__dict__:
+        raise AttributeError(name)
+    return getattr(self.__dict__['_spied_object'], name)
+
+
+def _iter_functions(cls):
+    functions = {}
+    for base in reversed(inspect.getmro(cls)):
+        if base is object:
+            continue
+        for name, value in base.__dict__.items():
+            if not (name.startswith('__') and name.endswith('__')) and inspect.isfunction(value):
+                functions[name] = value
+            else:
+                functions.pop(name, None)
+    return functions.items()
 
 
 class MockMethod(object):
+    is_async = False
+
+    #: Instrumentation session of this mock (see :mod:`golem.instrument`).
+    #: Set on the class to instrument all mocks, and to ``False`` on
+    #: instance to exclude it.
+    _instrumentation = None
 
-    def __init__(self, obj, func):
-        self.obj = obj
+    def __init__(self, obj, func, inspect=None):
+        self._obj_ref = _utils.ref(obj)
         self.func = func
-        self.inspect = _utils.FunctionInspector(func)
+        self.func_name = "%s.%s" % (obj.__class__.__name__, func.__name__)
+        self.expectations = obj.__dict__.setdefault('_mock_expectations', {}).setdefault(func.__name__, ExpectationIndex())
+        self.inspect = inspect or _utils.FunctionInspector(func)
+        self.binder = self.inspect.binder(1)
+        self._uninterested_policy = None
+        self._uninterested_keys = None
+        self._thread_safe = None
+        self._lock = threading.Lock()
+        self._pending = PendingExpectations(self)
+        self._frozen = False
+        self._lookup = None
+        self._last_hit = None
+        self.journal = None
+        self.uninterested_calls = 0
+        self.forwarded_calls = 0
+        self._spied = obj.__dict__.get('_spied_object')
+        self._default_action = _FORWARD if self._spied is not None else None
+        self._counters = None
+        self._template = None
+        self._copies = None
+        self._required = None
+        self._source = None
+        self._sourced = None
+        self._stats = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        obj = state['_obj_ref'] = self.obj
+        state['_lookup'] = None
+        state['_last_hit'] = None
+        del state['_lock']
+        for descriptor, method in obj.__dict__.get('_mock_methods', {}).items():
+            if method is self:
+                state['func'] = descriptor
+                del state['inspect'], state['binder']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if isinstance(self.func, mock_method):
+            self.inspect = self.func.inspect
+            self.func = self.func.func
+            self.binder = self.inspect.binder(1)
+        self._obj_ref = _utils.ref(state['_obj_ref'])
+        self._lock = threading.Lock()
+        if self._template is not None:
+            self._lookup = self.__compile_template_lookup()
+        elif self._frozen and self.expectations:
+            self._lookup = self.expectations.compile()
 
     def __call__(self, *args, **kwargs):
-        call = MockMethodCall(self, args, kwargs)
-        if not self.expectations:
-            warnings.warn("Uniterested mock function called: %s" % call, exc.GolemWarning)
-            return
-        expectation = self.expectations.get(call)
+        if self._instrumentation:
+            return self.__call_instrumented(self._instrumentation, args, kwargs)
+        last_hit = self._last_hit
+        if last_hit is not None and _utils.is_same_call(args, kwargs, last_hit[0], last_hit[1]):
+            call = MockMethodCall(self, args, kwargs, last_hit[2])
+            if self.journal is not None:
+                self.__record(call.key, last_hit[3])
+            return last_hit[3].consume(call, self._default_action)
+        lookup = self._lookup
+        if lookup is None:
+            if not self.expectations and self._source is None:
+                return self.__call_uninterested(args, kwargs)
+            lookup = self.expectations.lookup
+        try:
+            call = MockMethodCall(self, args, kwargs)
+        except TypeError:
+            if self._spied is None:
+                raise
+            return self._forward(args, kwargs)
+        expectation, cacheable = lookup(call)
+        if expectation is None and self._source is not None:
+            expectation = self.__find_in_source(call)
+        if self.journal is not None:
+            self.__record(call.key, expectation)
         if expectation is None:
+            if self._spied is not None:
+                return self._forward(args, kwargs)
             raise exc.UnexpectedMockCallError(call)
-        result = expectation.consume(call)
-        if expectation.is_oversaturated():
-            raise exc.MockOversaturatedError(call, expectation)
+        if cacheable:
+            self._last_hit = (args, kwargs, call.key, expectation)
+        return expectation.consume(call, self._default_action)
+
+    def __call_instrumented(self, session, args, kwargs):
+        stats = self.__get_stats(session)
+        timer = session.timer
+        start = timer()
+        try:
+            call = MockMethodCall(self, args, kwargs)
+        except TypeError:
+            if self._spied is None:
+                raise
+            return self._forward(args, kwargs)
+        for hook in session.pre_call_hooks:
+            hook(call)
+        lookup = self._lookup
+        if lookup is None and (self.expectations or self._source is not None):
+            lookup = self.expectations.lookup
+        expectation = lookup(call)[0] if lookup is not None else None
+        if expectation is None and self._source is not None:
+            expectation = self.__find_in_source(call)
+        if lookup is not None and self.journal is not None:
+            self.__record(call.key, expectation)
+        action_start = timer()
+        result = error = None
+        try:
+            if expectation is not None:
+                result = expectation.consume(call, self._default_action)
+            elif lookup is None:
+                result = self.__call_uninterested(args, kwargs)
+            elif self._spied is not None:
+                result = self._forward(args, kwargs)
+            else:
+                raise exc.UnexpectedMockCallError(call)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            end = timer()
+            expected_call = expectation._call if expectation is not None else None
+            with self._lock if self.thread_safe else _utils.NullLock():
+                stats.record(expectation, expected_call, action_start - start, end - action_start)
+            for hook in session.post_call_hooks:
+                hook(call, result, error)
         return result
 
+    def __get_stats(self, session):
+        if self._stats is None or self._stats[0] is not session:
+            self._stats = session, session.create_stats(self.func_name)
+        return self._stats[1]
+
+    def enableInstrumentation(self, session=None):
+        """Instrument this mock using given
+        :class:`golem.instrument.Session`, or a new one, and return the
+        session."""
+        self._instrumentation = session or Session()
+        return self._instrumentation
+
+    def disableInstrumentation(self):
+        """Stop instrumenting this mock, even if instrumentation is enabled
+        for all mocks."""
+        self._instrumentation = False
+
+    def _forward(self, args, kwargs):
+        if self.thread_safe:
+            with self._lock:
+                self.forwarded_calls += 1
+        else:
+            self.forwarded_calls += 1
+        return getattr(self._spied, self.func.__name__)(*args, **kwargs)
+
+    def __record(self, key, expectation):
+        if self.thread_safe:
+            with self._lock:
+                self.journal.record(key, expectation)
+        else:
+            self.journal.record(key, expectation)
+
+    def __call_uninterested(self, args, kwargs):
+        if self.journal is not None:
+            try:
+                self.__record(self.binder.bind(args, kwargs), None)
+            except TypeError:
+                if self._spied is None:
+                    raise
+        if self._spied is not None:
+            return self._forward(args, kwargs)
+        current_policy = self._uninterested_policy or policy.get_uninterested_call_policy()
+        if current_policy == policy.IGNORE:
+            return
+        if self.thread_safe:
+            with self._lock:
+                self.uninterested_calls += 1
+        else:
+            self.uninterested_calls += 1
+        if current_policy == policy.COUNT:
+            return
+        if current_policy != policy.RAISE and _utils.is_warning_ignored(exc.UninterestedMockCallWarning, __name__):
+            return
+        call = MockMethodCall(self, args, kwargs)
+        if current_policy == policy.RAISE:
+            raise exc.UninterestedMockCallError(call)
+        elif current_policy == policy.WARN_ONCE:
+            key = call.key
+            with self._lock:
+                if self._uninterested_keys is None:
+                    self._uninterested_keys = set(), []
+                hashed, unhashable = self._uninterested_keys
+                if _utils.is_indexable(key):
+                    if key in hashed:
+                        return
+                    hashed.add(key)
+                elif key in unhashable:
+                    return
+                else:
+                    unhashable.append(key)
+        warnings.warn(exc.UninterestedMockCallWarning(call))
+
     def __eq__(self, other):
         return self.obj == other.obj and\
             self.func == other.func
 
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.func)
+
     def expectCall(self, *args, **kwargs):
         call = MockMethodCall(self, args, kwargs)
-        if call in self.expectations:
-            if not self.expectations[call].is_saturated():
+        call.key = _wrap_buffers(call.key)
+        if self._frozen:
+            raise exc.MockFrozenError(call)
+        if self._template is not None:
+            self.__detach_template()
+        previous = self.expectations.get(call)
+        if previous is not None:
+            if not previous.is_saturated():
                 raise exc.ExpectationNotConsumedError(call)
-        self.expectations[call] = expectation = Expectation()
+            previous.set_tracker(None, None)
+        call.weaken()
+        self.expectations[call] = expectation = Expectation(self.thread_safe)
+        self._last_hit = None
+        if self._counters is not None:
+            expectation.share(self._counters)
+        expectation.set_tracker(self._pending, call)
         return expectation
 
+    def enableJournal(self, maxlen=None, clock=None):
+        """Start recording calls of this mock in a new
+        :class:`golem.journal.CallJournal` and return it.
+
+        If *maxlen* is given, then only that many latest calls are kept.
+        """
+        self.journal = CallJournal(self.binder.slot_names, maxlen, clock)
+        return self.journal
+
+    def disableJournal(self):
+        self.journal = None
+
+    def freeze(self):
+        """Compile current expectations of this mock into specialized
+        dispatch function used by all subsequent calls.
+
+        Frozen mock behaves exactly as before, but adding expectations to it
+        raises :exc:`golem.exc.MockFrozenError` until :meth:`unfreeze` is
+        called. Actions of already recorded expectations can still be
+        changed.
+        """
+        self._frozen = True
+        self._last_hit = None
+        self._required = None
+        if self._template is None and self.expectations:
+            self._lookup = self.expectations.compile()
+
+    def unfreeze(self):
+        self._frozen = False
+        self._last_hit = None
+        if self._template is None:
+            self._lookup = None
+
+    @property
+    def frozen(self):
+        return self._frozen
+
+    def share(self, counters):
+        """Count calls of expectations of this mock, including ones added
+        later, in given :class:`golem.shared.SharedCounters`.
+
+        Must be called before the mock is copied to child processes.
+        """
+        if self._template is not None:
+            self.__detach_template()
+        self._counters = counters
+        for _, expectation in self.expectations.iteritems():
+            expectation.share(counters)
+        for expectation in self.__create_all_sourced():
+            expectation.share(counters)
+
+    def attachTemplate(self, template):
+        """Use expectations of given mock method, usually of another
+        instance of the same interface, as expectations of this one.
+
+        Expectations are not copied: call keys, matchers and actions of
+        *template* are shared by all mocks it is attached to and its
+        compiled dispatch function (see :meth:`freeze`) is used to match
+        calls. Each mock gets its own call counter and cursor of single
+        actions for an expectation when that expectation is first called or
+        verified. Until then, required expectations of *template* are only
+        counted as pending, so attaching takes constant time.
+        Template gets frozen and should not be changed afterwards, while
+        adding expectations to this mock copies all expectations of the
+        template to it first.
+        """
+        if self._template is not None or self._source is not None or self.expectations:
+            raise ValueError("%s already has expectations" % self.func_name)
+        required = template.__get_required()
+        if not template.expectations:
+            return
+        self._template = template
+        self._copies = {}
+        self._last_hit = None
+        self._lookup = self.__compile_template_lookup()
+        self._pending.set_implicit(len(required))
+
+    def attachSource(self, source):
+        """Create expectations of this mock on demand, from given *source*
+        of expected calls.
+
+        Source finds its entry matching a call key with ``find(key)``,
+        creates new :class:`Expectation` of an entry with ``create(entry)``
+        and returns ``(args, kwargs)`` of an entry with ``describe(entry)``.
+        Iterating it gives all its entries, in order they should be
+        verified, and each of them is expected to be called. Expectation of
+        an entry is created when the entry is first called or verified, so
+        large sources (like :func:`golem.trace.replay`) cost nothing until
+        used. Expectations of this mock are matched before the source.
+        """
+        if self._source is not None:
+            raise ValueError("%s already has a source of expectations" % self.func_name)
+        if self._template is not None:
+            self.__detach_template()
+        self._source = source
+        self._sourced = {}
+        self._last_hit = None
+        self._pending.set_implicit(len(source))
+        if self._counters is not None:
+            for expectation in self.__create_all_sourced():
+                expectation.share(self._counters)
+
+    def __find_in_source(self, call):
+        entry = self._source.find(call.key)
+        if entry is None:
+            return None
+        expectation = self._sourced.get(entry)
+        if expectation is None:
+            expectation = self.__create_sourced(entry)
+        return expectation
+
+    def __create_sourced(self, entry):
+        with self._lock:
+            expectation = self._sourced.get(entry)
+            if expectation is None:
+                args, kwargs = self._source.describe(entry)
+                call = MockMethodCall(self, args, kwargs)
+                call.weaken()
+                expectation = self._sourced[entry] = self._source.create(entry)
+                expectation.set_thread_safe(self.thread_safe)
+                if self._counters is not None:
+                    expectation.share(self._counters)
+                expectation.set_tracker(self._pending, call)
+                self._pending.set_implicit(self._pending.implicit - 1)
+        return expectation
+
+    def __create_all_sourced(self):
+        if self._source is None:
+            return []
+        return [self.__create_sourced(x) for x in self._source if x not in self._sourced]
+
+    def __get_required(self):
+        if self._required is None or not self._frozen:
+            for _, expectation in self.expectations.iteritems():
+                if not expectation.is_copyable():
+                    raise ValueError("expectations returning values of a stream cannot be shared")
+            self.freeze()
+            self._required = [(c, e) for c, e in self.expectations.iteritems() if e.is_required()]
+        return self._required
+
+    def __compile_template_lookup(self):
+        template = self._template
+        template_lookup = template._lookup
+        copies = self._copies
+        method_ref = weakref.ref(self)
+
+        def lookup(call):
+            expectation, cacheable = template_lookup(MockMethodCall(template, call.args, call.kwargs, call.key))
+            if expectation is not None:
+                copy = copies.get(expectation)
+                if copy is None:
+                    copy = method_ref()._copy_template_expectation(expectation)
+                return copy, cacheable
+            return None, cacheable
+
+        return lookup
+
+    def _copy_template_expectation(self, expectation):
+        with self._lock:
+            copy = self._copies.get(expectation)
+            if copy is None:
+                copy = self._copies[expectation] = expectation.copy(self.thread_safe)
+                copy.set_tracker(self._pending, expectation._call)
+                if expectation.is_required():
+                    self._pending.set_implicit(self._pending.implicit - 1)
+        return copy
+
+    def __detach_template(self):
+        template = self._template
+        for call, expectation in template.expectations.iteritems():
+            copy = self._copy_template_expectation(expectation)
+            own_call = MockMethodCall(self, call.args, call.kwargs, call.key)
+            own_call.weaken()
+            self.expectations[own_call] = copy
+            copy.set_tracker(self._pending, own_call)
+        self._template = self._copies = None
+        self._last_hit = None
+        self._lookup = self.expectations.compile() if self._frozen else None
+
+    def snapshot(self):
+        """Return snapshot of state of this mock, to be restored with
+        :meth:`restore`.
+
+        Snapshot keeps expectations of this mock with their call counts
+        and positions in queues of single actions, so restoring it is
+        much cheaper than recording the expectations again. Expectations
+        returning values of a stream cannot be captured, neither can
+        source of expectations (see :meth:`attachSource`). Journal is not
+        part of the snapshot.
+        """
+        if self._source is not None:
+            raise ValueError("%s has a source of expectations that cannot be captured" % self.func_name)
+        copies = self._copies
+        return _MockMethodSnapshot(
+            self.expectations.get_state(),
+            [(call, e, e.get_state()) for call, e in self.expectations.iteritems()],
+            self._frozen, self._lookup, self._template, copies,
+            None if copies is None else [(t, c, c.get_state()) for t, c in copies.items()],
+            self.uninterested_calls, self.forwarded_calls)
+
+    def restore(self, snapshot):
+        """Restore state captured by :meth:`snapshot`.
+
+        Expectations added since the snapshot was taken are removed and
+        call counters of remaining ones, including shared ones (see
+        :meth:`share`), are set back to captured values.
+        """
+        kept = set(x[1] for x in snapshot.expectations)
+        for _, expectation in self.expectations.iteritems():
+            if expectation not in kept:
+                expectation.set_tracker(None, None)
+        self._pending.clear()
+        rebuilt = self.expectations.set_state(snapshot.index)
+        for call, expectation, state in snapshot.expectations:
+            expectation.set_state(state)
+            expectation.set_tracker(self._pending, call)
+        self._template = snapshot.template
+        self._copies = snapshot.copies
+        if self._copies is not None:
+            self._copies.clear()
+            for template_expectation, copy, state in snapshot.copy_states:
+                self._copies[template_expectation] = copy
+                copy.set_state(state)
+                copy.set_tracker(self._pending, template_expectation._call)
+            required = self._template.__get_required()
+            self._pending.set_implicit(sum(1 for _, e in required if e not in self._copies))
+        self._source = self._sourced = None
+        self._frozen = snapshot.frozen
+        if rebuilt and self._frozen and self._template is None:
+            self._lookup = self.expectations.compile() if self.expectations else None
+        else:
+            self._lookup = snapshot.lookup
+        self._last_hit = None
+        self._uninterested_keys = None
+        self.uninterested_calls = snapshot.uninterested_calls
+        self.forwarded_calls = snapshot.forwarded_calls
+
+    def reset(self):
+        """Remove all expectations of this mock and clear its call
+        counters."""
+        self.restore(_EMPTY_SNAPSHOT)
+
     def assertSaturated(self):
-        for call, expectation in self.expectations.iteritems():
-            if expectation.is_undersaturated():
+        for call, expectation in self._pending.items():
+            if expectation.check_pending():
                 raise exc.MockUndersaturatedError(call, expectation)
+        if not self._pending.implicit:
+            return
+        elif self._source is not None:
+            for entry in self._source:
+                if entry not in self._sourced:
+                    expectation = self.__create_sourced(entry)
+                    if expectation.check_pending():
+                        raise exc.MockUndersaturatedError(expectation._call, expectation)
+        else:
+            for call, expectation in self._template.__get_required():
+                if expectation not in self._copies:
+                    copy = self._copy_template_expectation(expectation)
+                    if copy.check_pending():
+                        raise exc.MockUndersaturatedError(call, copy)
+
+    def addPendingListener(self, listener):
+        """Register set-like *listener* to which this mock is added while it
+        has undersaturated expectations and from which it is discarded
+        once all of them become satisfied.
+
+        Listener is referenced weakly, so it must support weak references
+        (like :class:`set` does)."""
+        self._pending.add_listener(listener)
+
+    @property
+    def pending_count(self):
+        """Number of expectations of this mock that are not yet satisfied.
+
+        Expectations returning values of a stream of unknown length are
+        counted until the stream is found exhausted.
+        """
+        if self._counters is not None:
+            for _, expectation in self._pending.items():
+                expectation.check_pending()
+        return len(self._pending)
+
+    def waitSaturated(self):
+        """Return awaitable completed once all expectations of this mock
+        are no longer undersaturated."""
+        return _async.Awaitable(self.__wait_saturated)
+
+    def __wait_saturated(self):
+        if self._template is not None:
+            self.__detach_template()
+        self.__create_all_sourced()
+        expectations = [e for _, e in self.expectations.iteritems()]
+        if self._sourced:
+            expectations.extend(self._sourced.values())
+        return _async.gather([e.wait_saturated() for e in expectations])
 
     @property
-    def expectations(self):
-        if not hasattr(self.obj, '_mock_expectations'):
-            self.obj._mock_expectations = {}
-        return self.obj._mock_expectations.setdefault(self.func, {})
+    def uninterested_policy(self):
+        return self._uninterested_policy
+
+    @uninterested_policy.setter
+    def uninterested_policy(self, value):
+        if value is not None:
+            value = policy.validate_uninterested_call_policy(value)
+        self._uninterested_policy = value
+
+    @property
+    def thread_safe(self):
+        if self._thread_safe is None:
+            return policy.is_thread_safe()
+        return self._thread_safe
+
+    @thread_safe.setter
+    def thread_safe(self, value):
+        self._thread_safe = value
+        enabled = self.thread_safe
+        for _, expectation in self.expectations.iteritems():
+            expectation.set_thread_safe(enabled)
+        for copy in (self._copies or {}).values():
+            copy.set_thread_safe(enabled)
+        for expectation in (self._sourced or {}).values():
+            expectation.set_thread_safe(enabled)
 
     @property
-    def func_name(self):
-        return "%s.%s" % (self.obj.__class__.__name__, self.func.func_name)
+    def obj(self):
+        return self._obj_ref()
+
+
+def enable_instrumentation(session=None):
+    """Instrument all mocks using given :class:`golem.instrument.Session`,
+    or a new one, and return the session.
+
+    Mocks instrumented or disabled individually keep their own setting.
+    """
+    MockMethod._instrumentation = session or Session()
+    return MockMethod._instrumentation
+
+
+def disable_instrumentation():
+    MockMethod._instrumentation = None
+
+
+def freeze(obj):
+    """Freeze all mock methods of given object (see :meth:`MockMethod.freeze`)."""
+    for method in _iter_mock_methods(obj):
+        method.freeze()
+    return obj
+
+
+def attach_template(obj, template):
+    """Attach expectations of mock methods of *template* object to mock
+    methods of given object (see :meth:`MockMethod.attachTemplate`)."""
+    for method in _iter_mock_methods(template):
+        if method.expectations:
+            getattr(obj, method.func.__name__).attachTemplate(method)
+    return obj
+
+
+def unfreeze(obj):
+    for method in _iter_mock_methods(obj):
+        method.unfreeze()
+    return obj
+
+
+def snapshot(obj):
+    """Return snapshot of all mock methods of given object (see
+    :meth:`MockMethod.snapshot`)."""
+    return dict((method.func.__name__, method.snapshot()) for method in _iter_mock_methods(obj))
+
+
+def restore(obj, snapshot):
+    for name, state in snapshot.items():
+        getattr(obj, name).restore(state)
+    return obj
+
+
+def reset(obj):
+    for method in _iter_mock_methods(obj):
+        method.reset()
+    return obj
+
+
+def _wrap_buffers(key):
+    if not any(_utils.supports_buffer(x) for x in key):
+        return key
+    return tuple(matchers.BufferEq(x) if _utils.supports_buffer(x) else x for x in key)
+
+
+def _iter_mock_methods(obj):
+    seen = set()
+    for cls in inspect.getmro(obj.__class__):
+        for name, value in cls.__dict__.items():
+            if name not in seen and isinstance(value, mock_method):
+                seen.add(name)
+                yield getattr(obj, name)
+
+
+class _MockMethodSnapshot(object):
+    __slots__ = (
+        'index', 'expectations', 'frozen', 'lookup', 'template', 'copies',
+        'copy_states', 'uninterested_calls', 'forwarded_calls')
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+_EMPTY_SNAPSHOT = _MockMethodSnapshot((0, []), [], False, None, None, None, None, 0, 0)
+
+
+class AsyncMockMethod(MockMethod):
+    """Mock of a coroutine function.
+
+    Calling it returns an awaitable and the call is dispatched when that
+    awaitable is awaited. If action returns an awaitable, then it is
+    awaited as well.
+    """
+    is_async = True
+
+    def __call__(self, *args, **kwargs):
+        return _async.Awaitable(super(AsyncMockMethod, self).__call__, args, kwargs)
+
+
+class _Forward(object):
+    __slots__ = ()
+
+    def __call__(self, call):
+        return call.method._forward(call.args, call.kwargs)
+
+_FORWARD = _Forward()
 
 
 class MockMethodCall(object):
+    __slots__ = ('_method', 'args', 'kwargs', 'key')
 
-    def __init__(self, method, args, kwargs):
-        self.method = method
+    def __init__(self, method, args, kwargs, key=None):
+        self._method = method
         self.args = args
         self.kwargs = kwargs
+        self.key = method.binder.bind(args, kwargs) if key is None else key
+
+    def __getstate__(self):
+        return self.method, type(self._method) is weakref.ref, self.args, self.kwargs, self.key
+
+    def __setstate__(self, state):
+        self._method, weak, self.args, self.kwargs, self.key = state
+        if weak:
+            self.weaken()
+
+    @property
+    def method(self):
+        method = self._method
+        if type(method) is weakref.ref:
+            return method()
+        return method
+
+    def weaken(self):
+        """Make this call reference its mock method weakly, so the method
+        can store it without creating reference cycle."""
+        self._method = weakref.ref(self.method)
 
     def __eq__(self, other):
-        return self.method == other.method and\
-            self.args == other.args and\
-            self.kwargs == other.kwargs
+        return (self.method is other.method or self.method == other.method) and\
+            self.key == other.key
 
     def __hash__(self):
         return 1
@@ -83,56 +838,284 @@ class MockMethodCall(object):
         if self.args:
             tmp.append(', '.join(repr(x) for x in self.args))
         if self.kwargs:
-            tmp.append(', '.join("%s=%r" % (k, v) for k, v in sorted(self.kwargs.iteritems())))
+            tmp.append(', '.join("%s=%r" % (k, v) for k, v in sorted(self.kwargs.items())))
         return "%s(%s)" % (self.method.func_name, ', '.join(tmp))
 
     def __repr__(self):
         return str(self)
 
     def get_normalized_args(self):
-        return self.method.inspect.normalize(self.method.obj, *self.args, **self.kwargs)
+        result = self.method.binder.to_dict(self.key)
+        result[self.method.inspect.arg_names[0]] = self.method.obj
+        return result
 
 
 class Expectation(object):
+    __slots__ = (
+        '_times', '_single_actions', '_repeatable_action', '_lock', '_waiters',
+        '_tracker', '_call', '_pending', '_shared')
 
-    def __init__(self):
+    def __init__(self, thread_safe=False):
         self._times = Exactly(1)
-        self._single_actions = collections.deque()
+        self._single_actions = None
         self._repeatable_action = None
+        self._lock = None
+        self._waiters = None
+        self._tracker = None
+        self._call = None
+        self._pending = False
+        self._shared = None
+        self.set_thread_safe(thread_safe)
 
-    def consume(self, call):
-        self._times += 1
-        action = self.__consume_action()
-        if action is not None:
-            return action(call)
+    def __getstate__(self):
+        state = dict((name, getattr(self, name)) for name in self.__slots__)
+        state['_lock'] = self._lock is not None
+        state['_waiters'] = None
+        state['_tracker'] = self.__get_tracker()
+        return state
 
-    def __consume_action(self):
-        if self._single_actions:
-            return self._single_actions.popleft()
-        elif self._repeatable_action:
-            return self._repeatable_action
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._lock = None
+        self.set_thread_safe(state['_lock'])
+        if self._tracker is not None:
+            self._tracker = weakref.ref(self._tracker)
+
+    def set_tracker(self, tracker, call):
+        """Make this expectation report changes of its saturation state to
+        given :class:`PendingExpectations` object, using given *call* as
+        its description.
+
+        Tracker is referenced weakly, as it is owned by the mock method
+        that owns this expectation.
+        """
+        previous = self.__get_tracker()
+        if previous is not None:
+            previous.set_pending(self, self._call, False)
+        self._tracker = weakref.ref(tracker) if tracker is not None else None
+        self._call = call
+        self._pending = False
+        self.__update_tracker()
+
+    def check_pending(self):
+        """Check if this expectation is undersaturated, updating tracker
+        if state changed since last check."""
+        self.__sync()
+        pending = self._times.is_undersaturated()
+        if pending != self._pending:
+            tracker = self.__get_tracker()
+            if tracker is not None:
+                self._pending = pending
+                tracker.set_pending(self, self._call, pending)
+        return pending
+
+    def __get_tracker(self):
+        if self._tracker is not None:
+            return self._tracker()
+
+    def is_tracked_by(self, tracker):
+        return self.__get_tracker() is tracker
+
+    def __update_tracker(self):
+        tracker = self.__get_tracker()
+        if tracker is not None:
+            self._pending = self._times.lazy or self._times.is_undersaturated()
+            tracker.set_pending(self, self._call, self._pending)
+
+    def set_thread_safe(self, enabled):
+        """Enable or disable thread safe mode for this expectation.
+
+        In thread safe mode, counting of calls and picking of action to be
+        executed is guarded by a lock owned by this expectation, but the
+        action itself is executed outside of the lock.
+        """
+        if not enabled:
+            self._lock = None
+        elif self._lock is None:
+            self._lock = threading.Lock()
+
+    def consume(self, call, default_action=None):
+        """Count given call and execute next action of this expectation,
+        or *default_action* if there is none."""
+        lock = self._lock
+        if lock is None:
+            oversaturated, action = self.__consume()
         else:
-            return None
+            with lock:
+                oversaturated, action = self.__consume()
+        if self._waiters is not None:
+            self.__notify_waiters()
+        if action is None:
+            action = default_action
+        result = action(call) if action is not None else None
+        if oversaturated:
+            raise exc.MockOversaturatedError(call, self)
+        return result
+
+    def __consume(self):
+        if self._shared is None:
+            action = self.__consume_action()
+            self._times += 1
+        else:
+            counters, index = self._shared
+            self._times.actual = counters.increment(index)
+            self.__skip_actions(self._times.actual - 1)
+            action = self.__consume_action()
+        if self._pending and not self._times.lazy and not self._times.is_undersaturated():
+            self._pending = False
+            tracker = self.__get_tracker()
+            if tracker is not None:
+                tracker.set_pending(self, self._call, False)
+        return self._times.is_oversaturated(), action
+
+    def __notify_waiters(self):
+        with self._lock or _utils.NullLock():
+            if self._times.is_undersaturated():
+                return
+            waiters, self._waiters = self._waiters, None
+        if waiters:
+            _async.notify_waiters(waiters)
+
+    def wait_saturated(self):
+        """Return awaitable completed once this expectation is no longer
+        undersaturated.
+
+        Can be used instead of polling when the calls are made by other
+        tasks or threads.
+        """
+        return _async.Awaitable(self.__wait_saturated)
+
+    def __wait_saturated(self):
+        waiter = _async.create_waiter()
+        with self._lock or _utils.NullLock():
+            if self._times.is_undersaturated():
+                if self._waiters is None:
+                    self._waiters = []
+                self._waiters.append(waiter)
+                return waiter
+        waiter.set_result(None)
+        return waiter
+
+    def copy(self, thread_safe=False):
+        """Return expectation expecting same number of calls and having
+        same actions as this one, but with its own call counter.
+
+        Actions are shared with this expectation, not copied.
+        """
+        result = Expectation(thread_safe)
+        result._times = self._times.__class__(self._times.expected)
+        if self._single_actions is not None:
+            result._single_actions = self._single_actions.copy()
+        result._repeatable_action = self._repeatable_action
+        return result
+
+    def is_copyable(self):
+        return self._single_actions is None or self._single_actions.is_copyable()
+
+    def get_state(self):
+        """Return current call count, times and actions of this
+        expectation, to be restored with :meth:`set_state`."""
+        queue = self._single_actions
+        return self._times, self._times.actual, self._repeatable_action,\
+            queue, queue.get_state() if queue is not None else None
+
+    def set_state(self, state):
+        self._times, self._times.actual, self._repeatable_action, self._single_actions, queue_state = state
+        if queue_state is not None:
+            self._single_actions.set_state(queue_state)
+        if self._shared is not None:
+            counters, index = self._shared
+            counters.set(index, self._times.actual)
+        self.__update_tracker()
+
+    def is_required(self):
+        """Check if copy of this expectation would be undersaturated until
+        called."""
+        return self._times.__class__(self._times.expected).is_undersaturated()
+
+    def share(self, counters):
+        """Count calls of this expectation in a counter allocated from
+        given :class:`golem.shared.SharedCounters`.
+
+        Calls made in all processes sharing the counters are then counted
+        together and single actions are executed in order of global calls,
+        so each of them is still executed once. Counts seen by verification
+        methods are read from the shared counter.
+        """
+        self._shared = counters, counters.allocate(self._times.actual)
+
+    def __sync(self):
+        if self._shared is not None:
+            counters, index = self._shared
+            self._times.actual = counters.get(index)
+            self.__skip_actions(self._times.actual)
+
+    def __skip_actions(self, count):
+        queue = self._single_actions
+        if queue is not None:
+            while queue.consumed < count and queue.pop() is not None:
+                pass
+
+    def __consume_action(self):
+        if self._single_actions is not None:
+            action = self._single_actions.pop()
+            if action is not None:
+                return action
+        return self._repeatable_action
 
     def times(self, times):
         if isinstance(times, int):
             self._times = Exactly(times)
         else:
             self._times = times
+        self.__update_tracker()
 
     def willOnce(self, action):
+        if self._single_actions is None:
+            self._single_actions = ActionQueue()
         self._single_actions.append(action)
-        self._times = Exactly(len(self._single_actions))
+        self.__update_times(Exactly)
+        self.__update_tracker()
+        return self
+
+    def willReturnEach(self, values):
+        """Return items of given iterable, one per call.
+
+        Items are pulled lazily, one call at a time, so *values* can be a
+        generator or other large stream that should not be loaded up
+        front. If *values* has a length, then the expectation is to be
+        called that many times, otherwise it is to be called until
+        *values* are exhausted.
+        """
+        if self._single_actions is None:
+            self._single_actions = ActionQueue()
+        self._single_actions.append_stream(values)
+        self.__update_times(Exactly)
+        self.__update_tracker()
         return self
 
     def willRepeatedly(self, action):
-        self._times = AtLeast(len(self._single_actions))
+        self.__update_times(AtLeast)
         self._repeatable_action = action
+        self.__update_tracker()
+
+    def __update_times(self, times_class):
+        if self._single_actions is None:
+            self._times = times_class(0)
+            return
+        pending = self._single_actions.pending()
+        if pending is None:
+            self._times = UntilExhausted(self._single_actions, repeatable=times_class is AtLeast)
+        else:
+            self._times = times_class(pending)
 
     def is_undersaturated(self):
+        self.__sync()
         return self._times.is_undersaturated()
 
     def is_oversaturated(self):
+        self.__sync()
         return self._times.is_oversaturated()
 
     def is_saturated(self):
@@ -141,8 +1124,238 @@ class Expectation(object):
 
     @property
     def actual_calls(self):
+        self.__sync()
         return self._times.actual
 
     @property
     def expected_calls(self):
         return self._times
+
+
+class PendingExpectations(object):
+    """Live set of undersaturated expectations of a mock method.
+
+    Expectations report changes of their state themselves, so verifying
+    saturation of a mock visits only expectations that are not yet
+    satisfied. Expectations that are pending, but not created yet (like
+    required expectations of a template, see
+    :meth:`MockMethod.attachTemplate`), are only counted.
+
+    Owning mock method and listeners are referenced weakly.
+    """
+    __slots__ = ('_owner', '_items', '_counter', '_listeners', 'implicit', '__weakref__')
+
+    def __init__(self, owner):
+        self._owner = weakref.ref(owner)
+        self._items = {}
+        self._counter = 0
+        self._listeners = []
+        self.implicit = 0
+
+    def __getstate__(self):
+        return self._owner(), self._items, self._counter, self.implicit
+
+    def __setstate__(self, state):
+        owner, self._items, self._counter, self.implicit = state
+        self._owner = weakref.ref(owner)
+        self._listeners = []
+
+    def __len__(self):
+        return len(self._items) + self.implicit
+
+    def set_pending(self, expectation, call, pending):
+        if pending:
+            if expectation not in self._items:
+                self._items[expectation] = (self._counter, call)
+                self._counter += 1
+                if len(self) == 1:
+                    self.__notify('add')
+        elif self._items.pop(expectation, None) is not None and not len(self):
+            self.__notify('discard')
+
+    def set_implicit(self, count):
+        """Set number of pending expectations that are not created yet."""
+        was_pending = bool(len(self))
+        self.implicit = count
+        if not was_pending and len(self):
+            self.__notify('add')
+        elif was_pending and not len(self):
+            self.__notify('discard')
+
+    def clear(self):
+        if len(self):
+            self._items.clear()
+            self.implicit = 0
+            self.__notify('discard')
+
+    def __notify(self, method_name):
+        owner = self._owner()
+        if owner is None:
+            return
+        for ref in self._listeners:
+            listener = ref()
+            if listener is not None:
+                getattr(listener, method_name)(owner)
+
+    def items(self):
+        """Return list of ``(call, expectation)`` pairs, ordered by time the
+        expectations were first reported pending."""
+        items = sorted(self._items.items(), key=lambda x: x[1][0])
+        return [(call, expectation) for expectation, (_, call) in items]
+
+    def add_listener(self, listener):
+        if any(x() is listener for x in self._listeners):
+            return
+        self._listeners.append(weakref.ref(listener))
+        if len(self):
+            listener.add(self._owner())
+
+
+class ActionQueue(object):
+    """Queue of single actions of an expectation.
+
+    Besides actions, queue can hold streams of values (see
+    :meth:`Expectation.willReturnEach`), which are consumed lazily.
+    """
+    __slots__ = ('_items', '_cursor', 'consumed', '_shared', '_pending', '_unknown')
+
+    def __init__(self):
+        self._items = []
+        self._cursor = 0
+        self.consumed = 0
+        self._shared = False
+        self._pending = 0
+        self._unknown = 0
+
+    def __iter__(self):
+        return itertools.islice(self._items, self._cursor, None)
+
+    def __len__(self):
+        return len(self._items) - self._cursor
+
+    def append(self, action):
+        self.__own_items().append(action)
+        self._pending += 1
+
+    def append_stream(self, values):
+        stream = _ValueStream(values)
+        self.__own_items().append(stream)
+        count = stream.pending()
+        if count is None:
+            self._unknown += 1
+        else:
+            self._pending += count
+
+    def __own_items(self):
+        if self._shared:
+            self._items = self._items[:]
+            self._shared = False
+        return self._items
+
+    def pending(self):
+        """Return number of actions left in the queue or ``None`` if it is
+        not known until the queue is exhausted."""
+        if self._unknown:
+            return None
+        return self._pending
+
+    def copy(self):
+        """Return queue sharing actions with this one, but having its own
+        cursor.
+
+        Shared actions are no longer released once consumed and actions
+        appended later are appended to a copy of the actions.
+        """
+        result = ActionQueue()
+        result.set_state(self.get_state())
+        return result
+
+    def get_state(self):
+        """Return current position in the queue, to be restored with
+        :meth:`set_state`."""
+        if not self.is_copyable():
+            raise ValueError("queues of value streams cannot be copied")
+        self._shared = True
+        return self._items, self._cursor, self.consumed, self._pending
+
+    def set_state(self, state):
+        self._items, self._cursor, self.consumed, self._pending = state
+        self._unknown = 0
+        self._shared = True
+
+    def is_copyable(self):
+        return all(type(x) is not _ValueStream for x in self)
+
+    def pop(self):
+        items = self._items
+        while self._cursor < len(items):
+            item = items[self._cursor]
+            if type(item) is _ValueStream:
+                action = item.pop()
+                if action is not None:
+                    self.consumed += 1
+                    if item.pending() is not None:
+                        self._pending -= 1
+                    return action
+                self.__drop_stream(item)
+            if not self._shared:
+                items[self._cursor] = None
+            self._cursor += 1
+            if type(item) is not _ValueStream:
+                self.consumed += 1
+                self._pending -= 1
+                return item
+
+    def is_exhausted(self):
+        items = self._items
+        while self._cursor < len(items):
+            item = items[self._cursor]
+            if type(item) is not _ValueStream or item.has_next():
+                return False
+            self.__drop_stream(item)
+            items[self._cursor] = None
+            self._cursor += 1
+        return True
+
+    def __drop_stream(self, stream):
+        count = stream.pending()
+        if count is None:
+            self._unknown -= 1
+        else:
+            self._pending -= count
+
+
+class _ValueStream(object):
+    __slots__ = ('_iterator', '_length', '_produced', '_lookahead')
+
+    def __init__(self, values):
+        try:
+            self._length = len(values)
+        except TypeError:
+            self._length = None
+        self._iterator = iter(values)
+        self._produced = 0
+        self._lookahead = _NOTHING
+
+    def pending(self):
+        if self._length is None:
+            return None
+        return self._length - self._produced
+
+    def has_next(self):
+        if self._lookahead is _NOTHING:
+            try:
+                self._lookahead = next(self._iterator)
+            except StopIteration:
+                return False
+        return True
+
+    def pop(self):
+        if not self.has_next():
+            return None
+        value, self._lookahead = self._lookahead, _NOTHING
+        self._produced += 1
+        return Return(value)
+
+
+_NOTHING = object()
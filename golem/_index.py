@@ -0,0 +1,356 @@
+import bisect
+import itertools
+
+from golem import _compat, _utils, matchers
+
+#: Maximal number of merged candidate lists cached for single argument
+#: position.
+CANDIDATES_CACHE_SIZE = 1024
+
+_NO_VALUE = object()
+
+_NOT_REAL = object()
+
+# Builtin types whose instances fail to compare with real numbers, so they
+# never match range matchers. In Python 2 everything can be compared.
+_UNORDERED_TYPES = frozenset() if _compat.PY2 else\
+    frozenset((type(None), complex) + _compat.string_types)
+
+
+class _Entry(object):
+    __slots__ = ('seq', 'call', 'expectation', 'fingerprints')
+
+    def __init__(self, seq, call, expectation):
+        self.seq = seq
+        self.call = call
+        self.expectation = expectation
+        self.fingerprints = None
+
+
+class ExpectationIndex(object):
+    """Ordered set of expectations recorded for a single mock method.
+
+    Expectations with keys made of plain hashable values (see
+    :func:`golem._utils.is_indexable`) are kept in hash buckets, while the
+    ones containing matchers or unhashable values are kept in a list
+    ordered by recording time. Lookup returns the earliest recorded
+    expectation that matches given call, exactly as a linear scan would,
+    but exact matches are found in constant time.
+
+    Fallback expectations are additionally bucketed, separately for each
+    argument position, using index hints of expected argument values (see
+    :func:`golem.matchers.get_index_hint`). Lookup picks the position
+    giving fewest candidates, so it only runs matchers of expectations
+    that can possibly match given call. Candidates are merged once per
+    combination of buckets and reused until the index changes.
+
+    Large immutable builtin sequences and containers found in keys are
+    fingerprinted when stored (see :func:`golem._utils.fingerprint`), so candidates
+    that surely differ from given call are rejected without full
+    comparison.
+    """
+
+    def __init__(self):
+        self._next_seq = 0
+        self.__clear()
+
+    def __clear(self):
+        self._exact = {}
+        self._fallback = []
+        self._guarded = {}
+        self._fingerprinted = 0
+
+    def __len__(self):
+        return len(self._exact) + len(self._fallback)
+
+    def __nonzero__(self):
+        return bool(self._exact) or bool(self._fallback)
+
+    __bool__ = __nonzero__
+
+    def __contains__(self, call):
+        return self._find(call) is not None
+
+    def __getitem__(self, call):
+        entry = self._find(call)
+        if entry is None:
+            raise KeyError(call)
+        return entry.expectation
+
+    def __setitem__(self, call, expectation):
+        entry = self._find(call)
+        if entry is not None:
+            entry.expectation = expectation
+            return
+        self.__add(_Entry(self._next_seq, call, expectation))
+        self._next_seq += 1
+
+    def __add(self, entry):
+        key = entry.call.key
+        fingerprints = tuple((i, x) for i, x in enumerate(_fingerprints(key)) if x is not None)
+        if fingerprints:
+            entry.fingerprints = fingerprints
+            self._fingerprinted += 1
+        if _utils.is_indexable(key):
+            self._exact[key] = entry
+        else:
+            self._fallback.append(entry)
+            self._add_guarded(entry, key)
+
+    def get_state(self):
+        """Return current set of expectations, to be restored with
+        :meth:`set_state`."""
+        return self._next_seq, [(x, x.expectation) for x in self._entries()]
+
+    def set_state(self, state):
+        """Restore set of expectations returned by :meth:`get_state`.
+
+        Returns ``True`` if the index had to be rebuilt, because
+        expectations were added since the state was taken, or ``False``
+        if only the expectations of existing keys were reset.
+        """
+        next_seq, entries = state
+        for entry, expectation in entries:
+            entry.expectation = expectation
+        if next_seq == self._next_seq and len(entries) == len(self):
+            return False
+        self.__clear()
+        for entry, _ in entries:
+            entry.fingerprints = None
+            self.__add(entry)
+        self._next_seq = next_seq
+        return True
+
+    def get(self, call, default=None):
+        entry = self._find(call)
+        if entry is None:
+            return default
+        return entry.expectation
+
+    def lookup(self, call):
+        """Return ``(expectation, cacheable)`` pair for given call.
+
+        Expectation is ``None`` if none matches. Result is cacheable if it
+        was found by hash lookup and there are no expectations with keys
+        compared by equality, so same arguments will always give same
+        result until the index is changed.
+        """
+        key = call.key
+        if self._fallback or not _utils.is_indexable(key):
+            return self.get(call), False
+        entry = self._exact.get(key)
+        if entry is None:
+            return None, False
+        return entry.expectation, True
+
+    def iteritems(self):
+        for entry in self._entries():
+            yield entry.call, entry.expectation
+
+    def compile(self):
+        """Return function working like :meth:`lookup`.
+
+        Returned function is specialized for expectations currently stored
+        in the index: exact matches are resolved with single dict lookup,
+        and fallback expectations are checked only if any of them could
+        shadow the exact match. Later changes of the index are not
+        visible to the function.
+        """
+        first_fallback = self._fallback[0].seq if self._fallback else None
+        exact = {}
+        for key, entry in self._exact.items():
+            shadowed = first_fallback is not None and first_fallback < entry.seq
+            exact[key] = (entry.seq, entry.expectation, shadowed)
+        exact_get = exact.get
+        entries = self._entries()
+        candidates = self._candidates if self._fallback else None
+        first_match = self._first_match
+        is_indexable = _utils.is_indexable
+
+        def lookup(call):
+            key = call.key
+            if not is_indexable(key):
+                entry = first_match(entries, call)
+                return (entry.expectation if entry is not None else None), False
+            hit = exact_get(key)
+            if hit is None:
+                if candidates is not None:
+                    entry = first_match(candidates(key), call)
+                    if entry is not None:
+                        return entry.expectation, False
+                return None, False
+            elif candidates is None:
+                return hit[1], True
+            elif hit[2]:
+                entry = first_match(candidates(key), call, hit[0])
+                if entry is not None:
+                    return entry.expectation, False
+            return hit[1], False
+
+        return lookup
+
+    def _entries(self):
+        if not self._fallback:
+            return sorted(self._exact.values(), key=lambda x: x.seq)
+        elif not self._exact:
+            return list(self._fallback)
+        return sorted(itertools.chain(self._exact.values(), self._fallback), key=lambda x: x.seq)
+
+    def _find(self, call):
+        key = call.key
+        if not _utils.is_indexable(key):
+            return self._first_match(self._entries(), call)
+        entry = self._exact.get(key)
+        if not self._fallback:
+            return entry
+        candidate = self._first_match(self._candidates(key), call, entry.seq if entry is not None else None)
+        return candidate if candidate is not None else entry
+
+    def _add_guarded(self, entry, key):
+        hints = {}
+        for position, value in enumerate(key):
+            hint = matchers.get_index_hint(value)
+            if hint is not None:
+                hints[position] = hint
+        for position in hints:
+            if position not in self._guarded:
+                self._guarded[position] = _Guard(self._fallback[:-1])
+        for position, guard in self._guarded.items():
+            guard.add(entry, hints.get(position))
+
+    def _candidates(self, key):
+        best = None
+        for position, guard in self._guarded.items():
+            if position < len(key):
+                found = guard.candidates(key[position])
+                if best is None or len(found) < len(best):
+                    best = found
+        if best is None:
+            return self._fallback
+        return best
+
+    def _first_match(self, entries, call, before=None):
+        fingerprints = _fingerprints(call.key) if self._fingerprinted else None
+        for entry in entries:
+            if before is not None and entry.seq > before:
+                break
+            if fingerprints is not None and entry.fingerprints is not None and\
+                    _differ(entry.fingerprints, fingerprints):
+                continue
+            if entry.call == call:
+                return entry
+
+
+class _Guard(object):
+    """Buckets of fallback expectations made for single argument position.
+
+    Expectations are bucketed by index hints of their expected values at
+    that position: by type, by value and by range of real numbers (kept
+    along with sorted range bounds), or put aside as others if there is
+    no hint. Candidates for given value are merged from matching buckets
+    and cached per value type, value bucket and segment between range
+    bounds, as these fully determine the result. Range matchers are
+    candidates for all values that are neither real numbers nor of types
+    known to be unordered against them.
+    """
+    __slots__ = ('by_type', 'by_value', 'ranges', 'bounds', 'others', '_cache', '_segments')
+
+    def __init__(self, others):
+        self.by_type = {}
+        self.by_value = {}
+        self.ranges = []
+        self.bounds = []
+        self.others = others
+        self._cache = {}
+        self._segments = {}
+
+    def add(self, entry, hint):
+        self._cache.clear()
+        self._segments.clear()
+        if hint is None:
+            self.others.append(entry)
+        elif hint[0] == matchers.INDEX_BY_TYPE:
+            for type_ in set(hint[1]):
+                self.by_type.setdefault(type_, []).append(entry)
+        elif hint[0] == matchers.INDEX_BY_RANGE:
+            self.ranges.append((entry, hint[1]))
+            if hint[1] is not None:
+                for bound in hint[1][:2]:
+                    if bound is not None:
+                        self.__add_bound(bound)
+        else:
+            self.by_value.setdefault(hint[1], []).append(entry)
+
+    def __add_bound(self, bound):
+        i = bisect.bisect_left(self.bounds, bound)
+        if i == len(self.bounds) or self.bounds[i] != bound:
+            self.bounds.insert(i, bound)
+
+    def candidates(self, value):
+        """Return expectations that can match given value, ordered by
+        recording time."""
+        bucket_value = value if self.by_value and value in self.by_value else _NO_VALUE
+        segment = None
+        if self.ranges:
+            if _utils.is_real(value):
+                i = bisect.bisect_left(self.bounds, value)
+                segment = 2 * i + 1 if i < len(self.bounds) and self.bounds[i] == value else 2 * i
+            elif type(value) in _UNORDERED_TYPES:
+                segment = _NOT_REAL
+        cache_key = (type(value), bucket_value, segment)
+        found = self._cache.get(cache_key)
+        if found is None:
+            if len(self._cache) >= CANDIDATES_CACHE_SIZE:
+                self._cache.clear()
+            found = self._cache[cache_key] = self.__merge(value, bucket_value, segment)
+        return found
+
+    def __merge(self, value, bucket_value, segment):
+        buckets = [self.others] if self.others else []
+        if bucket_value is not _NO_VALUE:
+            buckets.append(self.by_value[bucket_value])
+        if self.by_type:
+            for type_ in type(value).__mro__:
+                bucket = self.by_type.get(type_)
+                if bucket:
+                    buckets.append(bucket)
+        if self.ranges:
+            bucket = self._segments.get(segment)
+            if bucket is None:
+                if segment is None:
+                    bucket = [entry for entry, _ in self.ranges]
+                elif segment is _NOT_REAL:
+                    bucket = [entry for entry, range_ in self.ranges if range_ is None]
+                else:
+                    bucket = [entry for entry, range_ in self.ranges if _in_range(value, range_)]
+                self._segments[segment] = bucket
+            if bucket:
+                buckets.append(bucket)
+        if not buckets:
+            return []
+        elif len(buckets) == 1:
+            return buckets[0]
+        candidates = sorted(itertools.chain(*buckets), key=lambda x: x.seq)
+        return [x for i, x in enumerate(candidates) if i == 0 or candidates[i - 1] is not x]
+
+
+def _in_range(value, range_):
+    if range_ is None:
+        return False
+    low, high, low_inclusive, high_inclusive = range_
+    if low is not None and (value < low or (value == low and not low_inclusive)):
+        return False
+    if high is not None and (value > high or (value == high and not high_inclusive)):
+        return False
+    return True
+
+
+def _fingerprints(key):
+    return [_utils.fingerprint(x) for x in key]
+
+
+def _differ(expected, actual):
+    for i, fingerprint in expected:
+        if i < len(actual) and _utils.fingerprints_differ(fingerprint, actual[i]):
+            return True
+    return False
@@ -1,4 +1,26 @@
-import inspect
+import weakref
+import warnings
+
+from golem import _compat
+
+_SCALAR_TYPES = frozenset(
+    (type(None), bool, float, complex) + _compat.integer_types + _compat.string_types)
+
+_REAL_TYPES = frozenset((bool, float) + _compat.integer_types)
+
+_indexable_types = {}
+
+#: Minimal length of immutable builtin sequences and containers that get
+#: fingerprinted (see :func:`fingerprint`).
+FINGERPRINT_MIN_LENGTH = 64
+
+_FINGERPRINT_SAMPLES = 8
+
+_SEQUENCE_TYPES = frozenset((list, tuple, bytearray) + _compat.string_types)
+
+_CONTAINER_TYPES = frozenset((dict, set, frozenset))
+
+_FINGERPRINTED_SEQUENCE_TYPES = frozenset((tuple,) + _compat.string_types)
 
 
 def number_of_times_to_string(value):
@@ -12,73 +34,369 @@ def number_of_times_to_string(value):
         return "%s times" % value
 
 
+def ref(obj):
+    """Create weak reference to given object if it supports weak references,
+    or strong reference-like callable otherwise."""
+    try:
+        return weakref.ref(obj)
+    except TypeError:
+        return lambda: obj
+
+
+def is_real(value):
+    """Check if given value is a builtin real number other than NaN."""
+    return type(value) in _REAL_TYPES and value == value
+
+
+def is_indexable(value):
+    """Check if given value can be looked up by hash instead of equality.
+
+    This holds for builtin scalars, for tuples and frozensets of indexable
+    values and for any other hashable values, except for matchers and for
+    objects that customize equality while still hashing by identity.
+    """
+    value_type = type(value)
+    if value_type in _SCALAR_TYPES:
+        return True
+    elif value_type is tuple or value_type is frozenset:
+        return _items_indexable(value)
+    try:
+        indexable = _indexable_types[value_type]
+    except KeyError:
+        indexable = _indexable_types[value_type] = _is_indexable_type(value_type)
+    if not indexable:
+        return False
+    elif isinstance(value, (tuple, frozenset)):
+        return _items_indexable(value)
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _items_indexable(value):
+    for item in value:
+        if not is_indexable(item):
+            return False
+    return True
+
+
+def _is_indexable_type(cls):
+    from golem.matchers import Matcher
+    if issubclass(cls, Matcher) or getattr(cls, '__hash__', None) is None:
+        return False
+    return cls.__hash__ is not object.__hash__ or not _defines_equality(cls)
+
+
+def fingerprint(value):
+    """Return cheap fingerprint of a large immutable builtin sequence or
+    container.
+
+    Fingerprint is a ``(type, length, sample)`` tuple, where *sample* is
+    a tuple of items taken at fixed positions of a sequence, or ``None``
+    if the value is not a sequence or any of sampled items is not a
+    builtin scalar. ``None`` is returned for values shorter than
+    :data:`FINGERPRINT_MIN_LENGTH` and for values of other types,
+    including mutable ones, as expected values can change after their
+    fingerprint is stored.
+    """
+    value_type = type(value)
+    if value_type in _FINGERPRINTED_SEQUENCE_TYPES:
+        length = len(value)
+        if length < FINGERPRINT_MIN_LENGTH:
+            return None
+        last = length - 1
+        sample = tuple(value[i * last // (_FINGERPRINT_SAMPLES - 1)] for i in _compat.range(_FINGERPRINT_SAMPLES))
+        for item in sample:
+            if type(item) not in _SCALAR_TYPES:
+                sample = None
+                break
+        return value_type, length, sample
+    elif value_type is frozenset:
+        length = len(value)
+        if length < FINGERPRINT_MIN_LENGTH:
+            return None
+        return value_type, length, None
+
+
+def supports_buffer(value):
+    """Check if given value is an object other than builtin string,
+    sequence or container that exposes buffer protocol."""
+    value_type = type(value)
+    if value_type in _SCALAR_TYPES or value_type in _SEQUENCE_TYPES or value_type in _CONTAINER_TYPES:
+        return False
+    try:
+        memoryview(value)
+    except TypeError:
+        return False
+    return True
+
+
+def fingerprints_differ(a, b):
+    """Check if values having given fingerprints are surely not equal.
+
+    Only values of same type are compared, as equality of values of
+    different types can be customized.
+    """
+    if a is None or b is None or a[0] is not b[0]:
+        return False
+    elif a[1] != b[1]:
+        return True
+    return a[2] is not None and b[2] is not None and a[2] != b[2]
+
+
+def is_same_call(args, kwargs, other_args, other_kwargs):
+    """Cheaply check if two sets of call arguments are the same.
+
+    Arguments are the same if they are identical objects or builtin
+    scalars of same type and value. This is stricter than equality, but
+    never needs to run user defined ``__eq__``.
+    """
+    if len(args) != len(other_args):
+        return False
+    for i, a in enumerate(args):
+        b = other_args[i]
+        if a is not b and (type(a) is not type(b) or type(a) not in _SCALAR_TYPES or a != b):
+            return False
+    if kwargs or other_kwargs:
+        if len(kwargs) != len(other_kwargs):
+            return False
+        for name, a in kwargs.items():
+            b = other_kwargs.get(name, _MISSING)
+            if a is not b and (type(a) is not type(b) or type(a) not in _SCALAR_TYPES or a != b):
+                return False
+    return True
+
+
+def _defines_equality(cls):
+    for base in cls.__mro__:
+        if base is not object and ('__eq__' in base.__dict__ or '__cmp__' in base.__dict__):
+            return True
+    return False
+
+
 class FunctionInspector(object):
 
     def __init__(self, func):
         self.func = func
-        self._argspec = inspect.getargspec(func)
+        self._argspec = _compat.getargspec(func)
+        self._binders = {}
+        self.arg_names = tuple(self._argspec.args)
+        self.arg_varargs = self._argspec.varargs
+        self.arg_keywords = self._argspec.keywords
+        self.arg_kwonly = tuple(self._argspec.kwonlyargs)
+        self.arg_kwonly_defaults = self._argspec.kwonlydefaults or {}
+        self.arg_posonly = tuple(self._argspec.posonlyargs)
+        if self._argspec.defaults:
+            self.arg_names_required = self.arg_names[:-len(self._argspec.defaults)]
+            self.arg_defaults = dict(zip(self.arg_names[len(self.arg_names_required):], self._argspec.defaults))
+        else:
+            self.arg_names_required = self.arg_names
+            self.arg_defaults = {}
+        self.min_args = len(self.arg_names_required)
+        self.max_args = len(self.arg_names)
 
     def normalize(self, *args, **kwargs):
-        self.__validate(args, kwargs)
-        return self.__create_normalization_result(args, kwargs)
-
-    def __validate(self, args, kwargs):
-        given = len(args) + len(kwargs)
-        for k in kwargs:
-            if k not in self.arg_names:
-                raise TypeError("%s() got an unexpected keyword argument %r" % (self.func.func_name, k))
+        return self.binder().to_dict(self.binder().bind(args, kwargs))
+
+    def binder(self, offset=0):
+        """Return :class:`ArgumentBinder` for inspected function.
+
+        If *offset* is given, then that many leading positional arguments
+        are treated as already bound (f.e. ``self`` of methods) and must
+        not be given when binding.
+        """
+        try:
+            return self._binders[offset]
+        except KeyError:
+            binder = self._binders[offset] = ArgumentBinder(self, offset)
+            return binder
+
+    def _validate(self, args, kwargs):
+        given = len(args) + len(kwargs) - sum(1 for k in kwargs if k in self.arg_kwonly or k in self.arg_posonly)
+        if self.arg_keywords is None:
+            posonly = [k for k in self.arg_posonly if k in kwargs]
+            if posonly:
+                raise TypeError(
+                    "%s() got some positional-only arguments passed as keyword arguments: %s" %
+                    (self.func.__name__, ', '.join(repr(k) for k in posonly)))
+            for k in kwargs:
+                if k not in self.arg_names and k not in self.arg_kwonly:
+                    raise TypeError("%s() got an unexpected keyword argument %r" % (self.func.__name__, k))
         if len(args) == len(self.arg_names_required):
             for k in kwargs:
-                if k in self.arg_names_required:
-                    raise TypeError("%s() got multiple values for keyword argument %r" % (self.func.func_name, k))
-        if args and not self.arg_names:
-            raise TypeError("%s() takes no arguments (%d given)" % (self.func.func_name, len(args)))
-        elif given > len(self.arg_names):
-            raise TypeError(self.__render_too_many_arguments_error(given))
+                if k in self.arg_names_required and k not in self.arg_posonly:
+                    raise TypeError("%s() got multiple values for keyword argument %r" % (self.func.__name__, k))
+        if args and not self.arg_names and self.arg_varargs is None:
+            raise TypeError("%s() takes no arguments (%d given)" % (self.func.__name__, len(args)))
+        elif given > len(self.arg_names) and self.arg_varargs is None and self.arg_keywords is None:
+            raise TypeError(self._render_too_many_arguments_error(given))
         elif given < len(self.arg_names_required):
-            raise TypeError(self.__render_too_few_arguments_error(given))
+            raise TypeError(self._render_too_few_arguments_error(given))
+        for k in self.arg_kwonly:
+            if k not in kwargs and k not in self.arg_kwonly_defaults:
+                raise TypeError("%s() missing required keyword-only argument %r" % (self.func.__name__, k))
 
-    def __create_normalization_result(self, args, kwargs):
-        result = dict(zip(self.arg_names_required, args))
-        result.update(self.arg_defaults)
-        result.update(kwargs)
-        return result
-
-    def __render_too_many_arguments_error(self, given):
-        tmp = ["%s() takes" % self.func.func_name]
+    def _render_too_many_arguments_error(self, given):
+        tmp = ["%s() takes" % self.func.__name__]
         tmp.append(('at most %d' if self.min_args != self.max_args else 'exactly %d') % self.max_args)
         tmp.append('argument' if self.min_args == 1 else 'arguments')
         tmp.append("(%d given)" % given)
         return ' '.join(tmp)
 
-    def __render_too_few_arguments_error(self, given):
-        tmp = ["%s() takes" % self.func.func_name]
-        tmp.append(('at least %d' if self.min_args != self.max_args else 'exactly %d') % self.min_args)
+    def _render_too_few_arguments_error(self, given):
+        tmp = ["%s() takes" % self.func.__name__]
+        tmp.append(('at least %d' if self.min_args != self.max_args or self.arg_varargs else 'exactly %d') % self.min_args)
         tmp.append('argument' if self.min_args == 1 else 'arguments')
         tmp.append("(%d given)" % given)
         return ' '.join(tmp)
 
-    @property
-    def arg_names(self):
-        return tuple(self._argspec.args)
-
-    @property
-    def arg_names_required(self):
-        if not self.arg_defaults:
-            return self.arg_names
-        return self.arg_names[:-len(self.arg_defaults)]
-
-    @property
-    def arg_defaults(self):
-        if not self._argspec.defaults:
-            return {}
-        default_arg_names = self.arg_names[-len(self._argspec.defaults):]
-        return dict(zip(default_arg_names, self._argspec.defaults))
-
-    @property
-    def min_args(self):
-        return len(self.arg_names_required)
-
-    @property
-    def max_args(self):
-        return len(self.arg_names)
+
+class ArgumentBinder(object):
+    """Signature-specialized argument binder.
+
+    Maps call arguments onto a slot table precomputed from function
+    signature and returns them as a tuple ordered as in the signature,
+    with defaults filled in, so calls given positionally and by keyword
+    are bound to equal tuples. If function accepts ``*args``, then a tuple
+    of extra positional arguments is appended, followed by keyword-only
+    arguments, if any; if it accepts ``**kwargs``, then a sorted tuple of
+    extra ``(name, value)`` pairs is appended. Keyword arguments named as
+    positional-only parameters are such extra pairs as well.
+
+    Invalid calls raise the same :exc:`TypeError` as
+    :meth:`FunctionInspector.normalize`.
+    """
+
+    def __init__(self, inspector, offset=0):
+        self._inspector = inspector
+        self._offset = offset
+        self.names = inspector.arg_names[offset:]
+        self._nslots = len(self.names)
+        self._min = max(inspector.min_args - offset, 0)
+        self._default_tail = tuple(inspector.arg_defaults[x] for x in self.names[self._min:])
+        self._positions = dict(
+            (name, i - offset) for i, name in enumerate(inspector.arg_names)
+            if name not in inspector.arg_posonly)
+        self._varargs = inspector.arg_varargs is not None
+        self._keywords = inspector.arg_keywords is not None
+        self.kwonly_names = inspector.arg_kwonly
+        self._kwonly_positions = dict((name, i) for i, name in enumerate(self.kwonly_names))
+        self._kwonly_defaults = tuple(inspector.arg_kwonly_defaults.get(x, _MISSING) for x in self.kwonly_names)
+        self._plain = not self._varargs and not self._keywords and not self.kwonly_names
+        self.slot_names = self.names +\
+            ((inspector.arg_varargs,) if self._varargs else ()) +\
+            self.kwonly_names +\
+            ((inspector.arg_keywords,) if self._keywords else ())
+
+    def bind(self, args, kwargs):
+        nargs = len(args)
+        if not kwargs and self._plain:
+            if nargs == self._nslots:
+                return args
+            elif self._min <= nargs < self._nslots:
+                return args + self._default_tail[nargs - self._min:]
+        return self.__bind_slow(args, kwargs)
+
+    def __bind_slow(self, args, kwargs):
+        nargs = len(args)
+        nslots = self._nslots
+        if nargs > nslots and not self._varargs:
+            self.__fail(args, kwargs)
+        slots = list(args[:nslots])
+        slots.extend(_MISSING for _ in _compat.range(nslots - len(slots)))
+        kwonly = list(self._kwonly_defaults)
+        extra_kwargs = []
+        for name, value in _compat.iteritems(kwargs):
+            i = self._positions.get(name)
+            if i is None:
+                j = self._kwonly_positions.get(name)
+                if j is not None:
+                    kwonly[j] = value
+                    continue
+                if not self._keywords:
+                    self.__fail(args, kwargs)
+                extra_kwargs.append((name, value))
+            elif i < 0 or slots[i] is not _MISSING:
+                self.__fail(args, kwargs)
+            else:
+                slots[i] = value
+        for i in _compat.range(self._min, nslots):
+            if slots[i] is _MISSING:
+                slots[i] = self._default_tail[i - self._min]
+        for i in _compat.range(self._min):
+            if slots[i] is _MISSING:
+                self.__fail(args, kwargs)
+        if self._varargs:
+            slots.append(args[nslots:])
+        if kwonly:
+            if any(x is _MISSING for x in kwonly):
+                self.__fail(args, kwargs)
+            slots.extend(kwonly)
+        if self._keywords:
+            slots.append(tuple(sorted(extra_kwargs)))
+        return tuple(slots)
+
+    def __fail(self, args, kwargs):
+        args = (_MISSING,) * self._offset + args
+        self._inspector._validate(args, kwargs)
+        func_name = self._inspector.func.__name__
+        for name in kwargs:
+            i = self._positions.get(name)
+            if i is not None and i + self._offset < len(args):
+                raise TypeError("%s() got multiple values for keyword argument %r" % (func_name, name))
+        raise TypeError(self._inspector._render_too_few_arguments_error(len(args) + len(kwargs)))
+
+    def to_dict(self, bound):
+        """Convert tuple returned by :meth:`bind` into a dict of argument
+        values keyed by argument names."""
+        result = dict(zip(self.names, bound))
+        if self._varargs:
+            result[self._inspector.arg_varargs] = bound[self._nslots]
+        if self.kwonly_names:
+            start = self._nslots + self._varargs
+            result.update(zip(self.kwonly_names, bound[start:]))
+        if self._keywords:
+            result[self._inspector.arg_keywords] = dict(bound[-1])
+        return result
+
+
+class _Missing(object):
+
+    def __repr__(self):
+        return '<missing>'
+
+_MISSING = _Missing()
+
+
+def is_warning_ignored(category, module):
+    """Check if warnings of given category issued by given module are
+    ignored by current warning filters.
+
+    This lets callers skip formatting warning message, which
+    :func:`warnings.warn` does before filters are checked. Filters
+    matching message text or line number are not evaluated; ``False`` is
+    returned if one of them applies.
+    """
+    for action, message, filter_category, filter_module, lineno in warnings.filters:
+        if not issubclass(category, filter_category):
+            continue
+        if isinstance(filter_module, _compat.string_types):
+            if filter_module != module:
+                continue
+        elif filter_module is not None and not filter_module.match(module):
+            continue
+        if lineno or (message is not None and message.pattern):
+            return False
+        return action == 'ignore'
+    return warnings.defaultaction == 'ignore'
+
+
+class NullLock(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
@@ -1,4 +1,11 @@
+import array
+import random
+
+from golem import _async, clock
+
+
 class Return(object):
+    __slots__ = ('what',)
 
     def __init__(self, what):
         self.what = what
@@ -8,6 +15,7 @@ class Return(object):
 
 
 class Invoke(object):
+    __slots__ = ('callback',)
 
     def __init__(self, callback):
         self.callback = callback
@@ -16,11 +24,260 @@ class Invoke(object):
         return self.callback(*call.args, **call.kwargs)
 
 
+class Raise(object):
+    __slots__ = ('exception',)
+
+    def __init__(self, exception):
+        self.exception = exception
+
+    def __call__(self, call):
+        raise self.exception
+
+
+class AsyncReturn(object):
+    __slots__ = ('what',)
+
+    def __init__(self, what):
+        self.what = what
+
+    def __call__(self, call):
+        return _async.Awaitable(_identity, (self.what,))
+
+
+class AsyncRaise(object):
+    __slots__ = ('exception',)
+
+    def __init__(self, exception):
+        self.exception = exception
+
+    def __call__(self, call):
+        return _async.Awaitable(_raise, (self.exception,))
+
+
+class AsyncInvoke(object):
+    """Invoke given callback when result of the mock call is awaited.
+
+    Callback can be either a regular function or a coroutine function, in
+    which case the coroutine it returns is awaited as well.
+    """
+    __slots__ = ('callback',)
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def __call__(self, call):
+        return _async.Awaitable(self.callback, call.args, call.kwargs)
+
+
+class Delay(object):
+    """Delay execution of given *action* by given number of *seconds*.
+
+    Mocks of regular functions sleep on the *clock*, while mocks of
+    coroutine functions return awaitable sleeping asynchronously. If no
+    clock is given, the default one is used (see :mod:`golem.clock`).
+    """
+    __slots__ = ('seconds', 'action', 'clock')
+
+    def __init__(self, seconds, action=None, clock=None):
+        self.seconds = seconds
+        self.action = action
+        self.clock = clock
+
+    def __call__(self, call):
+        return _delay(call, self.clock, self.get_delay(), self.action)
+
+    def get_delay(self):
+        return self.seconds
+
+
+class JitteredDelay(Delay):
+    """Delay execution of given *action* by random number of seconds taken
+    uniformly from ``[low, high]`` range.
+
+    Pass :class:`random.Random` object as *rng* to get reproducible
+    delays.
+    """
+    __slots__ = ('high', 'rng')
+
+    def __init__(self, low, high, action=None, clock=None, rng=None):
+        super(JitteredDelay, self).__init__(low, action=action, clock=clock)
+        self.high = high
+        self.rng = rng or random
+
+    def get_delay(self):
+        return self.rng.uniform(self.seconds, self.high)
+
+
+class RateLimit(object):
+    """Limit rate of calls with a token bucket.
+
+    Bucket holds up to *burst* tokens and is refilled with *rate* tokens
+    per second. Each call takes one token and executes *action*. If the
+    bucket is empty, then *exception* is raised or, if not given, the call
+    is delayed until next token is available.
+    """
+    __slots__ = ('rate', 'burst', 'action', 'exception', 'clock', '_tokens', '_updated')
+
+    def __init__(self, rate, burst=1, action=None, exception=None, clock=None):
+        self.rate = float(rate)
+        self.burst = burst
+        self.action = action
+        self.exception = exception
+        self.clock = clock
+        self._tokens = burst
+        self._updated = None
+
+    def __call__(self, call):
+        clock = _get_clock(self.clock)
+        now = clock.time()
+        if self._updated is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return _delay(call, clock, 0, self.action)
+        elif self.exception is not None:
+            raise self.exception
+        delay = (1 - self._tokens) / self.rate
+        self._tokens = 0
+        self._updated = now + delay
+        return _delay(call, clock, delay, self.action)
+
+
+class FailEvery(object):
+    """Raise *exception* on every *n*-th call and execute *action* on all
+    other calls."""
+    __slots__ = ('n', 'exception', 'action', '_calls')
+
+    def __init__(self, n, exception, action=None):
+        self.n = n
+        self.exception = exception
+        self.action = action
+        self._calls = 0
+
+    def __call__(self, call):
+        self._calls += 1
+        if self._calls % self.n == 0:
+            raise self.exception
+        elif self.action is not None:
+            return self.action(call)
+
+
 class SaveAllArgs(object):
+    __slots__ = ('dest',)
 
     def __init__(self, dest):
         self.dest = dest
 
     def __call__(self, call):
-        for k, v in call.get_normalized_args().iteritems():
+        for k, v in call.get_normalized_args().items():
             setattr(self.dest, k, v)
+
+
+class CaptureArgs(object):
+    """Append arguments of each call to per-argument columns.
+
+    Unlike :class:`SaveAllArgs`, history of all calls is kept. Columns
+    are named after arguments of mocked function and store values in
+    order of calls. Columns whose first value is an integer or a float
+    are stored in typed arrays and are turned into lists once a value of
+    other type is appended. If *action* is given, then it is executed
+    after arguments are captured and its result is returned.
+    """
+    __slots__ = ('action', 'count', '_names', '_columns')
+
+    def __init__(self, action=None):
+        self.action = action
+        self.count = 0
+        self._names = ()
+        self._columns = ()
+
+    def __len__(self):
+        return self.count
+
+    def __call__(self, call):
+        if not self._names:
+            self._names = call.method.binder.slot_names
+            self._columns = tuple(_Column() for _ in self._names)
+        for column, value in zip(self._columns, call.key):
+            column.append(value)
+        self.count += 1
+        return _call_action(self.action, call)
+
+    def column(self, name):
+        """Return all values of given argument, in order of calls."""
+        try:
+            return self._columns[self._names.index(name)].values
+        except ValueError:
+            raise KeyError(name)
+
+    def last(self, name):
+        return self.column(name)[-1]
+
+    def nth(self, name, n):
+        return self.column(name)[n]
+
+    def to_dict(self):
+        """Return dict of columns as lists, keyed by argument names."""
+        return dict((name, list(column.values)) for name, column in zip(self._names, self._columns))
+
+
+class _Column(object):
+    __slots__ = ('values', 'kind')
+
+    def __init__(self):
+        self.values = None
+        self.kind = None
+
+    def append(self, value):
+        if self.values is None:
+            self.__init_values(value)
+        if self.kind is not None:
+            if type(value) is self.kind:
+                try:
+                    self.values.append(value)
+                    return
+                except OverflowError:
+                    pass
+            self.kind = None
+            self.values = list(self.values)
+        self.values.append(value)
+
+    def __init_values(self, value):
+        typecode = _TYPECODES.get(type(value))
+        if typecode is None:
+            self.values = []
+        else:
+            self.kind = type(value)
+            self.values = array.array(typecode)
+
+
+_TYPECODES = {
+    int: 'q' if 'q' in getattr(array, 'typecodes', '') else 'l',
+    float: 'd'}
+
+
+def _identity(value):
+    return value
+
+
+def _raise(exception):
+    raise exception
+
+
+def _get_clock(clock_):
+    return clock_ if clock_ is not None else clock.get_default_clock()
+
+
+def _delay(call, clock_, seconds, action):
+    clock_ = _get_clock(clock_)
+    if call.method.is_async:
+        return _async.Awaitable(_call_action, (action, call), before=clock_.sleep_async(seconds))
+    elif seconds:
+        clock_.sleep(seconds)
+    return _call_action(action, call)
+
+
+def _call_action(action, call):
+    if action is not None:
+        return action(call)
@@ -0,0 +1,138 @@
+"""Clocks used by time related actions (see :mod:`golem.actions`).
+
+By default actions use :class:`RealClock`, which really sleeps. Tests
+simulating slow or rate limited dependencies should use
+:class:`VirtualClock` instead, either by passing it to actions explicitly
+or by making it the default with :func:`set_default_clock`. Virtual clock
+advances instantly, so simulating hours of traffic takes seconds.
+"""
+
+import time
+import heapq
+import threading
+import itertools
+import contextlib
+
+from golem import _compat
+
+
+class RealClock(object):
+    """Clock using system time and really sleeping."""
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def sleep_async(self, seconds):
+        return _compat.asyncio.sleep(seconds)
+
+
+class VirtualClock(object):
+    """Clock that advances instantly when sleeping.
+
+    Can be used from both synchronous and asyncio code. Coroutines
+    sleeping on the clock wake up in order of their deadlines, one deadline
+    per iteration of the event loop, and the clock is advanced to each
+    deadline, so concurrent sleeps overlap as they would in real time.
+    Event loop can also be attached to the clock (see :meth:`attach`) to
+    make all its timers, including ones used by :func:`asyncio.sleep` and
+    :func:`asyncio.wait_for`, run in virtual time.
+    """
+
+    def __init__(self, start=0.0):
+        self._now = start
+        self._lock = threading.Lock()
+        self._attached_loops = set()
+        self._sleepers = {}
+        self._sequence = itertools.count()
+
+    def time(self):
+        return self._now
+
+    def advance(self, seconds):
+        if seconds < 0:
+            raise ValueError("cannot move virtual clock backwards: %r" % seconds)
+        with self._lock:
+            self._now += seconds
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def sleep_async(self, seconds):
+        asyncio = _compat.asyncio
+        loop = asyncio.get_event_loop()
+        if loop in self._attached_loops:
+            return asyncio.sleep(seconds)
+        future = loop.create_future()
+        with self._lock:
+            sleepers = self._sleepers.get(loop)
+            if sleepers is None:
+                sleepers = self._sleepers[loop] = []
+                loop.call_soon(self.__wake_next, loop)
+            heapq.heappush(sleepers, (self._now + seconds, next(self._sequence), future))
+        return future
+
+    def __wake_next(self, loop):
+        with self._lock:
+            sleepers = self._sleepers[loop]
+            deadline = sleepers[0][0]
+            self._now = max(self._now, deadline)
+            woken = []
+            while sleepers and sleepers[0][0] <= deadline:
+                woken.append(heapq.heappop(sleepers)[2])
+            if sleepers:
+                loop.call_soon(self.__wake_next, loop)
+            else:
+                del self._sleepers[loop]
+        for future in woken:
+            if not future.done():
+                future.set_result(None)
+
+    @contextlib.contextmanager
+    def attach(self, loop):
+        """Make given selector based event loop run in virtual time.
+
+        While attached, ``loop.time()`` returns time of this clock and
+        whenever the loop would wait for its next timer, the clock is
+        advanced to that timer instead. This is done by wrapping private
+        selector of the loop, so loops not based on
+        :class:`asyncio.SelectorEventLoop` (like proactor loop on Windows)
+        cannot be attached and raise :exc:`TypeError`.
+        """
+        selector = getattr(loop, '_selector', None)
+        if selector is None or not callable(getattr(selector, 'select', None)):
+            raise TypeError("only selector based event loops can be attached: %r" % loop)
+        select = selector.select
+
+        def virtual_select(timeout=None):
+            if timeout is not None and timeout > 0:
+                events = select(0)
+                if events:
+                    return events
+                self.advance(timeout)
+                timeout = 0
+            return select(timeout)
+
+        loop.time = self.time
+        selector.select = virtual_select
+        self._attached_loops.add(loop)
+        try:
+            yield loop
+        finally:
+            self._attached_loops.discard(loop)
+            del selector.select
+            del loop.time
+
+
+_default_clock = RealClock()
+
+
+def get_default_clock():
+    return _default_clock
+
+
+def set_default_clock(clock):
+    global _default_clock
+    _default_clock = clock
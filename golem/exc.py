@@ -5,6 +5,24 @@ class GolemWarning(Warning):
     pass
 
 
+class UninterestedMockCallWarning(GolemWarning):
+
+    def __init__(self, call):
+        self.call = call
+
+    def __str__(self):
+        return "Uninterested mock function called: %s" % self.call
+
+
+class UninterestedMockCallError(AssertionError):
+
+    def __init__(self, call):
+        self.call = call
+
+    def __str__(self):
+        return "Uninterested mock function called: %s" % self.call
+
+
 class UnexpectedMockCallError(AssertionError):
 
     def __init__(self, call):
@@ -23,6 +41,15 @@ class ExpectationNotConsumedError(AssertionError):
         return "Trying to overwrite pending expectation for %s" % self.call
 
 
+class MockFrozenError(AssertionError):
+
+    def __init__(self, call):
+        self.call = call
+
+    def __str__(self):
+        return "Trying to add expectation to frozen mock function: %s" % self.call
+
+
 class MockSaturationError(AssertionError):
 
     def __init__(self, call, expectation):
@@ -0,0 +1,109 @@
+"""Instrumentation of mock calls.
+
+Instrumented mocks count their calls and measure time spent on finding
+expectation matching a call (lookup) and on executing its action, and
+count hits of each expectation. Statistics of all mocks instrumented with
+same :class:`Session` can be ranked by time spent in them::
+
+    session = golem.enable_instrumentation()
+    ...
+    print(session.report())
+    golem.disable_instrumentation()
+
+Single mocks can be instrumented with
+:meth:`golem._core.MockMethod.enableInstrumentation`. Checking if
+instrumentation is enabled is the only cost paid by mocks that are not
+instrumented.
+"""
+
+import time
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+class MockStats(object):
+    """Statistics of a single mock method.
+
+    Times are in seconds of the session timer. *hits* maps expectations
+    to number of calls they matched.
+    """
+    __slots__ = ('name', 'calls', 'unmatched', 'lookup_time', 'action_time', 'hits', '_expected_calls')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.unmatched = 0
+        self.lookup_time = 0.0
+        self.action_time = 0.0
+        self.hits = {}
+        self._expected_calls = {}
+
+    @property
+    def total_time(self):
+        return self.lookup_time + self.action_time
+
+    def record(self, expectation, call, lookup_time, action_time):
+        """Record call matching given expectation (or ``None``), described
+        by given expected *call*."""
+        self.calls += 1
+        self.lookup_time += lookup_time
+        self.action_time += action_time
+        if expectation is None:
+            self.unmatched += 1
+            return
+        hits = self.hits.get(expectation)
+        if hits is None:
+            self._expected_calls[expectation] = call
+            hits = 0
+        self.hits[expectation] = hits + 1
+
+    def top_hits(self, limit=None):
+        """Return list of ``(expected call, hits)`` pairs, most hit
+        first."""
+        items = sorted(self.hits.items(), key=lambda x: -x[1])[:limit]
+        return [(self._expected_calls[e], n) for e, n in items]
+
+
+class Session(object):
+    """Statistics collected from instrumented mocks, and hooks executed
+    around their calls.
+
+    Pre-call hooks are called with :class:`golem._core.MockMethodCall`
+    object before the call is dispatched. Post-call hooks are called with
+    the call object, result of the call and exception raised by it (or
+    ``None``) after the call is completed.
+    """
+
+    def __init__(self, timer=None):
+        self.timer = timer or _timer
+        self.stats = []
+        self.pre_call_hooks = []
+        self.post_call_hooks = []
+
+    def add_pre_call_hook(self, hook):
+        self.pre_call_hooks.append(hook)
+
+    def add_post_call_hook(self, hook):
+        self.post_call_hooks.append(hook)
+
+    def create_stats(self, name):
+        stats = MockStats(name)
+        self.stats.append(stats)
+        return stats
+
+    def ranked(self):
+        """Return list of statistics of mocks ordered by total time spent
+        in them, descending."""
+        return sorted(self.stats, key=lambda x: -x.total_time)
+
+    def report(self, limit=None, hits=3):
+        """Return text report of *limit* mocks in which most time was spent,
+        with *hits* most hit expectations of each."""
+        lines = ["%-30s %8s %8s %12s %12s %12s" % ('mock', 'calls', 'missed', 'lookup [us]', 'action [us]', 'total [us]')]
+        for stats in self.ranked()[:limit]:
+            lines.append("%-30s %8d %8d %12.1f %12.1f %12.1f" % (
+                stats.name, stats.calls, stats.unmatched,
+                stats.lookup_time * 1e6, stats.action_time * 1e6, stats.total_time * 1e6))
+            for call, count in stats.top_hits(hits):
+                lines.append("    %8d  %s" % (count, call))
+        return '\n'.join(lines)
@@ -0,0 +1,186 @@
+"""Compact journal of mock calls (see :meth:`golem._core.MockMethod.enableJournal`).
+
+Journal stores each call as three numbers: a timestamp, an id of the
+arguments and an id of the expectation that handled the call. Equal
+argument tuples are stored once and shared by all calls they were given
+in, so millions of calls with a handful of distinct arguments take little
+more memory than the three number columns. If *maxlen* is given, then the
+journal keeps only that many latest calls.
+"""
+
+import time
+import array
+
+from golem import _utils
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+_monotonic = getattr(time, 'monotonic', time.time)
+
+
+class CallJournal(object):
+    """Bounded, columnar journal of calls of a single mock method.
+
+    *names* are names of bound argument slots, used as column names when
+    exporting (see :meth:`columns`). Calls are timestamped using *clock*
+    (see :mod:`golem.clock`) or a monotonic system timer if not given.
+    Calls not handled by any expectation are recorded with expectation id
+    ``-1``.
+    """
+
+    def __init__(self, names=(), maxlen=None, clock=None):
+        if maxlen is not None and maxlen < 1:
+            raise ValueError("maxlen must be positive: %r" % maxlen)
+        self.names = tuple(names)
+        self.maxlen = maxlen
+        self.total = 0
+        self._timer = clock.time if clock is not None else _monotonic
+        self._times = array.array('d')
+        self._args = array.array('i')
+        self._expectations = array.array('i')
+        self._start = 0
+        self._arg_values = []
+        self._arg_refs = array.array('i')
+        self._arg_ids = {}
+        self._free_ids = []
+        self._expectation_ids = {}
+        self._expectation_list = []
+
+    def __len__(self):
+        return len(self._times)
+
+    def record(self, key, expectation):
+        """Record call with given bound arguments, handled by given
+        expectation (or ``None``)."""
+        arg_id = self.__intern(key)
+        if expectation is None:
+            expectation_id = -1
+        else:
+            expectation_id = self._expectation_ids.get(expectation)
+            if expectation_id is None:
+                expectation_id = self._expectation_ids[expectation] = len(self._expectation_list)
+                self._expectation_list.append(expectation)
+        now = self._timer()
+        if self.maxlen is None or len(self._times) < self.maxlen:
+            self._times.append(now)
+            self._args.append(arg_id)
+            self._expectations.append(expectation_id)
+        else:
+            i = self._start
+            self.__release(self._args[i])
+            self._times[i] = now
+            self._args[i] = arg_id
+            self._expectations[i] = expectation_id
+            self._start = (i + 1) % self.maxlen
+        self.total += 1
+
+    def __intern(self, key):
+        indexable = _utils.is_indexable(key)
+        if indexable:
+            typed_key = _typed(key)
+            arg_id = self._arg_ids.get(typed_key)
+            if arg_id is not None:
+                self._arg_refs[arg_id] += 1
+                return arg_id
+        if self._free_ids:
+            arg_id = self._free_ids.pop()
+            self._arg_values[arg_id] = key
+            self._arg_refs[arg_id] = 1
+        else:
+            arg_id = len(self._arg_values)
+            self._arg_values.append(key)
+            self._arg_refs.append(1)
+        if indexable:
+            self._arg_ids[typed_key] = arg_id
+        return arg_id
+
+    def __release(self, arg_id):
+        self._arg_refs[arg_id] -= 1
+        if self._arg_refs[arg_id] == 0:
+            key = self._arg_values[arg_id]
+            if _utils.is_indexable(key):
+                typed_key = _typed(key)
+                if self._arg_ids.get(typed_key) == arg_id:
+                    del self._arg_ids[typed_key]
+            self._arg_values[arg_id] = None
+            self._free_ids.append(arg_id)
+
+    def __ordered(self, column):
+        if self._start == 0:
+            return column[:]
+        return column[self._start:] + column[:self._start]
+
+    def times(self):
+        """Return ``array('d')`` of call timestamps, oldest first."""
+        return self.__ordered(self._times)
+
+    def expectation_ids(self):
+        """Return ``array('i')`` of ids of expectations that handled the
+        calls, oldest first (see :meth:`get_expectation`)."""
+        return self.__ordered(self._expectations)
+
+    def get_expectation(self, expectation_id):
+        if expectation_id < 0:
+            return None
+        return self._expectation_list[expectation_id]
+
+    def args(self):
+        """Return list of bound argument tuples, oldest first."""
+        values = self._arg_values
+        return [values[x] for x in self.__ordered(self._args)]
+
+    def argument_counts(self):
+        """Return list of ``(args, count)`` pairs for distinct arguments of
+        calls kept in the journal.
+
+        Counts are maintained while recording, so this does not walk the
+        journal.
+        """
+        return [(v, n) for v, n in zip(self._arg_values, self._arg_refs) if n > 0]
+
+    def columns(self):
+        """Return dict of lists with ``time`` and ``expectation`` columns,
+        and a column for each named argument slot."""
+        result = self.__arg_columns()
+        result['time'] = self.times().tolist()
+        result['expectation'] = self.expectation_ids().tolist()
+        return result
+
+    def __arg_columns(self):
+        args = self.args()
+        return dict((name, [x[i] for x in args]) for i, name in enumerate(self.names))
+
+    def to_numpy(self):
+        """Return :meth:`columns` converted to NumPy arrays.
+
+        Timestamp and expectation columns are created directly from the
+        underlying buffers.
+        """
+        if numpy is None:
+            raise RuntimeError("numpy is not available")
+        result = dict((k, numpy.array(v)) for k, v in self.__arg_columns().items())
+        result['time'] = numpy.frombuffer(self.times(), dtype=numpy.float64)
+        result['expectation'] = numpy.frombuffer(self.expectation_ids(), dtype=numpy.intc)
+        return result
+
+
+def _typed(key):
+    """Return interning key of given argument tuple.
+
+    Values of different types can be equal (like ``1``, ``1.0`` and
+    ``True``), so types of all values are included, to keep such
+    arguments apart.
+    """
+    return key, _types_of(key)
+
+
+def _types_of(value):
+    value_type = type(value)
+    if value_type is tuple:
+        return tuple([_types_of(x) for x in value])
+    elif value_type is frozenset:
+        return frozenset([(x, _types_of(x)) for x in value])
+    return value_type
@@ -1,6 +1,343 @@
-class Any(object):
+import re
+
+from golem import _compat, _utils
+
+#: Index hint kind telling that matcher can only match instances of given
+#: types.
+INDEX_BY_TYPE = 'type'
+
+#: Index hint kind telling that matcher can only match values equal to
+#: given hashable value.
+INDEX_BY_VALUE = 'value'
+
+#: Index hint kind telling that matcher can only match real numbers from
+#: given range, if it is given a real number.
+INDEX_BY_RANGE = 'range'
+
+
+class Matcher(object):
+    """Base class for matchers.
+
+    Matchers are compared with actual call arguments using ``==``, which
+    calls :meth:`matches`. When compared with other matchers, they are
+    equal if they are of same type and have same parameters.
+
+    Matchers can also tell expectation index what values they can match
+    (see :meth:`index_hint`), so dispatch can skip expectations that
+    cannot match given call without running matcher code.
+    """
+    __slots__ = ()
+
+    def __eq__(self, other):
+        if isinstance(other, Matcher):
+            return self._params() == other._params()
+        return self.matches(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        params = ', '.join(repr(x) for x in self._params()[1:])
+        return "%s(%s)" % (self.__class__.__name__, params)
+
+    def _params(self):
+        return (self.__class__,) + tuple(getattr(self, x) for x in self.__slots__)
+
+    def matches(self, value):
+        raise NotImplementedError()
+
+    def index_hint(self):
+        """Return ``(kind, data)`` tuple telling what values this matcher can
+        possibly match, or ``None`` if it can match values of any type.
+
+        Kind is one of :data:`INDEX_BY_TYPE` (*data* is a tuple of types),
+        :data:`INDEX_BY_VALUE` (*data* is a hashable value) or
+        :data:`INDEX_BY_RANGE` (*data* is a ``(low, high, low_inclusive,
+        high_inclusive)`` tuple, with ``None`` for unbounded ends, or
+        ``None`` if matcher never matches real numbers).
+        """
+        return None
+
+
+class Any(Matcher):
+    __slots__ = ()
 
     def __eq__(self, other):
         return True
 
+    def __repr__(self):
+        return '_'
+
+    def matches(self, value):
+        return True
+
 _ = Any()
+
+
+class Eq(Matcher):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def matches(self, value):
+        return self.value == value
+
+    def index_hint(self):
+        if _utils.is_indexable(self.value):
+            return INDEX_BY_VALUE, self.value
+
+
+class BufferEq(Matcher):
+    """Match objects exposing buffer equal to buffer of given object.
+
+    Buffers are compared item by item through :class:`memoryview`, without
+    copying, so this also works for objects like NumPy arrays, whose
+    ``==`` does not return a plain boolean. Mock methods wrap such
+    expected arguments with this matcher automatically.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        if isinstance(other, BufferEq):
+            return self.matches(other.value)
+        return Matcher.__eq__(self, other)
+
+    def matches(self, value):
+        if value is self.value:
+            return True
+        try:
+            return memoryview(self.value) == memoryview(value)
+        except TypeError:
+            return False
+
+
+class InstanceOf(Matcher):
+    __slots__ = ('types',)
+
+    def __init__(self, *types):
+        self.types = types
+
+    def matches(self, value):
+        return isinstance(value, self.types)
+
+    def index_hint(self):
+        if all(type(x) is type for x in self.types):
+            return INDEX_BY_TYPE, self.types
+
+
+class _Compare(Matcher):
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def matches(self, value):
+        try:
+            return self._compare(value, self.value)
+        except TypeError:
+            return False
+
+    def index_hint(self):
+        if _utils.is_real(self.value):
+            return INDEX_BY_RANGE, self._range(self.value)
+
+
+class Gt(_Compare):
+    __slots__ = ()
+
+    @staticmethod
+    def _compare(a, b):
+        return a > b
+
+    @staticmethod
+    def _range(value):
+        return value, None, False, False
+
+
+class Ge(_Compare):
+    __slots__ = ()
+
+    @staticmethod
+    def _compare(a, b):
+        return a >= b
+
+    @staticmethod
+    def _range(value):
+        return value, None, True, False
+
+
+class Lt(_Compare):
+    __slots__ = ()
+
+    @staticmethod
+    def _compare(a, b):
+        return a < b
+
+    @staticmethod
+    def _range(value):
+        return None, value, False, False
+
+
+class Le(_Compare):
+    __slots__ = ()
+
+    @staticmethod
+    def _compare(a, b):
+        return a <= b
+
+    @staticmethod
+    def _range(value):
+        return None, value, False, True
+
+
+class Between(Matcher):
+    """Match values from closed range ``[low, high]``."""
+    __slots__ = ('low', 'high')
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def matches(self, value):
+        try:
+            return self.low <= value <= self.high
+        except TypeError:
+            return False
+
+    def index_hint(self):
+        if _utils.is_real(self.low) and _utils.is_real(self.high):
+            return INDEX_BY_RANGE, (self.low, self.high, True, True)
+
+
+class Regex(Matcher):
+    """Match strings that given regular expression matches.
+
+    Pattern is compiled once, when matcher is created.
+    """
+    __slots__ = ('pattern',)
+
+    def __init__(self, pattern, flags=0):
+        self.pattern = re.compile(pattern, flags)
+
+    def __repr__(self):
+        return "Regex(%r)" % self.pattern.pattern
+
+    def _params(self):
+        return self.__class__, self.pattern.pattern, self.pattern.flags
+
+    def matches(self, value):
+        return isinstance(value, self.__searched_types()) and\
+            self.pattern.search(value) is not None
+
+    def index_hint(self):
+        return INDEX_BY_TYPE, self.__searched_types()
+
+    def __searched_types(self):
+        if _compat.PY2:
+            return _compat.string_types
+        return (type(self.pattern.pattern),)
+
+
+class Contains(Matcher):
+    __slots__ = ('item',)
+
+    def __init__(self, item):
+        self.item = item
+
+    def matches(self, value):
+        try:
+            return self.item in value
+        except TypeError:
+            return False
+
+    def index_hint(self):
+        return INDEX_BY_RANGE, None
+
+
+class Predicate(Matcher):
+    """Match values for which given function returns true."""
+    __slots__ = ('func',)
+
+    def __init__(self, func):
+        self.func = func
+
+    def matches(self, value):
+        return bool(self.func(value))
+
+
+class AllOf(Matcher):
+    """Match values that all given matchers match.
+
+    Matchers are checked in order given and checking stops at first
+    mismatch.
+    """
+    __slots__ = ('matchers',)
+
+    def __init__(self, *matchers):
+        self.matchers = matchers
+
+    def matches(self, value):
+        for matcher in self.matchers:
+            if not matcher == value:
+                return False
+        return True
+
+    def index_hint(self):
+        for matcher in self.matchers:
+            hint = get_index_hint(matcher)
+            if hint is not None:
+                return hint
+
+
+class AnyOf(Matcher):
+    """Match values that any of given matchers match.
+
+    Matchers are checked in order given and checking stops at first
+    match.
+    """
+    __slots__ = ('matchers',)
+
+    def __init__(self, *matchers):
+        self.matchers = matchers
+
+    def matches(self, value):
+        for matcher in self.matchers:
+            if matcher == value:
+                return True
+        return False
+
+    def index_hint(self):
+        types = []
+        for matcher in self.matchers:
+            hint = get_index_hint(matcher)
+            if hint is None or hint[0] != INDEX_BY_TYPE:
+                return None
+            types.extend(hint[1])
+        return INDEX_BY_TYPE, tuple(types)
+
+
+class Not(Matcher):
+    __slots__ = ('matcher',)
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+
+    def matches(self, value):
+        return not self.matcher == value
+
+
+def get_index_hint(value):
+    """Return index hint for given expected argument value.
+
+    Works like :meth:`Matcher.index_hint` for matchers, treats plain
+    hashable values as matching only values equal to them and returns
+    ``None`` for anything else.
+    """
+    if isinstance(value, Matcher):
+        return value.index_hint()
+    elif _utils.is_indexable(value):
+        return INDEX_BY_VALUE, value
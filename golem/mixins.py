@@ -1,15 +1,58 @@
+import weakref
+
+
 class MockTestCaseMixin(object):
 
     @property
     def mock_registry(self):
+        """Weak set of mocks registered with :meth:`expectCall`."""
         if not hasattr(self, '_mock_registry'):
-            self._mock_registry = set()
+            self._mock_registry = weakref.WeakSet()
         return self._mock_registry
 
+    @property
+    def pending_mocks(self):
+        """Set of registered mocks that have undersaturated expectations.
+
+        Pending mocks are referenced strongly, so they are verified even if
+        the test no longer references them.
+        """
+        if not hasattr(self, '_pending_mocks'):
+            self._pending_mocks = set()
+        return self._pending_mocks
+
+    @property
+    def pending_count(self):
+        """Number of not yet satisfied expectations of registered mocks."""
+        return sum(f.pending_count for f in self.pending_mocks)
+
     def expectCall(self, func, *args, **kwargs):
         self.mock_registry.add(func)
+        func.addPendingListener(self.pending_mocks)
         return func.expectCall(*args, **kwargs)
 
     def assertSaturated(self):
-        for f in self.mock_registry:
+        for f in list(self.pending_mocks):
             f.assertSaturated()
+
+    def snapshot(self):
+        """Return snapshot of all registered mocks (see
+        :meth:`golem._core.MockMethod.snapshot`).
+
+        Snapshot can be restored by other test case, so mocks built once,
+        f.e. in ``setUpClass``, can be shared by tests.
+        """
+        return [(f, f.snapshot()) for f in self.mock_registry]
+
+    def restore(self, snapshot):
+        """Restore mocks captured by :meth:`snapshot` and register them
+        with this test case."""
+        for f, state in snapshot:
+            f.restore(state)
+            self.mock_registry.add(f)
+            f.addPendingListener(self.pending_mocks)
+
+    def reset(self):
+        """Remove all expectations of registered mocks."""
+        for f in list(self.mock_registry):
+            f.reset()
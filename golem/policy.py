@@ -0,0 +1,55 @@
+"""Global policies controlling behaviour of mocks.
+
+Uninterested call policy controls how mocks react to calls they are not
+interested in, i.e. calls of mock methods that have no expectations set.
+It can be set globally with :func:`set_uninterested_call_policy` or per
+mock method by setting its ``uninterested_policy`` attribute.
+
+Thread safe mode makes mocks safe to be called concurrently from many
+threads. It can be enabled globally with :func:`set_thread_safe` or per
+mock method by setting its ``thread_safe`` attribute.
+"""
+
+#: Silently ignore uninterested calls.
+IGNORE = 'ignore'
+
+#: Only count uninterested calls (see ``MockMethod.uninterested_calls``).
+COUNT = 'count'
+
+#: Count and emit :class:`golem.exc.UninterestedMockCallWarning` on each call.
+WARN = 'warn'
+
+#: Count and emit warning only once per distinct call arguments.
+WARN_ONCE = 'warn_once'
+
+#: Count and raise :exc:`golem.exc.UninterestedMockCallError`.
+RAISE = 'raise'
+
+UNINTERESTED_CALL_POLICIES = (IGNORE, COUNT, WARN, WARN_ONCE, RAISE)
+
+_uninterested_call_policy = WARN
+_thread_safe = False
+
+
+def get_uninterested_call_policy():
+    return _uninterested_call_policy
+
+
+def set_uninterested_call_policy(policy):
+    global _uninterested_call_policy
+    _uninterested_call_policy = validate_uninterested_call_policy(policy)
+
+
+def validate_uninterested_call_policy(policy):
+    if policy not in UNINTERESTED_CALL_POLICIES:
+        raise ValueError("invalid uninterested call policy: %r" % (policy,))
+    return policy
+
+
+def is_thread_safe():
+    return _thread_safe
+
+
+def set_thread_safe(enabled):
+    global _thread_safe
+    _thread_safe = bool(enabled)
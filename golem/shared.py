@@ -0,0 +1,155 @@
+"""Counting mock calls made in child processes.
+
+Mocks are copied into child processes, either by fork or by pickling
+them, so calls made there are counted by the copies and never reach
+expectations of the parent process. Sharing a mock makes its
+expectations count calls in a table of counters kept in a memory mapped
+file instead::
+
+    counters = shared.share(mock)
+    mock.foo.expectCall(1).times(4)
+    with concurrent.futures.ProcessPoolExecutor(4) as pool:
+        list(pool.map(call_foo, [mock] * 4))
+    mock.foo.assertSaturated()
+
+Counters are pickled by name of their file, so shared mocks can be passed
+to child processes in any way: inherited by fork, given as arguments of
+:class:`multiprocessing.Process` or sent as arguments of pool tasks.
+Each call locks its counter once to increment it, and verification in
+the parent reads the global totals.
+"""
+
+import os
+import mmap
+import struct
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from golem import _core
+
+DEFAULT_SIZE = 1024
+
+_counter = struct.Struct('q')
+
+
+if fcntl is not None:
+
+    def _lock_file(fd, offset):
+        fcntl.lockf(fd, fcntl.LOCK_EX, _counter.size, offset)
+
+    def _unlock_file(fd, offset):
+        fcntl.lockf(fd, fcntl.LOCK_UN, _counter.size, offset)
+
+else:
+
+    def _lock_file(fd, offset):
+        os.lseek(fd, offset, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, _counter.size)
+
+    def _unlock_file(fd, offset):
+        os.lseek(fd, offset, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, _counter.size)
+
+
+class SharedCounters(object):
+    """Fixed size table of counters kept in a memory mapped file.
+
+    Counters are allocated in the process that created the table, so all
+    expectations must be shared there. The file is removed once that
+    process no longer uses the table.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE):
+        fd, path = tempfile.mkstemp(prefix='golem-', suffix='.counters')
+        try:
+            os.write(fd, b'\0' * (size * _counter.size))
+        finally:
+            os.close(fd)
+        self.__setstate__((path, size, 0))
+        self._owner = os.getpid()
+
+    def __getstate__(self):
+        return self._path, self._size, self._next
+
+    def __setstate__(self, state):
+        self._path, self._size, self._next = state
+        self._owner = None
+        self._fd = os.open(self._path, os.O_RDWR)
+        self._map = mmap.mmap(self._fd, self._size * _counter.size)
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def __del__(self):
+        if getattr(self, '_map', None) is None:
+            return
+        self._map.close()
+        os.close(self._fd)
+        if self._owner == os.getpid():
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+
+    def __len__(self):
+        return self._next
+
+    @property
+    def size(self):
+        return self._size
+
+    def allocate(self, value=0):
+        """Allocate counter set to given value and return its index."""
+        if self._next >= self._size:
+            raise ValueError("all %d shared counters are in use" % self._size)
+        index = self._next
+        _counter.pack_into(self._map, index * _counter.size, value)
+        self._next += 1
+        return index
+
+    def increment(self, index):
+        """Increment counter with given index and return new value."""
+        if self._pid != os.getpid():
+            self._pid, self._lock = os.getpid(), threading.Lock()
+        offset = index * _counter.size
+        with self._lock:
+            _lock_file(self._fd, offset)
+            try:
+                value = _counter.unpack_from(self._map, offset)[0] + 1
+                _counter.pack_into(self._map, offset, value)
+            finally:
+                _unlock_file(self._fd, offset)
+        return value
+
+    def get(self, index):
+        return _counter.unpack_from(self._map, index * _counter.size)[0]
+
+    def set(self, index, value):
+        """Set counter with given index to given value."""
+        if self._pid != os.getpid():
+            self._pid, self._lock = os.getpid(), threading.Lock()
+        offset = index * _counter.size
+        with self._lock:
+            _lock_file(self._fd, offset)
+            try:
+                _counter.pack_into(self._map, offset, value)
+            finally:
+                _unlock_file(self._fd, offset)
+
+
+def share(obj, counters=None):
+    """Share call counts of all mock methods of given object between
+    processes (see :meth:`golem._core.MockMethod.share`).
+
+    Returns *counters*, or a new :class:`SharedCounters` if not given.
+    """
+    if counters is None:
+        counters = SharedCounters()
+    for method in _core._iter_mock_methods(obj):
+        method.share(counters)
+    return counters
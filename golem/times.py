@@ -2,6 +2,11 @@ from golem import _utils
 
 
 class TimesBase(object):
+    __slots__ = ('actual', 'expected')
+
+    #: Set if checking for undersaturation has side effects, so it should
+    #: be done only when verifying expectations.
+    lazy = False
 
     def __init__(self, expected):
         self.actual = 0
@@ -13,6 +18,7 @@ class TimesBase(object):
 
 
 class Exactly(TimesBase):
+    __slots__ = ()
 
     def __str__(self):
         if self.expected == 0:
@@ -31,6 +37,7 @@ class Exactly(TimesBase):
 
 
 class AtLeast(TimesBase):
+    __slots__ = ()
 
     def __str__(self):
         return 'to be called at least %s' % _utils.number_of_times_to_string(self.expected)
@@ -42,7 +49,39 @@ class AtLeast(TimesBase):
         return False
 
 
+class UntilExhausted(TimesBase):
+    """Expect calls until given action queue is exhausted.
+
+    Number of expected calls is not known until then. If *repeatable* is
+    set, then calls made after the queue is exhausted are allowed as
+    well.
+    """
+    __slots__ = ('source', 'repeatable', '_start')
+    lazy = True
+
+    def __init__(self, source, repeatable=False):
+        super(UntilExhausted, self).__init__(None)
+        self.source = source
+        self.repeatable = repeatable
+        self._start = source.consumed
+
+    def __str__(self):
+        if not self.source.is_exhausted():
+            return 'to be called until all values are returned'
+        elif self.repeatable:
+            return 'to be called at least %s' % _utils.number_of_times_to_string(self.source.consumed - self._start)
+        else:
+            return 'to be called %s' % _utils.number_of_times_to_string(self.source.consumed - self._start)
+
+    def is_undersaturated(self):
+        return not self.source.is_exhausted()
+
+    def is_oversaturated(self):
+        return not self.repeatable and self.actual > self.source.consumed - self._start
+
+
 class AtMost(TimesBase):
+    __slots__ = ()
 
     def __str__(self):
         return 'to be called at most %s' % _utils.number_of_times_to_string(self.expected)
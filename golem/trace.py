@@ -0,0 +1,198 @@
+"""Recording of real interactions and replaying them as expectations.
+
+Trace file starts with a short header, followed by records appended one
+per call. Each record holds pickled method name with call arguments and
+pickled return value, prefixed with their lengths::
+
+    <key length: uint32><value length: uint32><key pickle><value pickle>
+
+Calls that raise are not recorded.
+
+Replaying memory maps the trace and scans it once, keeping only offsets of
+records (8 bytes per call) grouped by call arguments. Return values are
+unpickled lazily, when the mock is called.
+"""
+
+import mmap
+import array
+import struct
+import pickle
+
+from golem import _core, _utils, _compat
+
+MAGIC = b'GOLEMTR1'
+
+_HEADER = struct.Struct('<II')
+
+_PROTOCOL = 2
+
+_OFFSET_TYPECODE = 'q' if 'q' in getattr(array, 'typecodes', '') else 'l'
+
+
+class TraceRecorder(object):
+    """Proxy forwarding method calls to given object and appending them
+    to given binary file."""
+
+    def __init__(self, obj, fileobj):
+        self._obj = obj
+        self._file = fileobj
+        if fileobj.tell() == 0:
+            fileobj.write(MAGIC)
+
+    def __getattr__(self, name):
+        attr = getattr(self._obj, name)
+        if not callable(attr) or name.startswith('__'):
+            return attr
+        write = self._write
+
+        def method(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            write(name, args, kwargs, result)
+            return result
+
+        method.__name__ = name
+        self.__dict__[name] = method
+        return method
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write(self, name, args, kwargs, result):
+        key = pickle.dumps((name, args, sorted(kwargs.items())), _PROTOCOL)
+        value = pickle.dumps(result, _PROTOCOL)
+        self._file.write(_HEADER.pack(len(key), len(value)) + key + value)
+
+    def close(self):
+        self._file.close()
+
+
+def record(obj, path):
+    """Return :class:`TraceRecorder` appending calls of *obj* to file at
+    given path."""
+    return TraceRecorder(obj, open(path, 'ab'))
+
+
+def replay(path, mock):
+    """Load trace from given path as expectations of given mock object.
+
+    For each distinct call found in the trace, an expectation is set on
+    mock method of the same name, returning recorded values in order
+    they were recorded (see :meth:`golem._core.Expectation.willReturnEach`).
+    Expectations are created when first called or verified (see
+    :meth:`golem._core.MockMethod.attachSource`). Returns *mock*.
+    """
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if data[:len(MAGIC)] != MAGIC:
+        data.close()
+        raise ValueError("not a golem trace file: %r" % path)
+    tables = {}
+    for key, offsets in _group_records(data):
+        name, args, kwargs = pickle.loads(key)
+        table = tables.get(name)
+        if table is None:
+            table = tables[name] = _ReplayTable(data, getattr(mock, name))
+        table.add(key, args, dict(kwargs), offsets)
+    for name, table in tables.items():
+        getattr(mock, name).attachSource(table)
+    return mock
+
+
+def _group_records(data):
+    groups = {}
+    offset = len(MAGIC)
+    end = len(data)
+    while offset < end:
+        key_length, value_length = _HEADER.unpack_from(data, offset)
+        start = offset + _HEADER.size
+        key = data[start:start + key_length]
+        offsets = groups.get(key)
+        if offsets is None:
+            offsets = groups[key] = array.array(_OFFSET_TYPECODE)
+        offsets.append(offset)
+        offset = start + key_length + value_length
+    return sorted(groups.items(), key=lambda x: x[1][0])
+
+
+class _ReplayTable(object):
+    """Distinct recorded calls of a mock method with offsets of their
+    records, used as source of its expectations.
+
+    Calls are found by their bound arguments, using pickle of the
+    arguments as key if they are not hashable, so finding a call does not
+    depend on number of recorded calls.
+    """
+
+    def __init__(self, data, method):
+        self._data = data
+        self._binder = method.binder
+        self._keys = []
+        self._offsets = []
+        self._exact = {}
+        self._pickled = {}
+        self._unhashable = []
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(_compat.range(len(self._keys)))
+
+    def add(self, key, args, kwargs, offsets):
+        bound = self._binder.bind(args, kwargs)
+        if _utils.is_indexable(bound):
+            entry = self._exact.get(bound)
+        else:
+            pickled = pickle.dumps(bound, _PROTOCOL)
+            entry = self._pickled.get(pickled)
+        if entry is not None:
+            merged = sorted(self._offsets[entry] + offsets)
+            self._offsets[entry] = array.array(_OFFSET_TYPECODE, merged)
+            return
+        entry = len(self._keys)
+        self._keys.append(key)
+        self._offsets.append(offsets)
+        if _utils.is_indexable(bound):
+            self._exact[bound] = entry
+        else:
+            self._pickled[pickled] = entry
+            self._unhashable.append((bound, entry))
+
+    def find(self, key):
+        if _utils.is_indexable(key):
+            return self._exact.get(key)
+        try:
+            entry = self._pickled.get(pickle.dumps(key, _PROTOCOL))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            entry = None
+        if entry is None:
+            entry = next((i for bound, i in self._unhashable if bound == key), None)
+        return entry
+
+    def describe(self, entry):
+        _, args, kwargs = pickle.loads(self._keys[entry])
+        return args, dict(kwargs)
+
+    def create(self, entry):
+        return _core.Expectation().willReturnEach(_RecordedValues(self._data, self._offsets[entry]))
+
+
+class _RecordedValues(object):
+    __slots__ = ('_data', '_offsets')
+
+    def __init__(self, data, offsets):
+        self._data = data
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __iter__(self):
+        data = self._data
+        for offset in self._offsets:
+            key_length, value_length = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size + key_length
+            yield pickle.loads(data[start:start + value_length])
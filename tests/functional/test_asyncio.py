@@ -0,0 +1,116 @@
+import unittest
+
+from golem import exc, mock_method, _compat
+from golem.actions import Return, Raise, Invoke, AsyncReturn, AsyncRaise, AsyncInvoke
+from golem.matchers import _
+
+asyncio = _compat.asyncio
+
+# Coroutine functions are defined in a string, so this module can still be
+# imported by Python 2, where the tests are skipped.
+COROUTINES_SOURCE = '''
+class Interface(object):
+
+    @mock_method
+    async def foo(self, a, b=None):
+        pass
+
+    @mock_method
+    def bar(self, a):
+        pass
+
+
+async def add(a, b=None):
+    await asyncio.sleep(0)
+    return a + b
+
+
+async def call_many_times(func, *args, times=1):
+    for _ in range(times):
+        await asyncio.sleep(0)
+        await func(*args)
+
+
+async def wait_saturated(*mocks, task=None):
+    for mock in mocks:
+        await asyncio.wait_for(mock.waitSaturated(), 1)
+    if task is not None:
+        await task
+
+
+async def sleep_and_call(func, *args):
+    await asyncio.sleep(0)
+    return await func(*args)
+
+
+async def gather(*awaitables):
+    return await asyncio.gather(*awaitables)
+'''
+
+
+@unittest.skipIf(asyncio is None, "asyncio is not available")
+class TestAsyncio(unittest.TestCase):
+
+    def setUp(self):
+        self.coroutines = {'mock_method': mock_method, 'asyncio': asyncio}
+        exec(COROUTINES_SOURCE, self.coroutines)
+        self.iface = self.coroutines['Interface']()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_until_complete(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+    def test_ifMethodIsCoroutineFunction_callIsDispatchedWhenAwaited(self):
+        expectation = self.iface.foo.expectCall(1)
+        expectation.willOnce(Return(2))
+        awaitable = self.iface.foo(1)
+        self.assertEqual(0, expectation.actual_calls)
+        self.assertEqual(2, self.run_until_complete(awaitable))
+        self.iface.foo.assertSaturated()
+
+    def test_ifUnexpectedCoroutineMockIsAwaited_errorIsRaised(self):
+        self.iface.foo.expectCall(1)
+        with self.assertRaises(exc.UnexpectedMockCallError):
+            self.run_until_complete(self.iface.foo(2))
+
+    def test_ifCoroutineMockRaises_exceptionIsRaisedWhenAwaited(self):
+        self.iface.foo.expectCall(1).willOnce(Raise(ValueError('dummy')))
+        awaitable = self.iface.foo(1)
+        with self.assertRaisesRegexp(ValueError, 'dummy'):
+            self.run_until_complete(awaitable)
+
+    def test_ifCoroutineMockInvokesCoroutineFunction_itsResultIsAwaited(self):
+        self.iface.foo.expectCall(_, b=_).willRepeatedly(Invoke(self.coroutines['add']))
+        self.assertEqual(3, self.run_until_complete(self.iface.foo(1, b=2)))
+
+    def test_ifRegularMockUsesAsyncActions_itReturnsAwaitables(self):
+        self.iface.bar.expectCall(1).willOnce(AsyncReturn(1))
+        self.iface.bar.expectCall(2).willOnce(AsyncRaise(ValueError('dummy')))
+        self.iface.bar.expectCall(3).willOnce(AsyncInvoke(lambda a: self.coroutines['add'](a, a)))
+        self.assertEqual(1, self.run_until_complete(self.iface.bar(1)))
+        with self.assertRaisesRegexp(ValueError, 'dummy'):
+            self.run_until_complete(self.iface.bar(2))
+        self.assertEqual(6, self.run_until_complete(self.iface.bar(3)))
+        self.iface.bar.assertSaturated()
+
+    def test_ifWaitingUntilSaturated_waitCompletesOnceOtherTasksCallTheMock(self):
+        self.iface.foo.expectCall(1).times(3)
+        task = self.loop.create_task(self.coroutines['call_many_times'](self.iface.foo, 1, times=3))
+        self.run_until_complete(self.coroutines['wait_saturated'](self.iface.foo, task=task))
+        self.iface.foo.assertSaturated()
+
+    def test_ifAlreadySaturated_waitCompletesImmediately(self):
+        self.iface.bar.expectCall(1)
+        self.iface.bar(1)
+        self.run_until_complete(self.coroutines['wait_saturated'](self.iface.bar))
+
+    def test_ifThousandsOfTasksAwaitSameMock_allCallsAreCounted(self):
+        num_tasks = 5000
+        self.iface.foo.expectCall(_).times(num_tasks)
+        sleep_and_call = self.coroutines['sleep_and_call']
+        tasks = [sleep_and_call(self.iface.foo, i) for i in range(num_tasks)]
+        self.assertEqual([None] * num_tasks, self.run_until_complete(self.coroutines['gather'](*tasks)))
+        self.iface.foo.assertSaturated()
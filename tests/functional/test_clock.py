@@ -0,0 +1,175 @@
+import time
+import random
+import unittest
+
+from golem import mock_method, _compat
+from golem.clock import VirtualClock, RealClock, get_default_clock, set_default_clock
+from golem.actions import Return, Delay, JitteredDelay, RateLimit, FailEvery
+from golem.matchers import _
+
+asyncio = _compat.asyncio
+
+
+class Interface(object):
+
+    @mock_method
+    def foo(self, a):
+        pass
+
+
+class TestVirtualClock(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.iface = Interface()
+
+    def test_ifSleeping_clockAdvancesInstantly(self):
+        self.clock.sleep(3600)
+        self.assertEqual(3600, self.clock.time())
+
+    def test_ifMovingClockBackwards_ValueErrorIsRaised(self):
+        with self.assertRaises(ValueError):
+            self.clock.advance(-1)
+
+    def test_ifDefaultClockIsSet_actionsWithoutClockUseIt(self):
+        old = get_default_clock()
+        set_default_clock(self.clock)
+        try:
+            self.iface.foo.expectCall(1).willOnce(Delay(10, Return(2)))
+            self.assertEqual(2, self.iface.foo(1))
+        finally:
+            set_default_clock(old)
+        self.assertEqual(10, self.clock.time())
+        self.assertIsInstance(get_default_clock(), RealClock)
+
+    def test_ifDelayActionUsed_clockIsAdvancedAndWrappedActionExecuted(self):
+        self.iface.foo.expectCall(1).willOnce(Delay(0.5, Return(2), clock=self.clock))
+        self.assertEqual(2, self.iface.foo(1))
+        self.assertEqual(0.5, self.clock.time())
+
+    def test_ifJitteredDelayActionUsed_delayIsTakenFromGivenRange(self):
+        self.iface.foo.expectCall(1).willRepeatedly(JitteredDelay(1, 2, clock=self.clock, rng=random.Random(0)))
+        for i in range(100):
+            before = self.clock.time()
+            self.iface.foo(1)
+            self.assertTrue(1 <= self.clock.time() - before <= 2)
+
+    def test_ifFailEveryUsed_everyNthCallFails(self):
+        self.iface.foo.expectCall(_).willRepeatedly(FailEvery(3, ValueError('dummy'), Return(1)))
+        results = []
+        for i in range(6):
+            try:
+                results.append(self.iface.foo(i))
+            except ValueError:
+                results.append('error')
+        self.assertEqual([1, 1, 'error', 1, 1, 'error'], results)
+
+    def test_ifRateLimitExceededAndExceptionGiven_itIsRaised(self):
+        self.iface.foo.expectCall(_).willRepeatedly(
+            RateLimit(1, burst=2, action=Return(1), exception=ValueError('rate limit'), clock=self.clock))
+        self.assertEqual(1, self.iface.foo(1))
+        self.assertEqual(1, self.iface.foo(1))
+        with self.assertRaisesRegexp(ValueError, 'rate limit'):
+            self.iface.foo(1)
+        self.clock.advance(1)
+        self.assertEqual(1, self.iface.foo(1))
+
+    def test_ifHourOfRateLimitedTrafficIsSimulated_itFinishesQuickly(self):
+        self.iface.foo.expectCall(_).willRepeatedly(RateLimit(10, action=Return(1), clock=self.clock))
+        started = time.time()
+        for i in range(36000):
+            self.iface.foo(i)
+        self.assertAlmostEqual(3600, self.clock.time(), delta=0.5)
+        self.assertLess(time.time() - started, 10)
+
+
+COROUTINES_SOURCE = '''
+class AsyncInterface(object):
+
+    @mock_method
+    async def foo(self, a):
+        pass
+
+
+async def call_with_timeout(func, timeout, *args):
+    try:
+        return await asyncio.wait_for(func(*args), timeout)
+    except asyncio.TimeoutError:
+        return 'timeout'
+
+
+async def call_many_times(func, times, *args):
+    return [await func(*args) for _ in range(times)]
+
+
+async def call_concurrently(func, times, *args):
+    return await asyncio.gather(*[func(*args) for _ in range(times)])
+
+
+async def completion_order(*awaitables):
+    order = []
+
+    async def track(awaitable):
+        order.append(await awaitable)
+
+    await asyncio.gather(*[track(x) for x in awaitables])
+    return order
+'''
+
+
+@unittest.skipIf(asyncio is None, "asyncio is not available")
+class TestVirtualClockWithAsyncio(unittest.TestCase):
+
+    def setUp(self):
+        self.coroutines = {'mock_method': mock_method, 'asyncio': asyncio}
+        exec(COROUTINES_SOURCE, self.coroutines)
+        self.iface = self.coroutines['AsyncInterface']()
+        self.clock = VirtualClock()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_ifDelayActionUsedByCoroutineMock_clockIsAdvancedWithoutBlocking(self):
+        self.iface.foo.expectCall(1).willOnce(Delay(30, Return(2), clock=self.clock))
+        started = time.time()
+        self.assertEqual(2, self.loop.run_until_complete(self.iface.foo(1)))
+        self.assertEqual(30, self.clock.time())
+        self.assertLess(time.time() - started, 1)
+
+    def test_ifDelaysAreAwaitedConcurrently_theyOverlapInVirtualTime(self):
+        self.iface.foo.expectCall(1).willRepeatedly(Delay(1, Return(1), clock=self.clock))
+        result = self.loop.run_until_complete(self.coroutines['call_concurrently'](self.iface.foo, 10, 1))
+        self.assertEqual([1] * 10, result)
+        self.assertEqual(1, self.clock.time())
+
+    def test_ifDelaysOfDifferentLengthAreAwaitedConcurrently_shorterOnesFinishFirst(self):
+        for seconds in (3, 1, 2):
+            self.iface.foo.expectCall(seconds).willOnce(Delay(seconds, Return(seconds), clock=self.clock))
+        awaitables = [self.iface.foo(x) for x in (3, 1, 2)]
+        result = self.loop.run_until_complete(self.coroutines['completion_order'](*awaitables))
+        self.assertEqual([1, 2, 3], result)
+        self.assertEqual(3, self.clock.time())
+
+    def test_ifLoopIsNotSelectorBased_attachingItRaisesTypeError(self):
+        with self.assertRaises(TypeError):
+            with self.clock.attach(object()):
+                pass
+
+    def test_ifLoopIsAttachedToClock_timeoutsOfCodeUnderTestRunInVirtualTime(self):
+        self.iface.foo.expectCall(1).willOnce(Delay(30, Return(2), clock=self.clock))
+        started = time.time()
+        with self.clock.attach(self.loop):
+            result = self.loop.run_until_complete(self.coroutines['call_with_timeout'](self.iface.foo, 5, 1))
+        self.assertEqual('timeout', result)
+        self.assertAlmostEqual(5, self.clock.time(), delta=0.01)
+        self.assertLess(time.time() - started, 1)
+
+    def test_ifHourOfRateLimitedTrafficIsSimulatedWithAttachedLoop_itFinishesQuickly(self):
+        self.iface.foo.expectCall(1).willRepeatedly(RateLimit(10, action=Return(1), clock=self.clock))
+        started = time.time()
+        with self.clock.attach(self.loop):
+            result = self.loop.run_until_complete(self.coroutines['call_many_times'](self.iface.foo, 36000, 1))
+        self.assertEqual([1] * 36000, result)
+        self.assertAlmostEqual(3600, self.clock.time(), delta=0.5)
+        self.assertLess(time.time() - started, 30)
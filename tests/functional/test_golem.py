@@ -1,10 +1,43 @@
+import gc
+import sys
+import array
+import timeit
+import weakref
+import warnings
 import unittest
 
-from golem import exc, mock_method
+from golem import exc, policy, _compat, mock_method, mock_class, spy, freeze, unfreeze, attach_template,\
+    snapshot, restore, reset, enable_instrumentation, disable_instrumentation
 from golem.times import AtLeast, AtMost
 from golem.helpers import ArgStorage
-from golem.actions import Return, Invoke, SaveAllArgs
-from golem.matchers import _
+from golem.instrument import Session
+from golem.actions import Return, Invoke, SaveAllArgs, CaptureArgs
+from golem.matchers import _, InstanceOf, Regex, AllOf, Between, Contains, Predicate, Gt
+
+# Keyword-only and positional-only arguments are a syntax error in older
+# Python versions, so classes using them are defined in strings.
+KEYWORD_ONLY_SOURCE = '''
+class KeywordOnlyClient(object):
+
+    def get(self, key, *, timeout=None):
+        return (key, timeout)
+'''
+
+POSITIONAL_ONLY_SOURCE = '''
+class PositionalOnlyClient(object):
+
+    def get(self, key, /, **options):
+        return (key, options)
+
+    def put(self, key, /, value=None):
+        return (key, value)
+'''
+
+
+def make_class(source, name):
+    namespace = {}
+    exec(source, namespace)
+    return namespace[name]
 
 
 class TestGolem(unittest.TestCase):
@@ -204,3 +237,762 @@ class TestGolem(unittest.TestCase):
         self.assertEqual(2, args.b)
         self.assertEqual(1, args.c)
         self.assertEqual(None, args.d)
+
+    def test_ifCapturingArgs_allCallsAreKeptInColumns(self):
+        capture = CaptureArgs(Return('ok'))
+        self.iface.foo.expectCall(_, _, _, _).willRepeatedly(capture)
+        self.assertEqual('ok', self.iface.foo(1, 0.5))
+        self.iface.foo(2, 1.5, c=3)
+        self.iface.foo(3, 'x', d=[1])
+        self.assertEqual(3, len(capture))
+        self.assertEqual([1, 2, 3], list(capture.column('a')))
+        self.assertEqual([0.5, 1.5, 'x'], capture.column('b'))
+        self.assertEqual(3, capture.last('a'))
+        self.assertEqual(3, capture.nth('c', 1))
+        self.assertEqual({'a': [1, 2, 3], 'b': [0.5, 1.5, 'x'], 'c': [1, 3, 1], 'd': [None, None, [1]]}, capture.to_dict())
+        self.assertRaises(KeyError, capture.column, 'e')
+
+    def test_ifManyExactExpectationsGiven_eachCallConsumesItsOwnExpectation(self):
+        for i in range(100):
+            self.iface.foo.expectCall(i, b=i).willOnce(Return(i))
+        for i in reversed(range(100)):
+            self.assertEqual(i, self.iface.foo(i, b=i))
+        self.iface.foo.assertSaturated()
+
+    def test_ifExactAndMatcherExpectationsGiven_bothCanBeConsumed(self):
+        self.iface.foo.expectCall(1, 2).willOnce(Return('exact'))
+        self.iface.foo.expectCall(_, 3).willOnce(Return('matcher'))
+        self.assertEqual('matcher', self.iface.foo(1, 3))
+        self.assertEqual('exact', self.iface.foo(1, 2))
+        self.iface.foo.assertSaturated()
+
+    def test_ifExpectationWithUnhashableArgsGiven_itIsMatchedByEquality(self):
+        self.iface.foo.expectCall([1], {'b': 2}).willOnce(Return(1))
+        self.assertEqual(1, self.iface.foo([1], {'b': 2}))
+        self.iface.foo.assertSaturated()
+
+    def test_ifManyTypedMatcherExpectationsGiven_callsAreDispatchedByArgumentType(self):
+        self.iface.foo.expectCall(InstanceOf(int), _).willRepeatedly(Return('int'))
+        self.iface.foo.expectCall(Regex('^x'), _).willRepeatedly(Return('x'))
+        self.iface.foo.expectCall(AllOf(InstanceOf(float), Between(0, 1)), _).willRepeatedly(Return('fraction'))
+        self.iface.foo.expectCall(_, Contains('b')).willRepeatedly(Return('other'))
+        self.assertEqual('int', self.iface.foo(1, 'b'))
+        self.assertEqual('x', self.iface.foo('xyz', 'b'))
+        self.assertEqual('fraction', self.iface.foo(0.5, 'b'))
+        self.assertEqual('other', self.iface.foo(1.5, 'abc'))
+        with self.assertRaises(exc.UnexpectedMockCallError):
+            self.iface.foo(1.5, 'a')
+
+    def test_ifMockIsFrozen_callsAreDispatchedAndCountedAsBefore(self):
+        self.iface.foo.expectCall(1, 2).willOnce(Return('exact'))
+        self.iface.foo.expectCall(_, 3).willRepeatedly(Return('matcher'))
+        self.iface.foo.freeze()
+        self.assertTrue(self.iface.foo.frozen)
+        self.assertEqual('matcher', self.iface.foo(1, 3))
+        self.assertEqual('exact', self.iface.foo(1, 2))
+        self.assertRaises(exc.MockOversaturatedError, self.iface.foo, 1, 2)
+        self.assertRaises(exc.UnexpectedMockCallError, self.iface.foo, 1, 4)
+
+    def test_ifExpectationIsAddedToFrozenMock_MockFrozenErrorIsRaised(self):
+        self.iface.foo.expectCall(1, 2)
+        self.iface.foo.freeze()
+        self.assertRaises(exc.MockFrozenError, self.iface.foo.expectCall, 3, 4)
+        self.iface.foo.unfreeze()
+        self.iface.foo.expectCall(3, 4)
+        self.iface.foo(3, 4)
+        self.iface.foo(1, 2)
+        self.iface.foo.assertSaturated()
+
+    def test_ifObjectIsFrozen_allItsMockMethodsAreFrozen(self):
+        freeze(self.iface)
+        self.assertTrue(self.iface.foo.frozen)
+        self.assertTrue(self.iface.bar.frozen)
+        self.iface.foo(1, 2)
+        unfreeze(self.iface)
+        self.assertFalse(self.iface.bar.frozen)
+
+    def test_ifSameCallRepeated_nextActionsOfCachedExpectationAreExecuted(self):
+        expectation = self.iface.foo.expectCall(1, 2).willOnce(Return(1)).willOnce(Return(2))
+        self.assertEqual(1, self.iface.foo(1, 2))
+        self.assertIsNotNone(self.iface.foo._last_hit)
+        self.assertEqual(2, self.iface.foo(1, 2))
+        expectation.willOnce(Return(3))
+        self.assertEqual(3, self.iface.foo(1, 2))
+        self.assertRaises(exc.MockOversaturatedError, self.iface.foo, 1, 2)
+
+    def test_ifCachedExpectationIsReplaced_newExpectationIsUsed(self):
+        self.iface.foo.expectCall(1, 2).willOnce(Return('a'))
+        self.assertEqual('a', self.iface.foo(1, 2))
+        self.iface.foo.expectCall(1, 2).willOnce(Return('b'))
+        self.assertEqual('b', self.iface.foo(1, 2))
+        self.iface.foo.assertSaturated()
+
+    def test_ifExpectationsContainMatchers_callsAreNotCached(self):
+        state = {'ready': False}
+        self.iface.foo.expectCall(_, Predicate(lambda x: state['ready'])).willRepeatedly(Return('ready'))
+        self.iface.foo.expectCall(_, _).willRepeatedly(Return('busy'))
+        self.assertEqual('busy', self.iface.foo(1, 2))
+        state['ready'] = True
+        self.assertEqual('ready', self.iface.foo(1, 2))
+        self.assertIsNone(self.iface.foo._last_hit)
+
+    def test_ifJournalEnabled_allCallsAreRecorded(self):
+        self.iface.foo.expectCall(1, 2).willRepeatedly(Return(None))
+        journal = self.iface.foo.enableJournal()
+        self.iface.foo(1, 2)
+        self.iface.foo(1, b=2)
+        self.assertRaises(exc.UnexpectedMockCallError, self.iface.foo, 3, 4)
+        columns = journal.columns()
+        self.assertEqual([1, 1, 3], columns['a'])
+        self.assertEqual([2, 2, 4], columns['b'])
+        self.assertEqual([1, 1, 1], columns['c'])
+        self.assertEqual([0, 0, -1], columns['expectation'])
+        self.assertEqual([((1, 2, 1, None), 2), ((3, 4, 1, None), 1)], journal.argument_counts())
+
+    def test_ifJournalEnabledForMockWithoutExpectations_uninterestedCallsAreRecorded(self):
+        journal = self.iface.bar.enableJournal(maxlen=10)
+        for _ in range(20):
+            self.iface.bar()
+        self.assertEqual(10, len(journal))
+        self.assertEqual(20, journal.total)
+        self.iface.bar.disableJournal()
+        self.iface.bar()
+        self.assertEqual(20, journal.total)
+
+    def test_ifExpectationHasBufferArgument_itIsMatchedByBufferContents(self):
+        self.iface.foo.expectCall(array.array('d', [1.5] * 1000), 1).willOnce(Return('ok'))
+        self.assertRaises(exc.UnexpectedMockCallError, self.iface.foo, array.array('d', [2.5] * 1000), 1)
+        self.assertEqual('ok', self.iface.foo(array.array('d', [1.5] * 1000), 1))
+        self.iface.foo.assertSaturated()
+
+    def test_ifMockAccessedManyTimes_sameMockMethodIsReturned(self):
+        self.assertIs(self.iface.foo, self.iface.foo)
+        self.assertIsNot(self.iface.foo, self.iface.bar)
+
+    def test_ifMockAccessedViaDifferentInstances_differentMockMethodsAreReturned(self):
+        other = self.iface.__class__()
+        self.assertIsNot(self.iface.foo, other.foo)
+        self.assertNotEqual(self.iface.foo, other.foo)
+
+    def test_ifMockCalled_signatureIsNotInspectedAgain(self):
+        self.assertIs(self.iface.foo.inspect, self.iface.__class__.__dict__['foo'].inspect)
+        other = self.iface.__class__()
+        self.assertIs(self.iface.foo.inspect, other.foo.inspect)
+
+    def test_ifInstanceIsDeleted_itIsFreedDespiteHavingMocksCached(self):
+        self.iface.foo.expectCall(1, 2)
+        self.iface.foo(1, 2)
+        ref = weakref.ref(self.iface)
+        gc.disable()
+        try:
+            del self.iface
+            self.assertIsNone(ref())
+        finally:
+            gc.enable()
+
+    def test_ifExpectationGivenPositionallyAndCalledWithKeywords_passes(self):
+        self.iface.foo.expectCall(1, 2).willOnce(Return(1))
+        self.assertEqual(1, self.iface.foo(b=2, a=1, c=1))
+        self.iface.foo.assertSaturated()
+
+    def test_ifMockCalledWithArgumentsNotMatchingSignature_TypeErrorIsRaised(self):
+        self.iface.foo.expectCall(1, 2)
+        with self.assertRaisesRegexp(TypeError, "foo\(\) takes at most 5 arguments \(6 given\)"):
+            self.iface.foo(1, 2, 3, 4, 5)
+
+    def test_ifReturningEachValueOfList_valuesAreReturnedInOrder(self):
+        self.iface.bar.expectCall().willReturnEach([1, 2, 3])
+        self.assertEqual([1, 2, 3], [self.iface.bar() for _ in range(3)])
+        self.iface.bar.assertSaturated()
+        with self.assertRaisesRegexp(exc.MockOversaturatedError, "Oversaturated mock function Interface.bar\(\):\nActual: called 4 times\nExpected: to be called 3 times"):
+            self.iface.bar()
+
+    def test_ifReturningEachValueOfGenerator_valuesArePulledLazily(self):
+        pulled = []
+
+        def values():
+            for i in range(1000000):
+                pulled.append(i)
+                yield i
+
+        self.iface.bar.expectCall().willReturnEach(values())
+        self.assertEqual(0, self.iface.bar())
+        self.assertEqual(1, self.iface.bar())
+        self.assertEqual([0, 1], pulled)
+
+    def test_ifReturningEachValueOfGeneratorAndNotExhausted_failWithUndersaturatedError(self):
+        self.iface.bar.expectCall().willReturnEach(x for x in range(2))
+        self.iface.bar()
+        with self.assertRaisesRegexp(exc.MockUndersaturatedError, "Undersaturated mock function Interface.bar\(\):\nActual: called once\nExpected: to be called until all values are returned"):
+            self.iface.bar.assertSaturated()
+        self.iface.bar()
+        self.iface.bar.assertSaturated()
+        with self.assertRaisesRegexp(exc.MockOversaturatedError, "Oversaturated mock function Interface.bar\(\):\nActual: called 3 times\nExpected: to be called twice"):
+            self.iface.bar()
+
+    def test_ifReturningEachValueMixedWithOtherActions_actionsAreExecutedInOrder(self):
+        self.iface.bar.expectCall().\
+            willOnce(Return('first')).\
+            willReturnEach(x for x in range(2)).\
+            willOnce(Return('last')).\
+            willRepeatedly(Return('repeated'))
+        self.assertEqual(['first', 0, 1, 'last', 'repeated', 'repeated'], [self.iface.bar() for _ in range(6)])
+        self.iface.bar.assertSaturated()
+
+    def test_ifManySingleActionsAreAdded_setupTimeGrowsLinearly(self):
+
+        def setup(count):
+            expectation = self.iface.__class__().bar.expectCall()
+            start = timeit.default_timer()
+            for i in range(count):
+                expectation.willOnce(Return(i))
+            return timeit.default_timer() - start
+
+        small = min(setup(2000) for _ in range(3))
+        large = min(setup(16000) for _ in range(3))
+        self.assertLess(large / small, 24)
+
+    def test_ifExpectationsAreConsumed_pendingCountIsUpdated(self):
+        self.assertEqual(0, self.iface.foo.pending_count)
+        for i in range(10):
+            self.iface.foo.expectCall(i, 0)
+        self.iface.foo.expectCall(10, 0).times(AtLeast(0))
+        self.assertEqual(10, self.iface.foo.pending_count)
+        for i in range(10):
+            self.iface.foo(i, 0)
+            self.assertEqual(9 - i, self.iface.foo.pending_count)
+        self.iface.foo.assertSaturated()
+
+    def test_ifSatisfiedExpectationIsChanged_itBecomesPendingAgain(self):
+        expectation = self.iface.bar.expectCall()
+        self.iface.bar()
+        self.assertEqual(0, self.iface.bar.pending_count)
+        expectation.times(2)
+        self.assertEqual(1, self.iface.bar.pending_count)
+        expectation.willRepeatedly(Return(1))
+        self.assertEqual(0, self.iface.bar.pending_count)
+
+    def test_ifOnlyOneOfManyExpectationsIsNotSatisfied_itIsReported(self):
+        for i in range(1000):
+            self.iface.foo.expectCall(i, 0)
+        for i in range(1000):
+            if i != 500:
+                self.iface.foo(i, 0)
+        self.assertEqual(1, self.iface.foo.pending_count)
+        with self.assertRaisesRegexp(exc.MockUndersaturatedError, "Undersaturated mock function Interface.foo\(500, 0\)"):
+            self.iface.foo.assertSaturated()
+
+    def test_ifStreamOfUnknownLengthIsExhausted_expectationStopsBeingPendingWhenVerified(self):
+        self.iface.bar.expectCall().willReturnEach(x for x in range(2))
+        self.iface.bar()
+        self.iface.bar()
+        self.assertEqual(1, self.iface.bar.pending_count)
+        self.iface.bar.assertSaturated()
+        self.assertEqual(0, self.iface.bar.pending_count)
+
+    def test_ifExpectedListIsChangedAfterExpectCall_callsAreMatchedAgainstItsCurrentValue(self):
+        data = [0] * 100
+        self.iface.foo.expectCall(data, _)
+        data.append(1)
+        self.iface.foo([0] * 100 + [1], 1)
+        self.iface.foo.assertSaturated()
+
+
+class TestUninterestedCallPolicy(unittest.TestCase):
+
+    def setUp(self):
+
+        class Interface(object):
+
+            @mock_method
+            def foo(self, a):
+                pass
+
+        self.iface = Interface()
+        self.default_policy = policy.get_uninterested_call_policy()
+
+    def tearDown(self):
+        policy.set_uninterested_call_policy(self.default_policy)
+
+    def call_foo(self, *args):
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            for a in args:
+                self.iface.foo(a)
+        return [str(x.message) for x in w]
+
+    def test_byDefault_warningIsEmittedOnEachCall(self):
+        self.assertEqual(["Uninterested mock function called: Interface.foo(1)"] * 2, self.call_foo(1, 1))
+        self.assertEqual(2, self.iface.foo.uninterested_calls)
+
+    def test_ifPolicyIsIgnore_callsAreNeitherReportedNorCounted(self):
+        self.iface.foo.uninterested_policy = policy.IGNORE
+        self.assertEqual([], self.call_foo(1, 2))
+        self.assertEqual(0, self.iface.foo.uninterested_calls)
+
+    def test_ifPolicyIsCount_callsAreOnlyCounted(self):
+        self.iface.foo.uninterested_policy = policy.COUNT
+        self.assertEqual([], self.call_foo(1, 2, 3))
+        self.assertEqual(3, self.iface.foo.uninterested_calls)
+
+    def test_ifPolicyIsWarnOnce_warningIsEmittedOncePerDistinctArguments(self):
+        self.iface.foo.uninterested_policy = policy.WARN_ONCE
+        self.assertEqual([
+            "Uninterested mock function called: Interface.foo(1)",
+            "Uninterested mock function called: Interface.foo([2])"], self.call_foo(1, [2], 1, [2]))
+        self.assertEqual(4, self.iface.foo.uninterested_calls)
+
+    def test_ifPolicyIsRaise_uninterestedCallFails(self):
+        self.iface.foo.uninterested_policy = policy.RAISE
+        with self.assertRaisesRegexp(exc.UninterestedMockCallError, "Uninterested mock function called: Interface.foo\(1\)"):
+            self.iface.foo(1)
+
+    def test_ifGlobalPolicyIsSet_itIsUsedByMocksWithoutOwnPolicy(self):
+        policy.set_uninterested_call_policy(policy.COUNT)
+        self.assertEqual([], self.call_foo(1))
+        self.assertEqual(1, self.iface.foo.uninterested_calls)
+        self.iface.foo.uninterested_policy = policy.RAISE
+        with self.assertRaises(exc.UninterestedMockCallError):
+            self.iface.foo(1)
+
+    def test_ifWarningsAreIgnored_argumentsAreNotFormatted(self):
+
+        class Argument(object):
+            repr_calls = 0
+
+            def __repr__(self):
+                Argument.repr_calls += 1
+                return 'Argument()'
+
+        for name in (policy.WARN, policy.WARN_ONCE):
+            self.iface.foo.uninterested_policy = name
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                for _ in range(100):
+                    self.iface.foo(Argument())
+            self.assertEqual(0, Argument.repr_calls)
+        self.assertEqual(200, self.iface.foo.uninterested_calls)
+        self.assertEqual(["Uninterested mock function called: Interface.foo(Argument())"], self.call_foo(Argument()))
+
+    def test_ifPolicyIsWarnOnce_repeatedUnhashableArgumentsAreNotFormatted(self):
+
+        class Argument(object):
+            repr_calls = 0
+
+            def __eq__(self, other):
+                return isinstance(other, Argument)
+
+            def __repr__(self):
+                Argument.repr_calls += 1
+                return 'Argument()'
+
+        self.iface.foo.uninterested_policy = policy.WARN_ONCE
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            for _ in range(100):
+                self.iface.foo([Argument()])
+        self.assertEqual(1, len(w))
+        self.assertEqual(1, Argument.repr_calls)
+        self.assertEqual(100, self.iface.foo.uninterested_calls)
+
+    def test_ifInvalidPolicyIsGiven_ValueErrorIsRaised(self):
+        with self.assertRaises(ValueError):
+            policy.set_uninterested_call_policy('dummy')
+        with self.assertRaises(ValueError):
+            self.iface.foo.uninterested_policy = 'dummy'
+
+
+class TestMockClass(unittest.TestCase):
+
+    def setUp(self):
+
+        class Base(object):
+
+            def ping(self):
+                return 'real'
+
+        class Client(Base):
+            timeout = 5
+
+            def __init__(self, address):
+                raise RuntimeError("should not be called")
+
+            def get(self, key, default=None):
+                return 'real'
+
+            def _helper(self):
+                pass
+
+            @property
+            def status(self):
+                return 'real'
+
+            @staticmethod
+            def create():
+                pass
+
+        self.Client = Client
+        self.Mock = mock_class(Client)
+
+    def test_ifClassIsMocked_mockIsItsSubclassWithAllMethodsMocked(self):
+        self.assertTrue(issubclass(self.Mock, self.Client))
+        for name in ('ping', 'get', '_helper'):
+            self.assertIsInstance(self.Mock.__dict__[name], mock_method)
+        self.assertNotIn('status', self.Mock.__dict__)
+        self.assertNotIn('create', self.Mock.__dict__)
+        self.assertEqual(5, self.Mock().timeout)
+
+    def test_ifMockMethodIsUsed_itHasSignatureOfRealMethod(self):
+        client = self.Mock()
+        client.get.expectCall('a').willOnce(Return(1))
+        self.assertEqual(1, client.get(key='a'))
+        client.get.assertSaturated()
+        with self.assertRaises(TypeError):
+            client.get()
+
+    def test_ifClassIsMocked_methodsAreInspectedOnlyWhenUsed(self):
+        client = self.Mock()
+        self.assertIsNone(self.Mock.__dict__['get']._inspect)
+        client.ping.expectCall()
+        self.assertIsNone(self.Mock.__dict__['get']._inspect)
+        self.assertIsNotNone(self.Mock.__dict__['ping']._inspect)
+        self.assertEqual(['ping'], [x.func.__name__ for x in client._mock_methods])
+
+    @unittest.skipIf(_compat.PY2, "keyword-only arguments are not available")
+    def test_ifMethodHasKeywordOnlyArguments_theyCanBeExpected(self):
+        client = mock_class(make_class(KEYWORD_ONLY_SOURCE, 'KeywordOnlyClient'))()
+        client.get.expectCall('a', timeout=5).willOnce(Return(1))
+        client.get.expectCall('b').willOnce(Return(2))
+        self.assertEqual(1, client.get('a', timeout=5))
+        self.assertEqual(2, client.get('b', timeout=None))
+        with self.assertRaisesRegexp(TypeError, "get\\(\\) got an unexpected keyword argument 'retries'"):
+            client.get('a', retries=1)
+
+    @unittest.skipIf(sys.version_info < (3, 8), "positional-only arguments are not available")
+    def test_ifMethodHasPositionalOnlyArguments_keywordsNamedAsThemAreExtraKeywords(self):
+        client = mock_class(make_class(POSITIONAL_ONLY_SOURCE, 'PositionalOnlyClient'))()
+        client.get.expectCall(_, key=1).willOnce(Return(1))
+        client.put.expectCall('a', value=2)
+        self.assertEqual(1, client.get('a', key=1))
+        client.put('a', 2)
+        with self.assertRaisesRegexp(TypeError, "put\\(\\) got some positional-only arguments passed as keyword arguments: 'key'"):
+            client.put(key='a')
+
+
+class TestSpy(unittest.TestCase):
+
+    def setUp(self):
+
+        class Service(object):
+
+            def __init__(self):
+                self.store = {}
+
+            def put(self, key, value):
+                self.store[key] = value
+                return len(self.store)
+
+            def get(self, key):
+                return self.store[key]
+
+            @property
+            def size(self):
+                return len(self.store)
+
+        self.real = Service()
+        self.uut = spy(self.real)
+
+    def test_ifSpyIsCalled_callsAreForwardedAndCounted(self):
+        self.assertIsInstance(self.uut, self.real.__class__)
+        self.assertEqual(1, self.uut.put('a', 1))
+        self.assertEqual(1, self.uut.get('a'))
+        self.assertEqual({'a': 1}, self.real.store)
+        self.assertEqual(1, self.uut.size)
+        self.assertEqual(1, self.uut.put.forwarded_calls)
+        self.assertEqual(1, self.uut.get.forwarded_calls)
+
+    def test_ifSpyHasExpectations_matchingCallsAreVerifiedAndOthersForwarded(self):
+        self.uut.put.expectCall('a', _).times(2)
+        self.uut.get.expectCall('b').willOnce(Return('fake'))
+        self.uut.put('a', 1)
+        self.uut.put('b', 2)
+        self.assertEqual('fake', self.uut.get('b'))
+        self.assertEqual(2, self.uut.put.forwarded_calls)
+        self.assertEqual(0, self.uut.get.forwarded_calls)
+        with self.assertRaises(exc.MockUndersaturatedError):
+            self.uut.put.assertSaturated()
+        self.uut.put('a', 3)
+        self.uut.put.assertSaturated()
+        self.assertEqual({'a': 3, 'b': 2}, self.real.store)
+
+    def test_ifSpiedMethodRaises_exceptionIsPropagated(self):
+        self.assertRaises(KeyError, self.uut.get, 'missing')
+        self.assertEqual(1, self.uut.get.forwarded_calls)
+
+    @unittest.skipIf(_compat.PY2, "keyword-only arguments are not available")
+    def test_ifSpiedMethodHasKeywordOnlyArguments_callsUsingThemAreForwarded(self):
+        uut = spy(make_class(KEYWORD_ONLY_SOURCE, 'KeywordOnlyClient')())
+        uut.get.expectCall('b', timeout=1)
+        self.assertEqual(('a', 3), uut.get('a', timeout=3))
+        self.assertEqual(('b', 1), uut.get('b', timeout=1))
+        uut.get.assertSaturated()
+
+    @unittest.skipIf(sys.version_info < (3, 8), "positional-only arguments are not available")
+    def test_ifSpiedCallCannotBeBound_itIsForwarded(self):
+        uut = spy(make_class(POSITIONAL_ONLY_SOURCE, 'PositionalOnlyClient')())
+        uut.put.expectCall('b')
+        self.assertRaisesRegexp(TypeError, "positional-only arguments passed as keyword", uut.put, key='a')
+        self.assertEqual(1, uut.put.forwarded_calls)
+        uut.put('b')
+        uut.put.assertSaturated()
+
+
+class TestTemplate(unittest.TestCase):
+
+    def setUp(self):
+
+        class Connection(object):
+
+            @mock_method
+            def send(self, data):
+                pass
+
+            @mock_method
+            def close(self):
+                pass
+
+        self.template = Connection()
+        self.template.send.expectCall(b'hello').willOnce(Return(1)).willOnce(Return(2))
+        self.template.send.expectCall(Gt(b'z')).willRepeatedly(Return(0))
+        self.first = attach_template(Connection(), self.template)
+        self.second = attach_template(Connection(), self.template)
+
+    def test_ifTemplateIsAttached_eachInstanceCountsCallsSeparately(self):
+        self.assertEqual(1, self.first.send(b'hello'))
+        self.assertEqual(2, self.first.send(b'hello'))
+        self.assertEqual(1, self.second.send(b'hello'))
+        self.assertEqual(0, self.second.send(b'zz'))
+        self.first.send.assertSaturated()
+        with self.assertRaisesRegexp(exc.MockUndersaturatedError, "Actual: called once"):
+            self.second.send.assertSaturated()
+        with self.assertRaises(exc.MockOversaturatedError):
+            self.first.send(b'hello')
+
+    def test_ifInstanceWasNotCalled_itIsUndersaturated(self):
+        self.assertEqual(1, self.first.send.pending_count)
+        with self.assertRaisesRegexp(exc.MockUndersaturatedError, "Actual: never called"):
+            self.first.send.assertSaturated()
+        self.first.close.assertSaturated()
+        self.assertTrue(self.template.send.frozen)
+
+    def test_ifInstanceIsCalled_templateExpectationsAreNotChanged(self):
+        self.first.send(b'hello')
+        expectation = list(self.template.send.expectations.iteritems())[0][1]
+        self.assertEqual(0, expectation.actual_calls)
+        self.assertEqual(0, len(self.first.send.expectations))
+
+    def test_ifExpectationIsAddedToInstance_templateExpectationsAreCopiedFirst(self):
+        self.first.send(b'hello')
+        self.first.send.expectCall(b'bye')
+        self.assertEqual(3, len(self.first.send.expectations))
+        self.assertEqual(2, self.first.send(b'hello'))
+        self.first.send(b'bye')
+        self.first.send.assertSaturated()
+        self.assertEqual(1, self.second.send(b'hello'))
+
+    def test_ifTemplateHasManyRequiredExpectations_theyArePendingUntilCalled(self):
+        template = self.template.__class__()
+        for i in range(1000):
+            template.send.expectCall(i)
+        instance = self.template.__class__()
+        listener = set()
+        instance.send.addPendingListener(listener)
+        attach_template(instance, template)
+        self.assertEqual(1000, instance.send.pending_count)
+        self.assertEqual(set([instance.send]), listener)
+        for i in range(999):
+            instance.send(i)
+        self.assertEqual(1, instance.send.pending_count)
+        with self.assertRaisesRegexp(exc.MockUndersaturatedError, "Connection.send\\(999\\)"):
+            instance.send.assertSaturated()
+        instance.send(999)
+        self.assertEqual(0, instance.send.pending_count)
+        self.assertEqual(set(), listener)
+
+    def test_ifTemplateReturnsValuesOfStream_itCannotBeAttached(self):
+        template = self.template.__class__()
+        template.send.expectCall(1).willReturnEach(iter([1, 2]))
+        with self.assertRaises(ValueError):
+            attach_template(self.template.__class__(), template)
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+
+        class Interface(object):
+
+            @mock_method
+            def foo(self, a):
+                pass
+
+            @mock_method
+            def bar(self):
+                pass
+
+        self.iface = Interface()
+        self.iface.foo.expectCall(1).willOnce(Return(1)).willOnce(Return(2))
+        self.iface.foo.expectCall(InstanceOf(str)).willRepeatedly(Return('s'))
+        self.snapshot = snapshot(self.iface)
+
+    def test_ifSnapshotIsRestored_callCountsAndActionQueuesAreReset(self):
+        for _ in range(3):
+            self.assertEqual(1, self.iface.foo(1))
+            self.assertEqual('s', self.iface.foo('a'))
+            self.assertEqual(2, self.iface.foo(1))
+            self.iface.foo.assertSaturated()
+            restore(self.iface, self.snapshot)
+            self.assertEqual(1, self.iface.foo.pending_count)
+
+    def test_ifSnapshotIsRestored_expectationsAddedSinceAreRemoved(self):
+        self.iface.foo(1)
+        self.iface.foo(1)
+        self.iface.foo.expectCall(2)
+        self.iface.foo.expectCall(1).willOnce(Return(3))
+        self.iface.bar.expectCall()
+        restore(self.iface, self.snapshot)
+        self.assertEqual(2, len(self.iface.foo.expectations))
+        self.assertEqual(1, self.iface.foo.pending_count)
+        self.assertEqual(0, self.iface.bar.pending_count)
+        self.assertEqual(1, self.iface.foo(1))
+        with self.assertRaises(exc.UnexpectedMockCallError):
+            self.iface.foo(2)
+
+    def test_ifFrozenMockIsRestored_itRemainsFrozen(self):
+        freeze(self.iface)
+        frozen = snapshot(self.iface)
+        self.iface.foo(1)
+        restore(self.iface, frozen)
+        self.assertTrue(self.iface.foo.frozen)
+        self.assertEqual(1, self.iface.foo(1))
+        restore(self.iface, self.snapshot)
+        self.assertFalse(self.iface.foo.frozen)
+
+    def test_ifMockWithTemplateIsRestored_itsCopiesAreDiscarded(self):
+        instance = attach_template(self.iface.__class__(), self.iface)
+        state = snapshot(instance)
+        instance.foo(1)
+        instance.foo.expectCall(2)
+        restore(instance, state)
+        self.assertEqual(0, len(instance.foo.expectations))
+        self.assertEqual(1, instance.foo.pending_count)
+        self.assertEqual(1, instance.foo(1))
+
+    def test_ifMockIsReset_allExpectationsAndCountersAreCleared(self):
+        self.iface.foo(1)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.iface.bar()
+        reset(self.iface)
+        self.assertEqual(0, len(self.iface.foo.expectations))
+        self.assertEqual(0, self.iface.foo.pending_count)
+        self.assertEqual(0, self.iface.bar.uninterested_calls)
+        self.iface.foo.assertSaturated()
+
+    def test_ifExpectationReturnsValuesOfStream_snapshotCannotBeTaken(self):
+        self.iface.bar.expectCall().willReturnEach(iter([1]))
+        with self.assertRaises(ValueError):
+            snapshot(self.iface)
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+
+        class Interface(object):
+
+            @mock_method
+            def foo(self, a):
+                pass
+
+            @mock_method
+            def bar(self):
+                pass
+
+        self.iface = Interface()
+        self.iface.foo.expectCall(1).willRepeatedly(Return(1))
+        self.iface.foo.expectCall(2).willOnce(Return(2))
+
+    def tearDown(self):
+        disable_instrumentation()
+
+    def test_ifMockIsInstrumented_callsAndHitsAreCounted(self):
+        session = self.iface.foo.enableInstrumentation()
+        for _ in range(3):
+            self.iface.foo(1)
+        self.assertEqual(2, self.iface.foo(2))
+        with self.assertRaises(exc.UnexpectedMockCallError):
+            self.iface.foo(3)
+        stats, = session.stats
+        self.assertEqual('Interface.foo', stats.name)
+        self.assertEqual(5, stats.calls)
+        self.assertEqual(1, stats.unmatched)
+        self.assertEqual([3, 1], [n for _, n in stats.top_hits()])
+        self.assertEqual(1, stats.top_hits(1)[0][0].args[0])
+
+    def test_ifInstrumentationIsDisabled_callsAreNotCounted(self):
+        session = self.iface.foo.enableInstrumentation()
+        self.iface.foo(1)
+        self.iface.foo.disableInstrumentation()
+        self.iface.foo(1)
+        self.assertEqual(1, session.stats[0].calls)
+
+    def test_ifInstrumentationIsDisabledPerMock_itOverridesGlobalSession(self):
+        session = enable_instrumentation()
+        self.iface.foo.disableInstrumentation()
+        self.iface.foo(1)
+        self.assertEqual([], session.stats)
+        own = self.iface.foo.enableInstrumentation()
+        self.iface.foo(1)
+        self.assertEqual([], session.stats)
+        self.assertEqual(1, own.stats[0].calls)
+        self.iface.foo.disableInstrumentation()
+        self.iface.foo(1)
+        self.assertEqual(1, own.stats[0].calls)
+
+    def test_ifInstrumentationIsEnabledGlobally_allMocksShareSession(self):
+        session = enable_instrumentation()
+        self.iface.foo(1)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.iface.bar()
+        self.assertEqual(['Interface.bar', 'Interface.foo'], sorted(x.name for x in session.stats))
+        disable_instrumentation()
+        self.iface.foo(1)
+        self.assertEqual(2, sum(x.calls for x in session.stats))
+
+    def test_ifHooksAreAdded_theyAreCalledAroundEachCall(self):
+        session = self.iface.foo.enableInstrumentation()
+        events = []
+        session.add_pre_call_hook(lambda call: events.append(('pre', call.args)))
+        session.add_post_call_hook(lambda call, result, error: events.append(('post', result, type(error))))
+        self.iface.foo(2)
+        with self.assertRaises(exc.MockOversaturatedError):
+            self.iface.foo(2)
+        self.assertEqual([
+            ('pre', (2,)), ('post', 2, type(None)),
+            ('pre', (2,)), ('post', None, exc.MockOversaturatedError)], events)
+
+    def test_ifReportIsCreated_mocksAreRankedByTotalTime(self):
+        ticks = iter(range(0, 1000, 10))
+        session = enable_instrumentation(Session(timer=lambda: next(ticks) * 1e-6))
+        self.iface.foo(1)
+        self.iface.foo(1)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.iface.bar()
+        self.assertEqual(['Interface.foo', 'Interface.bar'], [x.name for x in session.ranked()])
+        self.assertAlmostEqual(40e-6, session.ranked()[0].total_time)
+        report = session.report().splitlines()
+        self.assertTrue(report[1].startswith('Interface.foo'))
+        self.assertIn('Interface.foo(1)', report[2])
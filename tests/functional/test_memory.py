@@ -0,0 +1,145 @@
+import gc
+import sys
+import weakref
+import unittest
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from golem import mock_method
+from golem.mixins import MockTestCaseMixin
+from golem.times import Exactly, AtLeast, AtMost
+from golem.actions import Return, Invoke, SaveAllArgs, CaptureArgs
+from golem.matchers import _, Gt
+from golem._core import MockMethodCall, Expectation
+
+
+def traced_bytes(func, count):
+    """Return number of bytes allocated by *func* and still held by its
+    result, divided by *count*."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        total = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return float(total) / count
+
+
+class Interface(object):
+
+    @mock_method
+    def foo(self, a):
+        pass
+
+    @mock_method
+    def bar(self):
+        pass
+
+
+def run_test_case():
+    test_case = MockTestCaseMixin()
+    iface = Interface()
+    test_case.expectCall(iface.foo, 1).willOnce(Return(1))
+    test_case.expectCall(iface.foo, Gt(1)).willRepeatedly(Return(2))
+    test_case.expectCall(iface.bar)
+    iface.foo.freeze()
+    iface.foo(1)
+    iface.foo(2)
+    iface.bar()
+    test_case.assertSaturated()
+    return iface
+
+
+class TestMemoryFootprint(unittest.TestCase):
+
+    def setUp(self):
+
+        class Interface(object):
+
+            @mock_method
+            def foo(self, a, b, c=1):
+                pass
+
+        self.iface = Interface()
+
+    def test_coreObjectsHaveNoInstanceDict(self):
+        for obj in [
+                MockMethodCall(self.iface.foo, (1, 2), {}), Expectation(),
+                Exactly(1), AtLeast(1), AtMost(1),
+                Return(1), Invoke(None), SaveAllArgs(None), CaptureArgs()]:
+            self.assertFalse(hasattr(obj, '__dict__'), obj)
+
+    @unittest.skipIf(tracemalloc is None, "tracemalloc is not available")
+    def test_bytesPerRecordedCall(self):
+        per_call = traced_bytes(
+            lambda: [MockMethodCall(self.iface.foo, (i % 100, i % 100), {}) for i in range(1000)], 1000)
+        self.assertLessEqual(per_call, 320)
+
+    @unittest.skipIf(tracemalloc is None, "tracemalloc is not available")
+    def test_bytesPerExpectation(self):
+
+        def expect():
+            for i in range(1000):
+                self.iface.foo.expectCall(i, i).willOnce(Return(i))
+            return self.iface
+
+        per_expectation = traced_bytes(expect, 1000)
+        self.assertLessEqual(per_expectation, 1152)
+
+    @unittest.skipIf(tracemalloc is None, "tracemalloc is not available")
+    def test_bytesPerJournalEntry(self):
+
+        def record():
+            self.iface.foo.expectCall(_, _).times(AtLeast(0))
+            self.iface.foo.enableJournal()
+            for i in range(10000):
+                self.iface.foo(i % 10, i % 10)
+            return self.iface
+
+        per_call = traced_bytes(record, 10000)
+        self.assertLessEqual(per_call, 32)
+
+    def test_bytesPerCapturedNumericCall(self):
+        capture = CaptureArgs()
+        self.iface.foo.expectCall(_, _).willRepeatedly(capture)
+        for i in range(10000):
+            self.iface.foo(i, float(i))
+        per_call = sum(sys.getsizeof(capture.column(x)) for x in ('a', 'b', 'c')) / capture.count
+        self.assertLessEqual(per_call, 32)
+
+
+class TestLeaks(unittest.TestCase):
+
+    def setUp(self):
+        gc.collect()
+        gc.disable()
+
+    def tearDown(self):
+        gc.enable()
+
+    def test_ifTestCaseEnds_itsMocksAreFreedByReferenceCounting(self):
+        iface = run_test_case()
+        refs = [weakref.ref(x) for x in (
+            iface, iface.foo, iface.bar, iface.foo._pending, iface.foo.expectations)]
+        del iface
+        self.assertEqual([None] * len(refs), [x() for x in refs])
+
+    @unittest.skipIf(tracemalloc is None, "tracemalloc is not available")
+    def test_ifManyTestCasesAreRun_memoryStaysFlat(self):
+        for _ in range(100):
+            run_test_case()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            for _ in range(2000):
+                run_test_case()
+            growth = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        self.assertLess(growth, 16 * 1024)
@@ -0,0 +1,178 @@
+import pickle
+import unittest
+import multiprocessing
+
+try:
+    from concurrent import futures
+except ImportError:
+    futures = None
+
+from golem import exc, mock_method, shared
+from golem.actions import Return
+
+
+class Interface(object):
+
+    @mock_method
+    def foo(self, a):
+        pass
+
+    @mock_method
+    def bar(self):
+        pass
+
+
+def call_foo(mock, count, results):
+    for _ in range(count):
+        results.put(mock.foo(1))
+
+
+def call_foo_in_task(mock):
+    return [mock.foo(1) for _ in range(3)]
+
+
+def get_context(method):
+    if not hasattr(multiprocessing, 'get_context'):
+        return multiprocessing if method == 'fork' else None
+    if method not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context(method)
+
+
+class TestSharedMocks(unittest.TestCase):
+    num_processes = 2
+    calls_per_process = 3
+
+    def setUp(self):
+        self.iface = Interface()
+
+    def run_processes(self, context):
+        results = context.Queue()
+        processes = [
+            context.Process(target=call_foo, args=(self.iface, self.calls_per_process, results))
+            for _ in range(self.num_processes)]
+        for p in processes:
+            p.start()
+        values = [results.get(timeout=10) for _ in range(self.num_processes * self.calls_per_process)]
+        for p in processes:
+            p.join()
+        return [p.exitcode for p in processes], values
+
+    def check_calls_are_counted_globally(self, method):
+        context = get_context(method)
+        if context is None:
+            self.skipTest("%r start method is not available" % method)
+        total = self.num_processes * self.calls_per_process
+        shared.share(self.iface)
+        expectation = self.iface.foo.expectCall(1)
+        for i in range(total):
+            expectation.willOnce(Return(i))
+        exitcodes, values = self.run_processes(context)
+        self.assertEqual([0] * self.num_processes, exitcodes)
+        self.assertEqual(list(range(total)), sorted(values))
+        self.assertEqual(total, expectation.actual_calls)
+        self.assertEqual(0, self.iface.foo.pending_count)
+        self.iface.foo.assertSaturated()
+
+    def test_ifSharedMockIsCalledInForkedProcesses_callsAreCountedInParent(self):
+        self.check_calls_are_counted_globally('fork')
+
+    def test_ifSharedMockIsPickledIntoSpawnedProcesses_callsAreCountedInParent(self):
+        self.check_calls_are_counted_globally('spawn')
+
+    def check_calls_made_in_pool_tasks_are_counted(self, method):
+        context = get_context(method)
+        if context is None:
+            self.skipTest("%r start method is not available" % method)
+        shared.share(self.iface)
+        expectation = self.iface.foo.expectCall(1)
+        for i in range(6):
+            expectation.willOnce(Return(i))
+        with futures.ProcessPoolExecutor(2, mp_context=context) as executor:
+            values = sum(executor.map(call_foo_in_task, [self.iface] * 2), [])
+        self.assertEqual(list(range(6)), sorted(values))
+        self.assertEqual(6, expectation.actual_calls)
+        self.iface.foo.assertSaturated()
+
+    @unittest.skipIf(futures is None, "concurrent.futures is not available")
+    def test_ifSharedMockIsSentToForkedPoolTasks_callsAreCountedInParent(self):
+        self.check_calls_made_in_pool_tasks_are_counted('fork')
+
+    @unittest.skipIf(futures is None, "concurrent.futures is not available")
+    def test_ifSharedMockIsSentToSpawnedPoolTasks_callsAreCountedInParent(self):
+        self.check_calls_made_in_pool_tasks_are_counted('spawn')
+
+    def test_ifMockIsNotShared_callsMadeInChildProcessesAreNotCounted(self):
+        context = get_context('fork')
+        if context is None:
+            self.skipTest("'fork' start method is not available")
+        expectation = self.iface.foo.expectCall(1)
+        expectation.willRepeatedly(Return(1))
+        self.run_processes(context)
+        self.assertEqual(0, expectation.actual_calls)
+
+    def test_ifSharedExpectationIsCalledInParent_itIsVerifiedAsUsual(self):
+        counters = shared.share(self.iface, shared.SharedCounters(size=4))
+        self.iface.foo.expectCall(1).times(2)
+        self.iface.bar.expectCall()
+        self.iface.foo(1)
+        self.assertEqual(2, len(counters))
+        with self.assertRaises(exc.MockUndersaturatedError):
+            self.iface.foo.assertSaturated()
+        self.iface.foo(1)
+        self.iface.foo.assertSaturated()
+        with self.assertRaises(exc.MockOversaturatedError):
+            self.iface.foo(1)
+
+    def test_ifSharedMockIsRestored_sharedCountersAreRestoredAsWell(self):
+        shared.share(self.iface, shared.SharedCounters(size=4))
+        self.iface.foo.expectCall(1).willOnce(Return(1)).willOnce(Return(2))
+        snapshot = self.iface.foo.snapshot()
+        self.assertEqual([1, 2], [self.iface.foo(1), self.iface.foo(1)])
+        self.iface.foo.restore(snapshot)
+        self.assertEqual(1, self.iface.foo.pending_count)
+        with self.assertRaises(exc.MockUndersaturatedError):
+            self.iface.foo.assertSaturated()
+        self.assertEqual([1, 2], [self.iface.foo(1), self.iface.foo(1)])
+        self.iface.foo.assertSaturated()
+
+    def test_ifSharedCounterIsSet_itHoldsGivenValue(self):
+        counters = shared.SharedCounters(size=1)
+        index = counters.allocate(3)
+        counters.set(index, 1)
+        self.assertEqual(1, counters.get(index))
+        self.assertEqual(2, counters.increment(index))
+
+    def test_ifAllSharedCountersAreUsed_allocatingNextOneFails(self):
+        counters = shared.SharedCounters(size=1)
+        self.assertEqual(0, counters.allocate(5))
+        self.assertEqual(6, counters.increment(0))
+        with self.assertRaises(ValueError):
+            counters.allocate()
+
+    def test_ifSharedCountersArePickled_copyUsesSameCounters(self):
+        counters = shared.SharedCounters(size=2)
+        index = counters.allocate()
+        copy = pickle.loads(pickle.dumps(counters))
+        copy.increment(index)
+        self.assertEqual(1, counters.get(index))
+        self.assertEqual(2, counters.increment(index))
+        self.assertEqual(2, copy.get(index))
+
+
+class TestPickling(unittest.TestCase):
+
+    def setUp(self):
+        self.iface = Interface()
+
+    @unittest.skipIf(str is bytes, "mock methods are pickled by value in Python 2")
+    def test_ifMockIsPickled_itsCopyHasSameExpectations(self):
+        self.iface.foo.expectCall(1).willOnce(Return(1)).willOnce(Return(2))
+        self.iface.foo(1)
+        self.iface.foo.freeze()
+        copy = pickle.loads(pickle.dumps(self.iface, pickle.HIGHEST_PROTOCOL))
+        self.assertIs(copy.foo.obj, copy)
+        self.assertTrue(copy.foo.frozen)
+        self.assertEqual(2, copy.foo(1))
+        copy.foo.assertSaturated()
+        self.assertEqual(1, self.iface.foo.pending_count)
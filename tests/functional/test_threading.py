@@ -0,0 +1,115 @@
+import sys
+import threading
+import unittest
+
+from golem import policy, mock_method
+from golem.actions import Return, Invoke
+
+
+class TestThreadSafeMode(unittest.TestCase):
+    num_threads = 8
+    calls_per_thread = 2000
+
+    def setUp(self):
+
+        class Interface(object):
+
+            @mock_method
+            def foo(self, a):
+                pass
+
+        self.iface = Interface()
+        self.iface.foo.thread_safe = True
+        if hasattr(sys, 'setswitchinterval'):
+            self.switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(1e-6)
+        else:
+            self.check_interval = sys.getcheckinterval()
+            sys.setcheckinterval(1)
+
+    def tearDown(self):
+        if hasattr(sys, 'setswitchinterval'):
+            sys.setswitchinterval(self.switch_interval)
+        else:
+            sys.setcheckinterval(self.check_interval)
+
+    def hammer(self, func, calls_per_thread):
+        errors = []
+
+        def worker():
+            for _ in range(calls_per_thread):
+                try:
+                    func()
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(self.num_threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return errors
+
+    def test_ifMockIsCalledFromManyThreads_noCallIsLost(self):
+        total = self.num_threads * self.calls_per_thread
+        expectation = self.iface.foo.expectCall(1)
+        expectation.times(total)
+        self.assertEqual([], self.hammer(lambda: self.iface.foo(1), self.calls_per_thread))
+        self.assertEqual(total, expectation.actual_calls)
+        self.iface.foo.assertSaturated()
+
+    def test_ifWillOnceActionsAreConsumedFromManyThreads_eachIsHandedOutOnce(self):
+        total = self.num_threads * 250
+        expectation = self.iface.foo.expectCall(1)
+        for i in range(total):
+            expectation.willOnce(Return(i))
+        results = []
+        self.assertEqual([], self.hammer(lambda: results.append(self.iface.foo(1)), 250))
+        self.assertEqual(list(range(total)), sorted(results))
+        self.iface.foo.assertSaturated()
+
+    def test_ifExpectationIsOversaturatedFromManyThreads_onlyExcessCallsFail(self):
+        self.iface.foo.expectCall(1).times(10)
+        errors = self.hammer(lambda: self.iface.foo(1), 2)
+        self.assertEqual(self.num_threads * 2 - 10, len(errors))
+
+    def test_ifActionIsSlow_itDoesNotBlockOtherThreads(self):
+        inside = []
+        release = threading.Event()
+
+        def callback(a):
+            inside.append(a)
+            release.wait(5)
+
+        self.iface.foo.expectCall(1).willRepeatedly(Invoke(callback))
+        t = threading.Thread(target=self.iface.foo, args=(1,))
+        t.start()
+        while not inside:
+            pass
+        release.set()
+        self.iface.foo(1)
+        t.join()
+        self.iface.foo.assertSaturated()
+
+    def test_ifThreadSafeModeIsEnabledGlobally_newExpectationsAreThreadSafe(self):
+
+        class Interface(object):
+
+            @mock_method
+            def bar(self):
+                pass
+
+        old = policy.is_thread_safe()
+        policy.set_thread_safe(True)
+        try:
+            iface = Interface()
+            self.assertTrue(iface.bar.thread_safe)
+            self.assertIsNotNone(iface.bar.expectCall()._lock)
+        finally:
+            policy.set_thread_safe(old)
+        self.assertIsNone(Interface().bar.expectCall()._lock)
+
+    def test_ifUninterestedMockIsCalledFromManyThreads_noCallIsCountedTwiceOrLost(self):
+        self.iface.foo.uninterested_policy = policy.COUNT
+        self.assertEqual([], self.hammer(lambda: self.iface.foo(1), self.calls_per_thread))
+        self.assertEqual(self.num_threads * self.calls_per_thread, self.iface.foo.uninterested_calls)
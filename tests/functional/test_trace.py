@@ -0,0 +1,112 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from golem import exc, mock_class, trace
+
+
+class Service(object):
+
+    def __init__(self):
+        self.counter = 0
+
+    def next(self, step=1):
+        self.counter += step
+        return self.counter
+
+    def echo(self, value):
+        return value
+
+    def fail(self):
+        raise RuntimeError()
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'service.trace')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_ifCallsAreRecorded_theyCanBeReplayedAsExpectations(self):
+        with trace.record(Service(), self.path) as recorder:
+            self.assertEqual(1, recorder.next())
+            self.assertEqual(3, recorder.next(2))
+            self.assertEqual(4, recorder.next(step=1))
+            self.assertEqual({'a': [1]}, recorder.echo({'a': [1]}))
+            self.assertEqual(4, recorder.counter)
+        mock = trace.replay(self.path, mock_class(Service)())
+        self.assertEqual(3, mock.next(2))
+        self.assertEqual(1, mock.next())
+        self.assertEqual({'a': [1]}, mock.echo({'a': [1]}))
+        with self.assertRaises(exc.MockUndersaturatedError):
+            mock.next.assertSaturated()
+        self.assertEqual(4, mock.next(1))
+        mock.next.assertSaturated()
+        mock.echo.assertSaturated()
+        self.assertRaises(exc.MockOversaturatedError, mock.next)
+
+    def test_ifRecordedCallRaises_itIsNotRecorded(self):
+        with trace.record(Service(), self.path) as recorder:
+            self.assertRaises(RuntimeError, recorder.fail)
+        mock = trace.replay(self.path, mock_class(Service)())
+        self.assertEqual(0, len(mock.fail.expectations))
+
+    def test_ifTraceIsAppendedTo_allCallsAreReplayed(self):
+        for _ in range(2):
+            with trace.record(Service(), self.path) as recorder:
+                recorder.echo(1)
+        mock = trace.replay(self.path, mock_class(Service)())
+        self.assertEqual(1, mock.echo(1))
+        self.assertEqual(1, mock.echo(1))
+        mock.echo.assertSaturated()
+
+    def test_ifFileIsNotTrace_ValueErrorIsRaised(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'garbage!')
+        self.assertRaises(ValueError, trace.replay, self.path, mock_class(Service)())
+
+    def test_ifTraceIsReplayed_expectationsAreCreatedWhenCalledOrVerified(self):
+        with trace.record(Service(), self.path) as recorder:
+            for i in range(3):
+                recorder.echo([i])
+            recorder.echo([0])
+        mock = trace.replay(self.path, mock_class(Service)())
+        listener = set()
+        mock.echo.addPendingListener(listener)
+        self.assertEqual(0, len(mock.echo.expectations))
+        self.assertEqual(3, mock.echo.pending_count)
+        self.assertEqual(set([mock.echo]), listener)
+        self.assertEqual([2], mock.echo([2]))
+        self.assertEqual(2, mock.echo.pending_count)
+        with self.assertRaises(exc.MockUndersaturatedError) as ctx:
+            mock.echo.assertSaturated()
+        self.assertEqual(2, ctx.exception.expectation.expected_calls.expected)
+        self.assertEqual([0], mock.echo([0]))
+        self.assertEqual([0], mock.echo([0]))
+        self.assertEqual([1], mock.echo([1]))
+        mock.echo.assertSaturated()
+        self.assertEqual(set(), listener)
+        self.assertRaises(exc.UnexpectedMockCallError, mock.echo, [3])
+
+    def test_ifManyDistinctUnhashableCallsAreReplayed_theyAreFoundByKey(self):
+        with trace.record(Service(), self.path) as recorder:
+            for i in range(2000):
+                recorder.echo({'id': i})
+        mock = trace.replay(self.path, mock_class(Service)())
+        for i in reversed(range(2000)):
+            self.assertEqual({'id': i}, mock.echo({'id': i}))
+        mock.echo.assertSaturated()
+        self.assertEqual(0, mock.echo.pending_count)
+
+    def test_ifTraceIsReplayed_snapshotRaisesValueErrorAndResetDropsTrace(self):
+        with trace.record(Service(), self.path) as recorder:
+            recorder.echo(1)
+        mock = trace.replay(self.path, mock_class(Service)())
+        self.assertRaises(ValueError, mock.echo.snapshot)
+        mock.echo.reset()
+        self.assertEqual(0, mock.echo.pending_count)
+        mock.echo.assertSaturated()
@@ -0,0 +1,194 @@
+import uuid
+import random
+import decimal
+import datetime
+import unittest
+import collections
+
+from golem._index import ExpectationIndex
+from golem.matchers import _, Eq, InstanceOf, Regex, Predicate, AllOf, Not,\
+    Gt, Ge, Lt, Le, Between, Contains
+
+
+class FakeCall(object):
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+    def __eq__(self, other):
+        return self.args == other.args and self.kwargs == other.kwargs
+
+    @property
+    def key(self):
+        return self.args + (tuple(sorted(self.kwargs.items())),)
+
+
+class Positive(object):
+
+    def __eq__(self, other):
+        return isinstance(other, int) and other > 0
+
+
+class TestExpectationIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.uut = ExpectationIndex()
+
+    def test_ifIndexIsEmpty_lookupReturnsNone(self):
+        self.assertFalse(self.uut)
+        self.assertIsNone(self.uut.get(FakeCall(1)))
+
+    def test_ifExactKeyStored_itIsKeptInHashBucket(self):
+        self.uut[FakeCall(1, a=2)] = 'x'
+        self.assertEqual({(1, (('a', 2),))}, set(self.uut._exact))
+        self.assertEqual('x', self.uut.get(FakeCall(1, a=2)))
+        self.assertIsNone(self.uut.get(FakeCall(1, a=3)))
+
+    def test_ifKeyContainsHashableValuesDefiningEquality_itIsKeptInHashBucket(self):
+        Point = collections.namedtuple('Point', 'x y')
+        keys = [uuid.UUID(int=1), datetime.date(2000, 1, 1), Point(1, 2), decimal.Decimal('1.5')]
+        for i, key in enumerate(keys):
+            self.uut[FakeCall(key)] = i
+        self.assertEqual(4, len(self.uut._exact))
+        self.assertEqual(0, len(self.uut._fallback))
+        self.assertEqual([0, 1, 2, 3], [self.uut.get(FakeCall(x)) for x in keys])
+        self.assertEqual(2, self.uut.get(FakeCall((1, 2))))
+        self.uut[FakeCall(Point(_, 3))] = 'matcher'
+        self.assertEqual(1, len(self.uut._fallback))
+
+    def test_ifKeyContainsMatcherOrUnhashableValue_itIsKeptInFallbackList(self):
+        self.uut[FakeCall(_, 1)] = 'x'
+        self.uut[FakeCall([1], 2)] = 'y'
+        self.assertEqual(2, len(self.uut._fallback))
+        self.assertEqual('x', self.uut[FakeCall([1], 1)])
+        self.assertEqual('y', self.uut[FakeCall([1], 2)])
+
+    def test_ifSeveralExpectationsMatch_earliestRecordedOneIsReturned(self):
+        self.uut[FakeCall(Positive())] = 'positive'
+        self.uut[FakeCall(_)] = 'any'
+        self.assertEqual('positive', self.uut.get(FakeCall(1)))
+        self.assertEqual('any', self.uut.get(FakeCall(-1)))
+
+    def test_ifUnhashableCallLookedUp_allExpectationsAreScannedInOrder(self):
+        self.uut[FakeCall(1)] = 'exact'
+        self.uut[FakeCall([1])] = 'list'
+        self.assertEqual('list', self.uut.get(FakeCall([1])))
+        self.assertIsNone(self.uut.get(FakeCall([2])))
+
+    def test_ifSettingExpectationForExistingKey_itIsReplacedInPlace(self):
+        self.uut[FakeCall(1)] = 'a'
+        self.uut[FakeCall(2)] = 'b'
+        self.uut[FakeCall(1)] = 'c'
+        self.assertEqual([((1,), 'c'), ((2,), 'b')], [(k.args, v) for k, v in self.uut.iteritems()])
+
+    def test_ifFallbackKeysHaveIndexHints_onlyMatchingBucketsAreChecked(self):
+        checked = []
+
+        class Recording(Predicate):
+            __slots__ = ()
+
+            def matches(self, value):
+                checked.append(value)
+                return super(Recording, self).matches(value)
+
+        self.uut[FakeCall(1, InstanceOf(int))] = 'int'
+        self.uut[FakeCall(1, AllOf(Regex('^a'), Recording(lambda x: len(x) > 1)))] = 'str'
+        self.uut[FakeCall(1, Eq(3))] = 'eq'
+        self.assertEqual('str', self.uut.get(FakeCall(1, 'ab')))
+        self.assertEqual('int', self.uut.get(FakeCall(1, 3)))
+        self.assertIsNone(self.uut.get(FakeCall(1, 2.0)))
+        self.assertEqual(['ab'], checked)
+
+    def test_ifTypeBucketed_subclassInstancesAreFound(self):
+        self.uut[FakeCall(InstanceOf(int))] = 'int'
+        self.uut[FakeCall(_)] = 'any'
+        self.assertEqual('int', self.uut.get(FakeCall(True)))
+        self.assertEqual('any', self.uut.get(FakeCall('a')))
+
+    def test_ifRangeMatchersStored_onlyRangesContainingValueAreChecked(self):
+        checked = []
+
+        class RecordingBetween(Between):
+            __slots__ = ()
+
+            def _params(self):
+                return self.__class__, self.low, self.high
+
+            def matches(self, value):
+                checked.append((self.low, value))
+                return super(RecordingBetween, self).matches(value)
+
+        for i in range(100):
+            self.uut[FakeCall(RecordingBetween(i * 10, i * 10 + 5))] = i
+        self.uut[FakeCall(Contains('a'))] = 'contains'
+        self.uut[FakeCall(Gt(500))] = 'gt'
+        self.assertEqual(42, self.uut.get(FakeCall(423)))
+        self.assertEqual([(420, 423)], checked)
+        self.assertEqual('gt', self.uut.get(FakeCall(507.5)))
+        self.assertIsNone(self.uut.get(FakeCall(-1)))
+        self.assertEqual('contains', self.uut.get(FakeCall('abc')))
+
+    def test_ifMatchersOfManyKindsStored_lookupMatchesLinearScan(self):
+        rng = random.Random(0)
+        expected = [
+            _, 5, 'a', Eq(3), InstanceOf(int), InstanceOf(float), Regex('^a'), Contains('b'),
+            Gt(3), Ge(3), Lt(2.5), Le(-1), Between(0, 4), Between(2.5, 2.5), Not(Eq(2))]
+        values = [-2, -1, 0, 1, 2, 2.5, 3, 3.0, 4, 5, True, False, 'a', 'ab', 'b', None]
+        for _i in range(50):
+            uut = ExpectationIndex()
+            stored = []
+            for n in range(rng.randint(1, 8)):
+                call = FakeCall(rng.choice(expected), rng.choice(expected))
+                if call not in uut:
+                    uut[call] = n
+                    stored.append((call, n))
+                for args in [(rng.choice(values), rng.choice(values)) for _j in range(20)]:
+                    call = FakeCall(*args)
+                    scanned = next((v for k, v in stored if k == call), None)
+                    self.assertEqual(scanned, uut.get(call), (args, stored))
+                    self.assertEqual(scanned, uut.compile()(call)[0])
+
+    def test_ifGuardedAndUnguardedExpectationsMatch_earliestRecordedOneIsReturned(self):
+        self.uut[FakeCall(1, Not(Eq(0)))] = 'nonzero'
+        self.uut[FakeCall(1, InstanceOf(int))] = 'int'
+        self.assertEqual('nonzero', self.uut.get(FakeCall(1, 1)))
+        self.assertEqual('int', self.uut.get(FakeCall(1, 0)))
+
+    def test_ifIndexIsCompiled_lookupFindsSameExpectationsAsIndex(self):
+        self.uut[FakeCall(1)] = 'exact'
+        self.uut[FakeCall(InstanceOf(str))] = 'str'
+        self.uut[FakeCall([1])] = 'list'
+        lookup = self.uut.compile()
+        for call in [FakeCall(1), FakeCall(2), FakeCall(3), FakeCall([1]), FakeCall('a')]:
+            self.assertEqual(self.uut.get(call), lookup(call)[0])
+        self.assertEqual('exact', lookup(FakeCall(1))[0])
+        self.assertEqual('str', lookup(FakeCall('a'))[0])
+        self.assertIsNone(lookup(FakeCall(2))[0])
+
+    def test_ifOnlyExactKeysStored_exactHitsAreCacheable(self):
+        self.uut[FakeCall(1)] = 'exact'
+        self.assertEqual(('exact', True), self.uut.lookup(FakeCall(1)))
+        self.assertEqual(('exact', True), self.uut.compile()(FakeCall(1)))
+        self.assertEqual((None, False), self.uut.lookup(FakeCall(2)))
+        self.uut[FakeCall(InstanceOf(str))] = 'str'
+        self.assertEqual(('exact', False), self.uut.lookup(FakeCall(1)))
+        self.assertEqual(('exact', False), self.uut.compile()(FakeCall(1)))
+
+    def test_ifLargeArgumentSurelyDiffers_itIsNotComparedInFull(self):
+        compared = []
+
+        class Item(object):
+
+            def __eq__(self, other):
+                compared.append(other)
+                return True
+
+        def payload(last):
+            return (0, Item()) + (0,) * 100 + (last,)
+
+        self.uut[FakeCall(_, payload(1))] = 'one'
+        self.uut[FakeCall(_, payload(2))] = 'two'
+        del compared[:]
+        self.assertEqual('two', self.uut.get(FakeCall(1, payload(2))))
+        self.assertEqual(1, len(compared))
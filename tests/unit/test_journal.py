@@ -0,0 +1,79 @@
+import unittest
+
+from golem import journal
+from golem.clock import VirtualClock
+from golem.journal import CallJournal
+
+
+class TestCallJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock()
+        self.uut = CallJournal(('a', 'b'), clock=self.clock)
+
+    def record(self, key, expectation=None, delay=1):
+        self.clock.advance(delay)
+        self.uut.record(key, expectation)
+
+    def test_ifCallsRecorded_theyAreExportedAsColumns(self):
+        self.record((1, 'x'), 'e1')
+        self.record((2, 'y'))
+        self.record((1, 'x'), 'e2')
+        self.assertEqual({
+            'time': [1.0, 2.0, 3.0],
+            'expectation': [0, -1, 1],
+            'a': [1, 2, 1],
+            'b': ['x', 'y', 'x']}, self.uut.columns())
+        self.assertEqual('e2', self.uut.get_expectation(1))
+        self.assertIsNone(self.uut.get_expectation(-1))
+
+    def test_ifEqualArgumentsRecorded_theyAreStoredOnce(self):
+        for _ in range(100):
+            self.record((1, 'x'))
+        self.record(([1], 'y'))
+        self.assertEqual([((1, 'x'), 100), (([1], 'y'), 1)], self.uut.argument_counts())
+        self.assertEqual(2, len(self.uut._arg_values))
+
+    def test_ifEqualArgumentsOfDifferentTypesRecorded_theyAreStoredSeparately(self):
+        for key in [(1, 'x'), (True, 'x'), (1.0, 'x'), ((1,), 'x'), ((True,), 'x'), (1, 'x')]:
+            self.record(key)
+        self.assertEqual(
+            ['1', 'True', '1.0', '(1,)', '(True,)', '1'],
+            [repr(x) for x in self.uut.columns()['a']])
+        self.assertEqual(
+            [('1', 2), ('True', 1), ('1.0', 1), ('(1,)', 1), ('(True,)', 1)],
+            [(repr(k[0]), n) for k, n in self.uut.argument_counts()])
+
+    def test_ifMaxlenReached_oldestCallsAreDropped(self):
+        self.uut = CallJournal(('a',), maxlen=3, clock=self.clock)
+        for i in range(5):
+            self.record((i % 2,))
+        self.record(([2],))
+        self.assertEqual(3, len(self.uut))
+        self.assertEqual(6, self.uut.total)
+        self.assertEqual([4.0, 5.0, 6.0], list(self.uut.times()))
+        self.assertEqual([(1,), (0,), ([2],)], self.uut.args())
+        self.assertEqual([((0,), 1), ((1,), 1), (([2],), 1)], sorted(self.uut.argument_counts(), key=repr))
+
+    def test_ifDistinctArgumentsAreDropped_theirSlotsAreReused(self):
+        self.uut = CallJournal(('a',), maxlen=2, clock=self.clock)
+        for i in range(1000):
+            self.record((i,))
+        self.assertTrue(len(self.uut._arg_values) <= 3)
+        self.assertEqual([(998,), (999,)], self.uut.args())
+
+    def test_ifMaxlenIsNotPositive_ValueErrorIsRaised(self):
+        self.assertRaises(ValueError, CallJournal, maxlen=0)
+
+    @unittest.skipIf(journal.numpy is None, "numpy is not installed")
+    def test_ifNumpyInstalled_columnsCanBeExportedAsArrays(self):
+        self.record((1, 'x'), 'e')
+        self.record((2, 'y'))
+        result = self.uut.to_numpy()
+        self.assertEqual([1.0, 2.0], result['time'].tolist())
+        self.assertEqual([0, -1], result['expectation'].tolist())
+        self.assertEqual([1, 2], result['a'].tolist())
+
+    @unittest.skipIf(journal.numpy is not None, "numpy is installed")
+    def test_ifNumpyNotInstalled_exportingToNumpyFails(self):
+        self.assertRaises(RuntimeError, self.uut.to_numpy)
@@ -0,0 +1,114 @@
+import re
+import unittest
+
+from golem import _compat
+from golem.matchers import _, Eq, InstanceOf, Gt, Ge, Lt, Le, Between,\
+    Regex, Contains, Predicate, AllOf, AnyOf, Not, get_index_hint,\
+    INDEX_BY_TYPE, INDEX_BY_VALUE, INDEX_BY_RANGE
+
+
+class TestMatchers(unittest.TestCase):
+
+    def test_ifAnyUsed_itMatchesEverything(self):
+        self.assertEqual(_, 1)
+        self.assertEqual(_, Eq(1))
+        self.assertIsNone(_.index_hint())
+
+    def test_ifEqUsed_itMatchesEqualValues(self):
+        self.assertEqual(Eq(1), 1)
+        self.assertNotEqual(Eq(1), 2)
+        self.assertEqual((INDEX_BY_VALUE, 1), Eq(1).index_hint())
+        self.assertIsNone(Eq([1]).index_hint())
+
+    def test_ifInstanceOfUsed_itMatchesInstancesOfGivenTypes(self):
+        uut = InstanceOf(int, float)
+        self.assertEqual(uut, True)
+        self.assertEqual(uut, 1.5)
+        self.assertNotEqual(uut, '1')
+        self.assertEqual((INDEX_BY_TYPE, (int, float)), uut.index_hint())
+
+    def test_ifComparisonMatchersUsed_theyCompareWithGivenValue(self):
+        self.assertEqual(Gt(1), 2)
+        self.assertNotEqual(Gt(1), 1)
+        self.assertEqual(Ge(1), 1)
+        self.assertEqual(Lt(1), 0)
+        self.assertNotEqual(Lt(1), 1)
+        self.assertEqual(Le(1), 1)
+        self.assertEqual(Between(1, 3), 3)
+        self.assertNotEqual(Between(1, 3), 4)
+
+    def test_ifComparedWithRealNumber_comparisonMatchersAreIndexedByRange(self):
+        self.assertEqual((INDEX_BY_RANGE, (1, None, False, False)), Gt(1).index_hint())
+        self.assertEqual((INDEX_BY_RANGE, (1, None, True, False)), Ge(1).index_hint())
+        self.assertEqual((INDEX_BY_RANGE, (None, 1.5, False, False)), Lt(1.5).index_hint())
+        self.assertEqual((INDEX_BY_RANGE, (None, 1, False, True)), Le(1).index_hint())
+        self.assertEqual((INDEX_BY_RANGE, (1, 3, True, True)), Between(1, 3).index_hint())
+        self.assertIsNone(Gt('a').index_hint())
+        self.assertIsNone(Gt(float('nan')).index_hint())
+        self.assertIsNone(Between(1, 'z').index_hint())
+
+    def test_ifComparedValueIsNotComparable_itDoesNotMatch(self):
+        self.assertNotEqual(Gt(1), None if str is bytes else 'a')
+        self.assertNotEqual(Between(1, 3), {} if str is bytes else 'a')
+
+    def test_ifRegexUsed_itSearchesStringsOnly(self):
+        uut = Regex(r'ba+r', re.I)
+        self.assertEqual(uut, 'foo BAAR')
+        self.assertNotEqual(uut, 'foo')
+        self.assertNotEqual(uut, 1)
+        self.assertEqual(INDEX_BY_TYPE, uut.index_hint()[0])
+        self.assertEqual(Regex('a'), Regex('a'))
+        self.assertNotEqual(Regex('a'), Regex('a', re.I))
+
+    @unittest.skipIf(_compat.PY2, "str and unicode can be searched with either pattern")
+    def test_ifRegexUsed_itSearchesStringsOfPatternTypeOnly(self):
+        uut = Regex(b'ba+r')
+        self.assertEqual(uut, b'foo baar')
+        self.assertNotEqual(uut, 'foo baar')
+        self.assertNotEqual(Regex('ba+r'), b'foo baar')
+        self.assertEqual((INDEX_BY_TYPE, (bytes,)), uut.index_hint())
+
+    def test_ifContainsUsed_itMatchesContainersHavingGivenItem(self):
+        self.assertEqual(Contains(1), [1, 2])
+        self.assertNotEqual(Contains(3), [1, 2])
+        self.assertNotEqual(Contains(3), 3)
+        self.assertEqual((INDEX_BY_RANGE, None), Contains(3).index_hint())
+
+    def test_ifPredicateUsed_itMatchesIfFunctionReturnsTrue(self):
+        self.assertEqual(Predicate(lambda x: x % 2), 3)
+        self.assertNotEqual(Predicate(lambda x: x % 2), 2)
+
+    def test_ifAllOfUsed_itStopsAtFirstMismatch(self):
+        checked = []
+        uut = AllOf(InstanceOf(int), Predicate(checked.append))
+        self.assertNotEqual(uut, 'a')
+        self.assertEqual([], checked)
+        self.assertEqual((INDEX_BY_TYPE, (int,)), uut.index_hint())
+
+    def test_ifAnyOfUsed_itStopsAtFirstMatch(self):
+        checked = []
+        uut = AnyOf(Eq(1), Predicate(checked.append))
+        self.assertEqual(uut, 1)
+        self.assertEqual([], checked)
+        self.assertIsNone(uut.index_hint())
+        self.assertEqual((INDEX_BY_TYPE, (int, float)), AnyOf(InstanceOf(int), InstanceOf(float)).index_hint())
+
+    def test_ifNotUsed_itNegatesGivenMatcher(self):
+        self.assertEqual(Not(Eq(1)), 2)
+        self.assertNotEqual(Not(Eq(1)), 1)
+        self.assertIsNone(Not(InstanceOf(int)).index_hint())
+
+    def test_ifMatchersComparedWithEachOther_theyAreEqualIfHaveSameParams(self):
+        self.assertEqual(Gt(1), Gt(1))
+        self.assertNotEqual(Gt(1), Ge(1))
+        self.assertNotEqual(InstanceOf(int), InstanceOf(str))
+        self.assertEqual(AllOf(Eq(1), _), AllOf(Eq(1), _))
+
+    def test_ifReprCalled_itShowsMatcherParams(self):
+        self.assertEqual("Between(1, 2)", repr(Between(1, 2)))
+        self.assertEqual("Not(Eq(1))", repr(Not(Eq(1))))
+
+    def test_ifIndexHintRequestedForPlainValue_itIsReturnedOnlyForHashableOnes(self):
+        self.assertEqual((INDEX_BY_VALUE, 1), get_index_hint(1))
+        self.assertIsNone(get_index_hint([1]))
+        self.assertIsNone(get_index_hint(_))
@@ -1,6 +1,6 @@
 import unittest
 
-from golem import exc, mock_method
+from golem import exc, mock_class, mock_method
 from golem.mixins import MockTestCaseMixin
 
 
@@ -62,3 +62,64 @@ class TestMockTestCaseMixin(unittest.TestCase):
         self.iface.bar(2)
         self.iface.bar(1)
         self.uut.assertSaturated()
+
+    def test_ifExpectationsAreSatisfied_pendingCountAndPendingMocksAreUpdated(self):
+        self.uut.expectCall(self.iface.foo)
+        self.uut.expectCall(self.iface.bar, 1)
+        self.uut.expectCall(self.iface.bar, 2)
+        self.assertEqual(3, self.uut.pending_count)
+        self.assertEqual(set([self.iface.foo, self.iface.bar]), self.uut.pending_mocks)
+        self.iface.bar(1)
+        self.iface.bar(2)
+        self.assertEqual(1, self.uut.pending_count)
+        self.assertEqual(set([self.iface.foo]), self.uut.pending_mocks)
+        self.iface.foo()
+        self.assertEqual(0, self.uut.pending_count)
+        self.uut.assertSaturated()
+
+    def test_ifSnapshotIsRestoredByOtherTestCase_mocksAreVerifiedByIt(self):
+        self.uut.expectCall(self.iface.bar, 1)
+        snapshot = self.uut.snapshot()
+        self.iface.bar(1)
+        self.uut.assertSaturated()
+        other = MockTestCaseMixin()
+        other.restore(snapshot)
+        self.assertEqual(1, other.pending_count)
+        with self.assertRaises(exc.MockUndersaturatedError):
+            other.assertSaturated()
+        self.iface.bar(1)
+        other.assertSaturated()
+
+    def test_ifReset_registeredMocksHaveNoExpectations(self):
+        self.uut.expectCall(self.iface.foo)
+        self.uut.expectCall(self.iface.bar, 1)
+        self.uut.reset()
+        self.assertEqual(0, self.uut.pending_count)
+        self.assertEqual(0, len(self.iface.bar.expectations))
+        self.uut.assertSaturated()
+
+    def test_ifMockedClassDefinesEquality_mocksOfItAreRegisteredByIdentity(self):
+
+        class Record(object):
+
+            def __init__(self, key):
+                self.key = key
+
+            def __eq__(self, other):
+                return self.key == other.key
+
+            __hash__ = None
+
+            def save(self):
+                pass
+
+        first, second = mock_class(Record)(), mock_class(Record)()
+        self.uut.expectCall(first.save)
+        self.uut.expectCall(second.save)
+        self.assertEqual(2, len(self.uut.mock_registry))
+        self.assertNotEqual(first, second)
+        first.save()
+        with self.assertRaises(exc.MockUndersaturatedError):
+            self.uut.assertSaturated()
+        second.save()
+        self.uut.assertSaturated()
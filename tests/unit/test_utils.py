@@ -1,6 +1,25 @@
+import sys
 import unittest
 
-from golem._utils import FunctionInspector
+from golem import _compat
+from golem.matchers import Eq
+from golem._utils import FunctionInspector, is_same_call, is_indexable, fingerprint, fingerprints_differ
+
+# Keyword-only arguments are a syntax error in Python 2, so the function
+# using them is defined in a string.
+KEYWORD_ONLY_SOURCE = '''
+def ham(self, a, *args, b, c=3, **kwargs):
+    pass
+'''
+
+# Same for positional-only arguments in Python older than 3.8.
+POSITIONAL_ONLY_SOURCE = '''
+def get(self, key, /, **options):
+    pass
+
+def put(self, a, /, b=1):
+    pass
+'''
 
 
 class TestFunctionInspector(unittest.TestCase):
@@ -83,3 +102,148 @@ class TestFunctionInspector(unittest.TestCase):
         uut = FunctionInspector(self.bar)
         with self.assertRaisesRegexp(TypeError, "bar\(\) got multiple values for keyword argument 'a'"):
             uut.normalize(1, a=1)
+
+
+class TestArgumentBinder(unittest.TestCase):
+
+    def setUp(self):
+
+        def spam(a, b, c=None):
+            pass
+
+        def eggs(self, a, *args, **kwargs):
+            pass
+
+        self.spam = FunctionInspector(spam)
+        self.eggs = FunctionInspector(eggs)
+
+    def test_ifBindingPositionalAndKeywordFormsOfSameCall_resultsAreEqual(self):
+        uut = self.spam.binder()
+        self.assertEqual((1, 2, None), uut.bind((1, 2), {}))
+        self.assertEqual((1, 2, None), uut.bind((1,), {'b': 2}))
+        self.assertEqual((1, 2, None), uut.bind((), {'b': 2, 'a': 1, 'c': None}))
+
+    def test_ifBinderIsRequestedTwice_sameBinderIsReturned(self):
+        self.assertIs(self.spam.binder(), self.spam.binder())
+        self.assertIsNot(self.spam.binder(), self.spam.binder(1))
+
+    def test_ifOffsetGiven_leadingArgumentsAreSkipped(self):
+        uut = self.spam.binder(1)
+        self.assertEqual(('b', 'c'), uut.names)
+        self.assertEqual((2, None), uut.bind((2,), {}))
+        self.assertEqual({'b': 2, 'c': 3}, uut.to_dict(uut.bind((), {'c': 3, 'b': 2})))
+
+    def test_ifOffsetArgumentGivenByKeyword_TypeErrorIsRaised(self):
+        uut = self.spam.binder(1)
+        with self.assertRaisesRegexp(TypeError, "spam\(\) got multiple values for keyword argument 'a'"):
+            uut.bind((2,), {'a': 1})
+
+    def test_ifRequiredArgumentIsMissing_TypeErrorIsRaised(self):
+        uut = self.spam.binder()
+        with self.assertRaisesRegexp(TypeError, "spam\(\) takes at least 2 arguments \(2 given\)"):
+            uut.bind((1,), {'c': 2})
+
+    def test_ifFunctionAcceptsVariableArguments_extraArgumentsAreBoundAsWell(self):
+        uut = self.eggs.binder(1)
+        self.assertEqual((1, (2, 3), (('x', 4),)), uut.bind((1, 2, 3), {'x': 4}))
+        self.assertEqual((1, (), ()), uut.bind((), {'a': 1}))
+        self.assertEqual({'a': 1, 'args': (2,), 'kwargs': {'x': 4}}, uut.to_dict(uut.bind((1, 2), {'x': 4})))
+
+    @unittest.skipIf(_compat.PY2, "keyword-only arguments are not available")
+    def test_ifFunctionHasKeywordOnlyArguments_theyAreBoundAfterVariableArguments(self):
+        namespace = {}
+        exec(KEYWORD_ONLY_SOURCE, namespace)
+        uut = FunctionInspector(namespace['ham']).binder(1)
+        self.assertEqual(('a', 'args', 'b', 'c', 'kwargs'), uut.slot_names)
+        self.assertEqual((1, (), 2, 3, ()), uut.bind((1,), {'b': 2}))
+        self.assertEqual((1, (0,), 2, 4, (('x', 5),)), uut.bind((1, 0), {'c': 4, 'x': 5, 'b': 2}))
+        self.assertEqual(
+            {'a': 1, 'args': (), 'b': 2, 'c': 3, 'kwargs': {}},
+            uut.to_dict(uut.bind((), {'a': 1, 'b': 2})))
+        with self.assertRaisesRegexp(TypeError, "ham\\(\\) missing required keyword-only argument 'b'"):
+            uut.bind((1,), {'c': 4})
+
+    @unittest.skipIf(sys.version_info < (3, 8), "positional-only arguments are not available")
+    def test_ifFunctionHasPositionalOnlyArguments_keywordsNamedAsThemAreNotBoundToThem(self):
+        namespace = {}
+        exec(POSITIONAL_ONLY_SOURCE, namespace)
+        get = FunctionInspector(namespace['get']).binder(1)
+        put = FunctionInspector(namespace['put']).binder(1)
+        self.assertEqual(('a', (('key', 1),)), get.bind(('a',), {'key': 1}))
+        self.assertEqual((1, 2), put.bind((1,), {'b': 2}))
+        with self.assertRaisesRegexp(TypeError, "put\\(\\) got some positional-only arguments passed as keyword arguments: 'a'"):
+            put.bind((), {'a': 1})
+        with self.assertRaisesRegexp(TypeError, "get\\(\\) takes exactly 2 arguments \\(1 given\\)"):
+            get.bind((), {'key': 1})
+
+
+class TestIsSameCall(unittest.TestCase):
+
+    def test_ifArgumentsAreIdenticalOrSameScalars_callsAreSame(self):
+        obj = []
+        self.assertTrue(is_same_call((1, 'a', obj), {'b': None}, (1, 'a', obj), {'b': None}))
+
+    def test_ifArgumentsAreOnlyEqual_callsAreNotSame(self):
+        self.assertFalse(is_same_call(([1],), {}, ([1],), {}))
+        self.assertFalse(is_same_call((1,), {}, (True,), {}))
+        self.assertFalse(is_same_call((1,), {}, (1.0,), {}))
+
+    def test_ifKeywordArgumentsDiffer_callsAreNotSame(self):
+        self.assertFalse(is_same_call((), {'a': 1}, (), {'b': 1}))
+        self.assertFalse(is_same_call((), {'a': 1}, (), {}))
+
+
+class TestIsIndexable(unittest.TestCase):
+
+    def test_ifValueIsHashableAndNotMatcher_itIsIndexable(self):
+
+        class Key(object):
+
+            def __eq__(self, other):
+                return isinstance(other, Key)
+
+            def __hash__(self):
+                return 0
+
+        for value in [1, 'a', (1, ('b',)), frozenset([1]), Key(), object()]:
+            self.assertTrue(is_indexable(value), value)
+
+    def test_ifValueIsUnhashableOrContainsMatcher_itIsNotIndexable(self):
+
+        class IdentityHashed(object):
+            __hash__ = object.__hash__
+
+            def __eq__(self, other):
+                return True
+
+        for value in [[1], (1, [2]), Eq(1), (1, Eq(1)), IdentityHashed()]:
+            self.assertFalse(is_indexable(value), value)
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_ifValueIsSmallOrNotBuiltinContainer_itIsNotFingerprinted(self):
+        self.assertIsNone(fingerprint((1,) * 10))
+        self.assertIsNone(fingerprint(1))
+        self.assertIsNone(fingerprint(type('T', (tuple,), {})((1,) * 100)))
+
+    def test_ifValueIsMutable_itIsNotFingerprinted(self):
+        for value in [[1] * 100, bytearray(100), dict.fromkeys(range(100)), set(range(100))]:
+            self.assertIsNone(fingerprint(value))
+
+    def test_ifLargeSequencesDifferAtSampledPosition_fingerprintsDiffer(self):
+        a = tuple(range(100))
+        b = tuple(range(99)) + (0,)
+        self.assertTrue(fingerprints_differ(fingerprint(a), fingerprint(b)))
+        self.assertFalse(fingerprints_differ(fingerprint(a), fingerprint(tuple(list(a)))))
+
+    def test_ifLargeValuesDifferInLength_fingerprintsDiffer(self):
+        self.assertTrue(fingerprints_differ(fingerprint(b'x' * 100), fingerprint(b'x' * 101)))
+        self.assertTrue(fingerprints_differ(fingerprint(frozenset(range(100))), fingerprint(frozenset(range(101)))))
+
+    def test_ifValuesAreOfDifferentTypes_fingerprintsNeverDiffer(self):
+        self.assertFalse(fingerprints_differ(fingerprint(b'x' * 100), fingerprint(u'y' * 100)))
+        self.assertFalse(fingerprints_differ(fingerprint(tuple(range(100))), fingerprint(frozenset(range(101)))))
+
+    def test_ifSampledItemsAreNotScalars_onlyLengthIsCompared(self):
+        self.assertFalse(fingerprints_differ(fingerprint(([1],) * 100), fingerprint(([2],) * 100)))